@@ -0,0 +1,161 @@
+"""批量转换和汇总导出的表格
+
+按 {process}-{Template}-{schema}.xml 的命名找出目录下所有导出的表格（合并导出的 {process}-{Template}-tables.xml 拆分为各个表格），
+用与 CPU 数相同的进程转换，再汇总每个应用，写入一份合并的报告。
+转换完成的表格连同 XML 的摘要记录在目录的 manifest.json 中（见 manifest.py），重新运行时只转换没完成或 XML 改变了的表格；
+汇总失败的应用在报告中记录错误。
+
+run: `python3 batch.py <directory> [--jobs N] [--format csv] [--metrics cpu,fps] [--report batch-report]`
+eg: `python3 batch.py nightly/ --format parquet`
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from manifest import Manifest
+from summarize import parse_metrics, summarize
+from writers import WRITERS, atomic_output
+from xml2csv import CONVERTER_VERSION, convert_table, split_tables
+
+TABLE_NAME = re.compile(r'^(?P<app>.+?)-(?P<template>[A-Z][A-Za-z0-9]*)-(?P<schema>[a-z0-9][a-z0-9-]*)$')
+COMBINED_SCHEMA = 'tables'
+
+# name: 相对于 batch 根目录的路径，作为 manifest 的键，与当前工作目录无关
+Table = namedtuple('Table', ['path', 'directory', 'app', 'template', 'schema', 'name'])
+
+def discover(root, suffixes=('.xml',)):
+    # root 下所有符合命名规则的导出表格，默认只找 XML 文件
+    tables = []
+    for directory, subdirectories, names in os.walk(root):
+        for name in sorted(names + subdirectories):
+            stem, suffix = os.path.splitext(name)
+            match = TABLE_NAME.match(stem)
+            if match and suffix in suffixes:
+                path = os.path.join(directory, name)
+                tables.append(Table(os.path.abspath(path), directory, name=os.path.relpath(path, root), **match.groupdict()))
+    return tables
+
+def group(tables):
+    # {(directory, app): {template: [schema, ...]}}
+    groups = defaultdict(lambda: defaultdict(list))
+    for table in tables:
+        groups[(table.directory, table.app)][table.template].append(table.schema)
+    return groups
+
+def manifest_key(format):
+    return f'convert {CONVERTER_VERSION} {format}'
+
+def up_to_date(table, format, manifest=None):
+    # 表格转换为 format 的结果是否已在 manifest 中记录为完成，或比 XML 新
+    if manifest is not None and manifest.done(table.name, [table.path], manifest_key(format)):
+        return True
+    if table.schema == COMBINED_SCHEMA:
+        return False
+    output = os.path.splitext(table.path)[0] + WRITERS[format].suffix
+    return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(table.path)
+
+def convert(table, format='csv'):
+    # 转换一个导出的表格（或拆分合并导出的文件），返回 (table, 输出, 行数, 秒数)
+    started = time.perf_counter()
+    if table.schema == COMBINED_SCHEMA:
+        prefix = table.path[:-len(COMBINED_SCHEMA + '.xml')]
+        tables = split_tables(table.path, prefix, format)
+        outputs = [output for _, output, _ in tables]
+        rows = sum(count for _, _, count in tables)
+    else:
+        output = os.path.splitext(table.path)[0] + WRITERS[format].suffix
+        converted = convert_table(table.path, output, format)
+        outputs = [output] if converted else []
+        rows = converted[2] if converted else 0
+    return table, outputs, rows, time.perf_counter() - started
+
+def summarize_app(directory, app, metrics=None):
+    return directory, app, summarize(app, directory, metrics)
+
+def progress(done, total, started, message):
+    elapsed = time.perf_counter() - started
+    print(f'[{done}/{total} {elapsed:.1f}s] {message}', file=sys.stderr)
+
+def run_batch(root, workers=None, format='csv', metrics=None, force=False):
+    # 转换并汇总 root 下的所有表格，返回 {"directory/app": 汇总}
+    tables = discover(root)
+    manifest = Manifest(root)
+    pending = [table for table in tables if force or not up_to_date(table, format, manifest)]
+    started = time.perf_counter()
+    report = {}
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [pool.submit(convert, table, format) for table in pending]
+        rows = 0
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                table, outputs, count, seconds = future.result()
+            except Exception as e:
+                progress(done, len(futures), started, f'转换失败: {e}')
+                continue
+            manifest.record(table.name, [table.path], outputs, manifest_key(format))
+            rows += count
+            progress(done, len(futures), started, f'{table.name}: {count} 行，{seconds:.2f}s')
+        if futures:
+            elapsed = time.perf_counter() - started
+            print(f'转换了 {len(futures)} 个表格，{rows} 行，{elapsed:.1f}s（{rows / max(elapsed, 1e-9):.0f} 行/秒）',
+                  file=sys.stderr)
+
+        apps = sorted(group(tables))
+        futures = {pool.submit(summarize_app, directory, app, metrics): (directory, app) for directory, app in apps}
+        for done, future in enumerate(as_completed(futures), 1):
+            name = os.path.join(*futures[future])
+            try:
+                _, _, app_report = future.result()
+            except Exception as e:
+                # 一个应用的表格损坏或缺失时，不能丢掉其他应用的汇总
+                report[name] = {'error': f'{type(e).__name__}: {e}'}
+                progress(done, len(futures), started, f'汇总 {name} 失败: {e}')
+                continue
+            report[name] = app_report
+            progress(done, len(futures), started, f'汇总 {name} 完成')
+    return dict(sorted(report.items()))
+
+def report_rows(report):
+    # 每个应用的每个指标一行；汇总失败的应用只有一行，记录其错误
+    for app, app_report in report.items():
+        if 'error' in app_report:
+            yield {'app': app, 'error': app_report['error']}
+            continue
+        for metric, stats in app_report.items():
+            yield dict({'app': app, 'metric': metric}, **{k: v for k, v in stats.items() if not isinstance(v, dict)})
+
+def write_batch_report(report, prefix):
+    with atomic_output(prefix + '.json') as partial, open(partial, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    import pandas as pd
+
+    with atomic_output(prefix + '.csv') as partial:
+        pd.DataFrame(list(report_rows(report))).to_csv(partial, index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='转换并汇总目录下所有导出的表格')
+    parser.add_argument('directory')
+    parser.add_argument('--jobs', type=int, default=None, help='进程数，默认为 CPU 数')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='逗号分隔的指标名，默认全部')
+    parser.add_argument('--force', action='store_true', help='即使输出已是最新也重新转换')
+    parser.add_argument('--report', default='batch-report', help='报告路径的前缀（.json 和 .csv）')
+    args = parser.parse_args()
+
+    report = run_batch(args.directory, args.jobs, args.format,
+                       args.metrics, args.force)
+    write_batch_report(report, args.report)
+    failed = [app for app, app_report in report.items() if 'error' in app_report]
+    print(f'汇总了 {len(report) - len(failed)} 个应用，报告已写入 {args.report}.json 和 {args.report}.csv')
+    if failed:
+        print(f'汇总 {", ".join(failed)} 失败，详见报告', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
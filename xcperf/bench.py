@@ -0,0 +1,145 @@
+"""转换流程的基准测试
+
+用 synth.py 生成合成导出（不需要 Xcode），在每个规模下分别计时：生成 XML、用 xml2csv 转换为 CSV 和列式格式
+（xml2csv.py、xcperf.py 的 convert_csv、exporter.py 和 batch.py 用的都是这条路径）、汇总转换后的表格。
+每个阶段在新的进程中运行，单独测量峰值 RSS。输出每个阶段的耗时、行/秒和峰值 RSS；
+--baseline 与之前 --json 的结果比较，有阶段变慢超过容差时退出码为 1。
+
+run: `python3 bench.py [--rows 10000,1000000,10000000] [--schemas sysmon-process] [--formats csv,npy] [--json bench.json] [--baseline bench.json]`
+eg: `python3 bench.py --rows 10000,1000000 --formats csv,parquet`
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from summarize import METRICS, summarize
+from synth import APP, PROCESSES, REF_DENSITY, SCHEMAS, table_path, write_table
+from writers import WRITERS
+from xml2csv import convert_table
+
+SIZES = [10000, 1000000, 10000000]
+FORMATS = ['csv', 'npy']
+TOLERANCE_PERCENT = 20.0
+
+def peak_rss():
+    # 本进程的峰值常驻内存（字节）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 上单位为字节，Linux 上为 KiB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def run_stage(stage, schema, path, rows, processes, ref_density):
+    # 在本进程中运行一个阶段，返回 (秒数, 峰值 RSS, 输出字节数)
+    directory = os.path.dirname(path)
+    started = time.perf_counter()
+    if stage == 'generate':
+        write_table(path, schema, rows, processes, ref_density)
+        output = path
+    elif stage.startswith('convert-'):
+        output = os.path.splitext(path)[0] + WRITERS[stage[len('convert-'):]].suffix
+        convert_table(path, output, stage[len('convert-'):])
+    else:
+        metrics = [name for name, metric in METRICS.items() if metric.table.endswith('-' + schema)]
+        summarize(APP, directory, metrics)
+        output = None
+    seconds = time.perf_counter() - started
+    size = 0
+    if output is not None:
+        size = os.path.getsize(output) if os.path.isfile(output) else sum(
+            os.path.getsize(os.path.join(output, name)) for name in os.listdir(output))
+    return seconds, peak_rss(), size
+
+def isolated(stage, *args):
+    # 每个阶段用新的解释器，峰值 RSS 不受之前阶段的影响
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_stage, stage, *args).result()
+
+def run_benchmarks(sizes=SIZES, schemas=None, formats=FORMATS, processes=PROCESSES, ref_density=REF_DENSITY,
+                   directory=None, keep=False):
+    # [{rows, schema, stage, seconds, rows_per_second, peak_rss, input_bytes, output_bytes}]
+    results = []
+    for rows in sizes:
+        workdir = tempfile.mkdtemp(prefix=f'bench-{rows}-', dir=directory)
+        try:
+            for schema in schemas or SCHEMAS:
+                path = table_path(workdir, APP, schema)
+                stages = ['generate'] + [f'convert-{format}' for format in formats] + ['summarize']
+                for stage in stages:
+                    input_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+                    seconds, rss, output_bytes = isolated(stage, schema, path, rows, processes, ref_density)
+                    result = {
+                        'rows': rows,
+                        'schema': schema,
+                        'stage': stage,
+                        'seconds': seconds,
+                        'rows_per_second': rows / seconds if seconds else 0.0,
+                        'peak_rss': rss,
+                        'input_bytes': input_bytes,
+                        'output_bytes': output_bytes,
+                    }
+                    results.append(result)
+                    print_result(result)
+        finally:
+            if not keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def print_result(result):
+    print(f'{result["rows"]:>10} {result["schema"]:<32} {result["stage"]:<16} {result["seconds"]:>9.2f}s '
+          f'{result["rows_per_second"]:>12.0f} rows/s {result["peak_rss"] / 1024 ** 2:>9.1f} MiB', flush=True)
+
+def regressions(results, baseline, tolerance=TOLERANCE_PERCENT):
+    # 行/秒比基线下降超过 tolerance 百分比的结果
+    previous = {(b['rows'], b['schema'], b['stage']): b for b in baseline}
+    slower = []
+    for result in results:
+        base = previous.get((result['rows'], result['schema'], result['stage']))
+        if base and result['rows_per_second'] < base['rows_per_second'] * (1 - tolerance / 100):
+            slower.append((result, base))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description='在合成导出上测试转换和汇总的性能')
+    parser.add_argument('--rows', default=','.join(map(str, SIZES)), help='逗号分隔的表格行数')
+    parser.add_argument('--schemas', default=None, help=f'逗号分隔，默认全部：{", ".join(SCHEMAS)}')
+    parser.add_argument('--formats', default=','.join(FORMATS), help=f'转换格式，可选 {", ".join(sorted(WRITERS))}')
+    parser.add_argument('--processes', type=int, default=PROCESSES, help='sysmon-process 每次采样的进程数')
+    parser.add_argument('--ref-density', type=float, default=REF_DENSITY)
+    parser.add_argument('--dir', default=None, help='生成文件的目录，默认为系统临时目录')
+    parser.add_argument('--keep', action='store_true', help='保留生成和转换的文件')
+    parser.add_argument('--json', default=None, help='把结果写入该路径')
+    parser.add_argument('--baseline', default=None, help='用于比较的之前 --json 的结果')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE_PERCENT, help='允许的行/秒下降百分比')
+    args = parser.parse_args()
+
+    print(f'{"rows":>10} {"schema":<32} {"stage":<16} {"wall":>10} {"throughput":>19} {"peak RSS":>13}')
+    results = run_benchmarks(
+        [int(rows) for rows in args.rows.split(',')],
+        args.schemas.split(',') if args.schemas else None,
+        args.formats.split(','),
+        args.processes,
+        args.ref_density,
+        args.dir,
+        args.keep,
+    )
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for result, base in slower:
+            print(f'性能下降: {result["schema"]} {result["stage"]} {result["rows"]} 行: '
+                  f'{result["rows_per_second"]:.0f} 行/秒，基线 {base["rows_per_second"]:.0f} 行/秒', file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
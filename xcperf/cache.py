@@ -0,0 +1,236 @@
+"""导出表格的内容寻址缓存
+
+导出的 XML 以 .trace 内容的摘要和导出 XPath 为键，转换后的文件再加上转换器版本和输出格式；没有变化的 trace 不会重复导出和转换。
+缓存大小有上限，超过时淘汰最久未使用的条目。
+
+run: `python3 cache.py stats|evict|clear [--dir DIR] [--max-bytes N]`
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from writers import commit, partial_path, remove_path
+from xml2csv import CONVERTER_VERSION
+
+# 缓存目录，可用环境变量 XCPERF_CACHE 修改
+CACHE_DIR = os.environ.get('XCPERF_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'xcperf'))
+MAX_BYTES = 2 * 1024 ** 3
+CHUNK = 1024 * 1024
+
+def tree_files(path):
+    # .trace 是目录（bundle），按相对路径排序列出其中所有文件
+    if os.path.isfile(path):
+        return [(os.path.basename(path), path)]
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            files.append((os.path.relpath(full, path), full))
+    return sorted(files)
+
+def tree_signature(files):
+    # 文件列表、大小和修改时间，没变时可以复用上次算出的摘要
+    return [[relative, os.path.getsize(full), os.stat(full).st_mtime_ns] for relative, full in files]
+
+def tree_digest(files):
+    # 按相对路径和内容计算 sha256，files 为 tree_files 的结果
+    sha = hashlib.sha256()
+    for relative, full in files:
+        sha.update(relative.encode() + b'\0')
+        with open(full, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+def tree_size(path):
+    return sum(os.path.getsize(full) for _, full in tree_files(path))
+
+def copy_path(source, destination):
+    if os.path.isdir(source):
+        if os.path.isdir(destination):
+            shutil.rmtree(destination)
+        shutil.copytree(source, destination)
+    else:
+        shutil.copy2(source, destination)
+
+class TableCache:
+    def __init__(self, directory=None, max_bytes=MAX_BYTES):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.digests = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    @contextmanager
+    def locked(self):
+        # 多个导出进程共享同一个缓存目录，索引和统计的读写需要加锁
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_json(self, name, default):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def write_json(self, name, value):
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+    def trace_digest(self, trace):
+        # bundle 内容的 sha256；文件列表、大小和修改时间都没变时复用上次算出的摘要
+        trace = os.path.abspath(trace)
+        files = tree_files(trace)
+        signature = tree_signature(files)
+        if trace in self.digests and self.digests[trace][0] == signature:
+            return self.digests[trace][1]
+        with self.locked():
+            known = self.read_json('digests.json', {})
+        if trace in known and known[trace][0] == signature:
+            digest = known[trace][1]
+        else:
+            digest = tree_digest(files)
+            with self.locked():
+                known = self.read_json('digests.json', {})
+                known[trace] = [signature, digest]
+                self.write_json('digests.json', known)
+        self.digests[trace] = (signature, digest)
+        return digest
+
+    def key(self, trace, xpath, format=None):
+        # 导出的 XML 只依赖 trace 内容和 XPath；转换结果还依赖转换器版本和输出格式
+        parts = [self.trace_digest(trace), xpath]
+        if format is not None:
+            parts += [CONVERTER_VERSION, format]
+        return hashlib.sha256('\0'.join(parts).encode()).hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def count(self, event):
+        with self.locked():
+            stats = self.read_json('stats.json', {'hits': 0, 'misses': 0, 'evictions': 0})
+            stats[event] += 1
+            self.write_json('stats.json', stats)
+
+    def get(self, key, files, count_miss=True):
+        # files 为 {条目中的文件名: 目标路径}；命中时把缓存的文件复制到各自的目标路径，返回写入时的 metadata，未命中返回 None
+        # 目标路径由调用方按本次的输出名给出，与写入缓存时用的文件名无关
+        # 一次查找先查转换结果再查导出的 XML 时，第一次未命中传 count_miss=False，避免同一次未命中计两次
+        entry = self.entry(key)
+        try:
+            with open(os.path.join(entry, 'metadata.json')) as f:
+                metadata = json.load(f)
+        except (OSError, ValueError):
+            metadata = None
+        if metadata is None or not set(files) <= set(metadata['files']):
+            if count_miss:
+                self.count('misses')
+            return None
+        for name, destination in files.items():
+            # 先复制到临时路径再替换，与其他阶段的输出一样不会留下不完整的文件
+            partial = partial_path(destination)
+            remove_path(partial)
+            copy_path(os.path.join(entry, name), partial)
+            commit(partial, destination)
+        # 更新访问时间，用于 LRU 淘汰
+        os.utime(entry)
+        self.count('hits')
+        return metadata
+
+    def put(self, key, files, metadata=None):
+        # files 为 {条目中的文件名: 源路径}；先写入临时目录再整体重命名，避免并发读到不完整的条目
+        entry = self.entry(key)
+        staging = f'{entry}.{os.getpid()}.tmp'
+        os.makedirs(staging, exist_ok=True)
+        for name, path in files.items():
+            copy_path(path, os.path.join(staging, name))
+        metadata = dict(metadata or {}, files=sorted(files), created=time.time())
+        with open(os.path.join(staging, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+        self.evict()
+
+    def entries(self):
+        # [(最近访问时间, 大小, 路径)]，按访问时间从旧到新
+        result = []
+        for prefix in os.listdir(self.directory):
+            prefix_dir = os.path.join(self.directory, prefix)
+            if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry = os.path.join(prefix_dir, key)
+                if entry.endswith('.tmp'):
+                    continue
+                result.append((os.stat(entry).st_mtime, tree_size(entry), entry))
+        return sorted(result)
+
+    def evict(self, max_bytes=None):
+        # 总大小超过上限时从最久未使用的条目开始删除
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            evicted += 1
+        if evicted:
+            with self.locked():
+                stats = self.read_json('stats.json', {'hits': 0, 'misses': 0, 'evictions': 0})
+                stats['evictions'] += evicted
+                self.write_json('stats.json', stats)
+        return evicted
+
+    def stats(self):
+        entries = self.entries()
+        stats = self.read_json('stats.json', {'hits': 0, 'misses': 0, 'evictions': 0})
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+        })
+        return stats
+
+    def clear(self):
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+        for name in ('stats.json', 'digests.json'):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='查看或清理导出表格的缓存')
+    parser.add_argument('command', choices=['stats', 'evict', 'clear'])
+    parser.add_argument('--dir', default=None, help='缓存目录')
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES, help='缓存大小上限')
+    args = parser.parse_args()
+
+    cache = TableCache(args.dir, args.max_bytes)
+    if args.command == 'evict':
+        print('已淘汰', cache.evict())
+    elif args.command == 'clear':
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+
+if __name__ == '__main__':
+    main()
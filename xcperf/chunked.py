@@ -0,0 +1,319 @@
+"""大文件按行范围并行转换
+
+把导出的 XML 内存映射后在 <row> 边界切成若干范围：先由多个进程并行扫描每个范围定义的 id 和引用的 ref，
+再由多个进程各自转换一个范围，最后按文件顺序拼接，输出与按顺序转换逐字节相同。
+由 xml2csv.py --jobs N 调用；直接运行时输出文件会被切分成的范围。
+
+run: `python3 chunked.py <xml> [--jobs N] [--range-mb 64]`
+eg: `python3 xml2csv.py --jobs 8 --format parquet SynthApp-ActivityMonitor-sysmon-process.xml`
+"""
+
+import argparse
+import csv
+import mmap
+import os
+import re
+import shutil
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from decode import decoded_columns, row_decoder
+from profiler import PROFILER, add_arguments, configure, count, report_timings, span
+from table import Table
+from writers import WRITERS, atomic_output, partial_path, remove_path
+from xml2csv import Column, cell_to_data, iter_events, node_to_cell, node_to_data, open_writer
+
+# 小于该大小的文件在一个进程中转换，启动子进程的开销比节省的时间多
+PARALLEL_MIN_BYTES = 32 * 1024 ** 2
+# 每个进程大约分到 4 个范围，一个慢的范围不会拖住其他进程
+RANGES_PER_JOB = 4
+MIN_RANGE_BYTES = 4 * 1024 ** 2
+MAX_RANGE_BYTES = 64 * 1024 ** 2
+# 每次交给解析器的字节数；块越大，iter_events 清理之前解析器一次构建的行越多，反而更慢
+CHUNK_BYTES = 64 * 1024
+
+# 导出中的一个表格；ranges 为 checkpoints() 切分出的 [(start, end)]
+TableIndex = namedtuple('TableIndex', ['name', 'columns', 'ranges'])
+# 从 <row> 开始的 [start, end) 字节范围；refs 为范围之前定义、范围中引用的 {(tag, id): (text, fmt)}
+Range = namedtuple('Range', ['start', 'end', 'refs'])
+
+ATTRIBUTES = r"""(?:\s+[\w.:-]+\s*=\s*(?:"[^"]*"|'[^']*'))*"""
+TAG = r'[A-Za-z_][\w.-]*'
+# 第一个属性为 id 或 ref 的开始标签（xctrace 的写法）：(tag, value)
+# 匹配任意位置的属性大约慢一倍；扫描漏掉的 ref 会让该范围失败，见 SplitError
+DEFINITION = re.compile(rf"""<({TAG})\s+id\s*=\s*["']([^"']*)["']""".encode())
+REFERENCE = re.compile(rf"""<({TAG})\s+ref\s*=\s*["']([^"']*)["']""".encode())
+START_TAG = re.compile(rf"""<(?P<tag>{TAG})(?P<attributes>{ATTRIBUTES})\s*(?P<empty>/?)>""".encode())
+ROW = re.compile(rb'<row[\s/>]')
+SCHEMA = re.compile(rb'<schema[\s>]')
+SCHEMA_END = re.compile(rb'</schema\s*>')
+NODE_END = re.compile(rb'</node\s*>')
+ATTRIBUTE = re.compile(rb"""([\w.:-]+)\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+ENTITY = re.compile(r'&(?:#(\d+)|#x([0-9A-Fa-f]+)|(lt|gt|amp|quot|apos));')
+ENTITIES = {'lt': '<', 'gt': '>', 'amp': '&', 'quot': '"', 'apos': "'"}
+ENCODING = re.compile(rb"""^<\?xml[^>]*encoding\s*=\s*["']([\w.-]+)["']""")
+
+class SplitError(ValueError):
+    # 范围中引用了扫描时没有找到的 id，改为按顺序转换整个文件
+    pass
+
+def unescape(text):
+    if '&' not in text:
+        return text
+    return ENTITY.sub(lambda m: chr(int(m[1])) if m[1] else chr(int(m[2], 16)) if m[2] else ENTITIES[m[3]], text)
+
+def attribute_value(raw):
+    # 与解析器的结果一致：换行和制表符替换为空格，再替换实体引用
+    return unescape(re.sub(r'\r\n|[\t\n\r]', ' ', raw.decode()))
+
+def element_cell(mapped, offset, tag):
+    # offset 处元素的 (text, fmt)，与 xml2csv.node_to_cell 相同；不是 tag 元素时返回 None
+    match = START_TAG.match(mapped, offset)
+    if match['tag'] != tag:
+        return None
+    fmt = None
+    for name, double, single in ATTRIBUTE.findall(match['attributes']):
+        if name == b'fmt':
+            fmt = attribute_value(double or single)
+    if match['empty']:
+        return None, fmt
+    end = mapped.find(b'<', match.end())
+    if end == match.end():
+        return None, fmt
+    text = mapped[match.end():end].decode().replace('\r\n', '\n').replace('\r', '\n')
+    return unescape(text), fmt
+
+def open_mapped(xml_file):
+    with open(xml_file, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def range_size(size, jobs):
+    return min(MAX_RANGE_BYTES, max(MIN_RANGE_BYTES, size // max(1, jobs * RANGES_PER_JOB)))
+
+def row_checkpoints(mapped, start, end, range_bytes):
+    # 每隔 range_bytes 在之后的第一个 <row> 处切分 [start, end)
+    ranges = []
+    while True:
+        match = ROW.search(mapped, start + range_bytes, end)
+        if match is None:
+            ranges.append((start, end))
+            return ranges
+        ranges.append((start, match.start()))
+        start = match.start()
+
+def checkpoints(xml_file, range_bytes=MAX_RANGE_BYTES):
+    # 导出中的表格及其行范围 [TableIndex]；文件无法切分时返回 None
+    # 每个表格的行范围覆盖它的所有行，切分点由向后跳 range_bytes 再找下一个 <row> 得到
+    if os.path.getsize(xml_file) == 0:
+        return None
+    with span('checkpoints', input=xml_file), open_mapped(xml_file) as mapped:
+        encoding = ENCODING.match(mapped[:256])
+        if encoding and encoding[1].lower().replace(b'_', b'-') not in (b'utf-8', b'utf8'):
+            return None
+        tables = []
+        position = 0
+        while True:
+            schema = SCHEMA.search(mapped, position)
+            if schema is None:
+                return tables
+            schema_end = SCHEMA_END.search(mapped, schema.start())
+            node_end = NODE_END.search(mapped, schema_end.end()) if schema_end else None
+            if node_end is None:
+                # 导出不完整，交给按顺序解析报告错误
+                return None
+            element = ET.fromstring(mapped[schema.start():schema_end.end()])
+            columns = [Column(col.findtext('name'), col.findtext('mnemonic'), col.findtext('engineering-type'))
+                       for col in element.iter('col')]
+            first_row = ROW.search(mapped, schema_end.end(), node_end.start())
+            ranges = []
+            if first_row is not None:
+                ranges = row_checkpoints(mapped, first_row.start(), node_end.start(), range_bytes)
+            tables.append(TableIndex(element.attrib['name'], columns, ranges))
+            position = node_end.end()
+
+def index_range(xml_file, start, end):
+    # 在子进程中扫描一个范围：返回范围中每个 id 的偏移 {id: offset}、引用其他范围的 {(tag, id)} 和子进程的 profile
+    # 只用正则表达式扫描映射的字节，不构建元素；id 和 tag 都是 bytes
+    with span('index_range', input=xml_file, start=start, bytes=end - start), open_mapped(xml_file) as mapped:
+        offsets = {}
+        for match in DEFINITION.finditer(mapped, start, end):
+            offsets.setdefault(match[2], match.start())
+        # 大多数行都有重复的 ref，先由正则引擎生成列表再去重
+        refs = {key for key in set(REFERENCE.findall(mapped, start, end)) if key[1] not in offsets}
+    return offsets, refs, PROFILER.drain()
+
+def index_tables(xml_file, tables, pool):
+    # 在 pool 中扫描所有表格的范围，按文件顺序产出 (表格序号, Range)
+    # 按顺序为每个范围取出它引用的、之前范围中定义的 ref 的值；已出现的 id 偏移保留到最后一个范围
+    bounds = [(number, start, end) for number, table in enumerate(tables) for start, end in table.ranges]
+    indexed = pool.map(index_range, [xml_file] * len(bounds), [start for _, start, _ in bounds],
+                       [end for _, _, end in bounds])
+    offsets = {}
+    with open_mapped(xml_file) as mapped:
+        for (number, start, end), (defined, used, drained) in zip(bounds, indexed):
+            PROFILER.merge(drained)
+            refs = {}
+            for tag, ref in used:
+                offset = offsets.get(ref)
+                cell = element_cell(mapped, offset, tag) if offset is not None else None
+                # 找不到的 ref 留给解析器，该范围转换时失败
+                if cell is not None:
+                    refs[tag.decode(), ref.decode()] = cell
+            for ref, offset in defined.items():
+                offsets.setdefault(ref, offset)
+            yield number, Range(start, end, refs)
+    count('refs_indexed', len(offsets))
+
+class RangeReader:
+    # 读取映射文件 [start, end) 字节的类文件对象，外面包一层根元素
+    def __init__(self, mapped, start, end, chunk=CHUNK_BYTES):
+        self.mapped = mapped
+        self.position = start
+        self.end = end
+        self.chunk = chunk
+        self.head = b'<range>'
+        self.tail = b'</range>'
+
+    def read(self, size=-1):
+        # 解析器每次请求 16 KiB，返回最多一个 chunk 的映射字节
+        if self.head:
+            data, self.head = self.head, b''
+            return data
+        if self.position >= self.end:
+            data, self.tail = self.tail, b''
+            return data
+        size = self.chunk if size is None or size < 0 else max(size, self.chunk)
+        data = self.mapped[self.position:min(self.end, self.position + size)]
+        self.position += len(data)
+        return data
+
+def convert_range(xml_file, table_range, columns, format='csv', keep_fmt=False, where=None, part=None):
+    # 在子进程中转换一个范围，返回 (结果, 子进程的 profile)，内存占用与范围大小而不是文件大小成正比
+    # CSV 的行不带表头写入 part，结果为行数；列式格式的结果为解码后的 Table
+    with span('convert_range', input=xml_file, start=table_range.start, bytes=table_range.end - table_range.start):
+        raw = WRITERS[format].raw
+        refs = {key: cell if raw else cell_to_data(cell) for key, cell in table_range.refs.items()}
+        processes = {key[1]: cell_to_data(cell) for key, cell in table_range.refs.items() if key[0] == 'process'}
+        with open_mapped(xml_file) as mapped:
+            source = RangeReader(mapped, table_range.start, table_range.end)
+            events = iter_events(source, node_to_cell if raw else node_to_data, where, refs, processes, columns)
+            if raw:
+                result = Table(*decoded_columns(columns, keep_fmt))
+                decode = row_decoder(columns, keep_fmt)
+                for _, data in events:
+                    result.append(decode(data))
+            else:
+                result = 0
+                with open(part, 'w', newline='') as output:
+                    writer = csv.writer(output)
+                    for _, data in events:
+                        writer.writerow(data)
+                        result += 1
+    return result, PROFILER.drain()
+
+def split(xml_file, jobs=None, range_bytes=None):
+    # 值得用 jobs 个进程（None 为 CPU 数）并行转换时返回 checkpoints() 的结果，否则为 None
+    jobs = jobs or os.cpu_count()
+    size = os.path.getsize(xml_file)
+    if jobs < 2 or size < PARALLEL_MIN_BYTES:
+        return None
+    return checkpoints(xml_file, range_bytes or range_size(size, jobs))
+
+def write_indexed(xml_file, tables, outputs, format='csv', keep_fmt=False, where=None, jobs=None):
+    # 用 jobs 个进程把 checkpoints() 的表格转换到 outputs，返回 [(schema_name, output, 行数)]
+    # 范围的 ref 确定后立即提交转换，完成顺序不定，按文件顺序拼接；每个输出原子写入，一个范围失败则整个转换失败
+    # 范围引用了扫描时没有找到的 id（导出损坏，或标签不是 xctrace 的写法）时抛出 SplitError
+    writer_class = WRITERS[format]
+    results = []
+    parts = []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        try:
+            submitted = [[] for _ in tables]
+            for number, table_range in index_tables(xml_file, tables, pool):
+                part = None
+                if not writer_class.raw:
+                    part = f'{partial_path(outputs[number])}.{len(submitted[number])}'
+                    parts.append(part)
+                submitted[number].append(pool.submit(convert_range, xml_file, table_range, tables[number].columns,
+                                                      format, keep_fmt, where, part))
+            for table, output, futures in zip(tables, outputs, submitted):
+                results.append((table.name, output, join(futures, output, table.columns, writer_class, keep_fmt)))
+        except KeyError as e:
+            # iter_events 按 (tag, id) 查找 ref
+            pool.shutdown(cancel_futures=True)
+            raise SplitError(f'{xml_file}: ref {e} 在所属范围之前没有定义') from e
+        except BaseException:
+            pool.shutdown(cancel_futures=True)
+            raise
+        finally:
+            for part in parts:
+                remove_path(part)
+    return results
+
+def join(futures, output, columns, writer_class, keep_fmt):
+    # 按文件顺序把一个表格转换好的范围写入 output，返回行数
+    rows = 0
+    with atomic_output(output) as partial:
+        writer, _, _ = open_writer(writer_class, partial, columns, keep_fmt)
+        if not writer_class.raw:
+            # 先写表头，再原样追加各个范围的 CSV
+            writer.close()
+        with open(partial, 'ab') if not writer_class.raw else nullcontext() as target:
+            for number, future in enumerate(futures):
+                result, drained = future.result()
+                PROFILER.merge(drained)
+                if writer_class.raw:
+                    writer.table.extend(result)
+                    rows += len(result)
+                else:
+                    part = f'{partial}.{number}'
+                    with open(part, 'rb') as source:
+                        shutil.copyfileobj(source, target)
+                    remove_path(part)
+                    rows += result
+        if writer_class.raw:
+            writer.close()
+    return rows
+
+def write_table(xml_file, tables, output, format='csv', keep_fmt=False, where=None, jobs=None):
+    # 多进程版本的 xml2csv.write_table：把 split() 的第一个表格写入 output，返回 (schema_name, 列名, 行数) 或 None
+    if not tables:
+        return None
+    (schema_name, output, rows), = write_indexed(xml_file, tables[:1], [output], format, keep_fmt, where, jobs)
+    columns = tables[0].columns
+    names = decoded_columns(columns, keep_fmt)[0] if WRITERS[format].raw else [column.name for column in columns]
+    return schema_name, names, rows
+
+def write_tables(xml_file, tables, prefix, format='csv', keep_fmt=False, where=None, jobs=None):
+    # 多进程版本的 xml2csv.write_tables：把 split() 的每个表格写入 {prefix}{schema}{suffix}
+    outputs = [prefix + table.name + WRITERS[format].suffix for table in tables]
+    return write_indexed(xml_file, tables, outputs, format, keep_fmt, where, jobs)
+
+def main():
+    parser = argparse.ArgumentParser(description='输出导出文件并行转换时切分成的字节范围')
+    parser.add_argument('xml')
+    parser.add_argument('--jobs', type=int, default=None, help='进程数，默认为 CPU 数')
+    parser.add_argument('--range-mb', type=float, default=None, help='每个范围的大小（MiB），默认由文件大小和 --jobs 决定')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    jobs = args.jobs or os.cpu_count()
+    range_bytes = int(args.range_mb * 1024 ** 2) if args.range_mb else range_size(os.path.getsize(args.xml), jobs)
+    tables = checkpoints(args.xml, range_bytes)
+    if tables is None:
+        print(f'{args.xml} 无法切分，将按顺序转换')
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        indexed = list(index_tables(args.xml, tables, pool))
+    for number, table in enumerate(tables):
+        ranges = [table_range for table_number, table_range in indexed if table_number == number]
+        print(f'{table.name}: {len(ranges)} ranges')
+        for table_range in ranges:
+            print(f'  {table_range.start:>14} {table_range.end:>14} {len(table_range.refs):>8} refs')
+    report_timings(args)
+
+if __name__ == '__main__':
+    main()
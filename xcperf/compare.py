@@ -0,0 +1,173 @@
+"""两组基准测试结果的回归比较
+
+逐个指标（CPU、内存、FPS、GPU 等）比较候选版本与基线：均值的相对变化、Mann-Whitney U 检验和均值差的 bootstrap 置信区间。
+指标朝变差的方向变化超过阈值且显著时记为回归，有回归时退出码为 1，可用于发布流程的检查。
+每一边是 summarize.py 的汇总（summary-<app>.json，只能比较汇总统计量），或者一个或多个 [dir/]app（逐样本读取导出的表格，重复该参数合并多次运行）。
+汇总之间的比较没有样本，无法检验显著性：单独列出，默认不记为回归，--summary-regressions 时变差超过阈值即记为回归。
+
+run: `python3 compare.py --baseline <spec> --candidate <spec> [--threshold 5] [--threshold fps=3] [--alpha 0.05] [--summary-regressions]`
+eg: `python3 compare.py --baseline mock/MockTaobao --candidate makepad/makepad_taobao`
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from summarize import METRICS, metric_samples, parse_metrics
+from writers import atomic_output
+
+THRESHOLD_PERCENT = 5.0
+ALPHA = 0.05
+BOOTSTRAP = 1000
+# 样本更多时 bootstrap 随机抽取这么多个
+BOOTSTRAP_SAMPLES = 10000
+
+def mann_whitney(x, y):
+    # 双侧 Mann-Whitney U 检验，使用带结校正的正态近似；返回 (U, p)
+    n1, n2 = len(x), len(y)
+    if n1 == 0 or n2 == 0:
+        return math.nan, math.nan
+    ranks = pd.Series(np.concatenate([x, y])).rank(method='average').to_numpy()
+    u = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    _, ties = np.unique(ranks, return_counts=True)
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return float(u), 1.0
+    z = (u - n1 * n2 / 2) / math.sqrt(variance)
+    return float(u), math.erfc(abs(z) / math.sqrt(2))
+
+def bootstrap_ci(x, y, iterations=BOOTSTRAP, confidence=0.95, seed=0):
+    # mean(y) - mean(x) 的 bootstrap 置信区间
+    if len(x) == 0 or len(y) == 0:
+        return math.nan, math.nan
+    rng = np.random.default_rng(seed)
+    if len(x) > BOOTSTRAP_SAMPLES:
+        x = rng.choice(x, BOOTSTRAP_SAMPLES, replace=False)
+    if len(y) > BOOTSTRAP_SAMPLES:
+        y = rng.choice(y, BOOTSTRAP_SAMPLES, replace=False)
+    means_x = x[rng.integers(0, len(x), (iterations, len(x)))].mean(axis=1)
+    means_y = y[rng.integers(0, len(y), (iterations, len(y)))].mean(axis=1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means_y - means_x, [tail, 100 - tail])
+    return float(low), float(high)
+
+def relative_change(baseline, candidate):
+    if baseline == 0 or math.isnan(baseline) or math.isnan(candidate):
+        return math.nan
+    return (candidate - baseline) / abs(baseline) * 100
+
+def is_worse(metric, change):
+    better = METRICS[metric].better if metric in METRICS else 'lower'
+    return change < 0 if better == 'higher' else change > 0
+
+def compare_metric(metric, baseline, candidate, threshold, alpha=ALPHA, bootstrap=BOOTSTRAP, summary_regressions=False):
+    # 比较一个指标；baseline/candidate 为样本数组或汇总 dict
+    # 汇总没有样本，testable 为 False，只有 summary_regressions 时变差超过阈值（worse）才记为回归
+    testable = not isinstance(baseline, dict)
+    if not testable:
+        base_mean, cand_mean = baseline['mean'], candidate['mean']
+        p_value, ci = math.nan, (math.nan, math.nan)
+    else:
+        base_mean, cand_mean = float(np.mean(baseline)), float(np.mean(candidate))
+        _, p_value = mann_whitney(baseline, candidate)
+        ci = bootstrap_ci(baseline, candidate, bootstrap) if bootstrap else (math.nan, math.nan)
+    change = relative_change(base_mean, cand_mean)
+    worse = bool(not math.isnan(change) and is_worse(metric, change) and abs(change) > threshold)
+    regression = worse and (p_value < alpha if testable else summary_regressions)
+    return {
+        'baseline': base_mean,
+        'candidate': cand_mean,
+        'delta': cand_mean - base_mean,
+        'change_percent': change,
+        'p_value': p_value,
+        'ci_low': ci[0],
+        'ci_high': ci[1],
+        'threshold_percent': threshold,
+        'testable': testable,
+        'worse': worse,
+        'regression': regression,
+    }
+
+def load_side(specs, metrics=None):
+    # .json 为汇总 dict，否则为所有 [dir/]app 合并后的逐样本数组
+    if len(specs) == 1 and specs[0].endswith('.json'):
+        with open(specs[0]) as f:
+            return json.load(f)
+    pooled = {}
+    for spec in specs:
+        directory, app = os.path.split(spec)
+        for name, values in metric_samples(app, directory or '.', metrics).items():
+            pooled.setdefault(name, []).append(values)
+    return {name: np.concatenate(parts) for name, parts in pooled.items()}
+
+def compare(baseline, candidate, thresholds=None, default_threshold=THRESHOLD_PERCENT, alpha=ALPHA, bootstrap=BOOTSTRAP,
+            summary_regressions=False):
+    # 两边都有的每个指标的比较结果 {指标: 比较}
+    thresholds = thresholds or {}
+    result = {}
+    for metric in baseline:
+        if metric not in candidate:
+            continue
+        if isinstance(baseline[metric], dict) != isinstance(candidate[metric], dict):
+            raise ValueError('两边必须都是汇总或都是样本')
+        result[metric] = compare_metric(metric, baseline[metric], candidate[metric],
+                                        thresholds.get(metric, default_threshold), alpha, bootstrap, summary_regressions)
+    return result
+
+def parse_thresholds(values):
+    default, per_metric = THRESHOLD_PERCENT, {}
+    for value in values:
+        if '=' in value:
+            name, _, percent = value.partition('=')
+            per_metric[name] = float(percent)
+        else:
+            default = float(value)
+    return default, per_metric
+
+def main():
+    parser = argparse.ArgumentParser(description='比较两组基准测试结果并标出回归')
+    parser.add_argument('--baseline', action='append', required=True, help='汇总 .json 或 [dir/]app，可重复')
+    parser.add_argument('--candidate', action='append', required=True, help='汇总 .json 或 [dir/]app，可重复')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='逗号分隔的指标名，默认全部')
+    parser.add_argument('--threshold', action='append', default=[],
+                        help=f'允许的变化百分比，或 metric=percent（默认 {THRESHOLD_PERCENT:g}）')
+    parser.add_argument('--alpha', type=float, default=ALPHA, help='显著性水平')
+    parser.add_argument('--bootstrap', type=int, default=BOOTSTRAP, help='bootstrap 次数，0 表示不计算')
+    parser.add_argument('--summary-regressions', action='store_true',
+                        help='汇总之间的比较无法检验显著性，指定时变差超过阈值也记为回归')
+    parser.add_argument('--json', default=None, help='把比较结果写入该路径')
+    args = parser.parse_args()
+
+    metrics = args.metrics
+    default, per_metric = parse_thresholds(args.threshold)
+    result = compare(load_side(args.baseline, metrics), load_side(args.candidate, metrics),
+                     per_metric, default, args.alpha, args.bootstrap, args.summary_regressions)
+    if metrics:
+        result = {name: stats for name, stats in result.items() if name in metrics}
+
+    for name, stats in result.items():
+        if stats['testable']:
+            flag = 'REGRESSION' if stats['regression'] else 'ok'
+            print(f'{name}: {stats["baseline"]:.2f} -> {stats["candidate"]:.2f} ({stats["change_percent"]:+.1f}%, '
+                  f'p={stats["p_value"]:.3g}, 95% CI of delta=[{stats["ci_low"]:.2f}, {stats["ci_high"]:.2f}]) {flag}')
+    untested = {name: stats for name, stats in result.items() if not stats['testable']}
+    if untested:
+        # 没有样本的比较单独列出，不与检验过的回归混在一起
+        print('只有汇总，未检验显著性:')
+    for name, stats in untested.items():
+        flag = 'REGRESSION' if stats['regression'] else 'worse' if stats['worse'] else 'ok'
+        print(f'  {name}: {stats["baseline"]:.2f} -> {stats["candidate"]:.2f} ({stats["change_percent"]:+.1f}%) {flag}')
+    if args.json:
+        with atomic_output(args.json) as partial, open(partial, 'w') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if any(stats['regression'] for stats in result.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
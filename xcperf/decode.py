@@ -0,0 +1,157 @@
+import re
+
+# 根据导出表格 <schema> 中每列的 engineering-type / mnemonic，把单元格解码为数值类型。
+# 单元格以 (text, fmt) 的形式传入：text 是原始值，fmt 是 Instruments 显示的格式化文本。
+
+THERMAL_STATES = {
+    'nominal': 0,
+    'fair': 1,
+    'serious': 2,
+    'critical': 3,
+}
+
+SIZE_UNITS = {
+    'b': 1,
+    'bytes': 1,
+    'kb': 1000,
+    'mb': 1000 ** 2,
+    'gb': 1000 ** 3,
+    'kib': 1024,
+    'mib': 1024 ** 2,
+    'gib': 1024 ** 3,
+}
+
+TIME_UNITS = {
+    'ns': 1,
+    'µs': 1000,
+    'us': 1000,
+    'ms': 1000 ** 2,
+    's': 1000 ** 3,
+    'min': 60 * 1000 ** 3,
+}
+
+# uint64 单独存为无符号整数，其余整数类型都在 int64 的范围内
+INT_TYPES = {'uint32', 'uint16', 'uint8', 'int64', 'int32', 'int16', 'int8', 'count', 'fps', 'pid', 'tid'}
+FLOAT_TYPES = {'fixed-decimal', 'double', 'float'}
+
+def parse_number(fmt):
+    match = re.match(r'\s*(-?[\d,]*\.?\d+)', fmt)
+    if match is None:
+        return None
+    return float(match.group(1).replace(',', ''))
+
+def parse_percent(fmt):
+    # "28.4%" -> 28.4
+    return parse_number(fmt)
+
+def parse_size(fmt):
+    # "88.77 MiB" -> 93081108
+    match = re.match(r'\s*(-?[\d,]*\.?\d+)\s*([A-Za-z]*)', fmt)
+    if match is None:
+        return None
+    unit = SIZE_UNITS.get(match.group(2).lower(), 1)
+    return int(round(float(match.group(1).replace(',', '')) * unit))
+
+def parse_time(fmt):
+    # "00:01.234.567" (分:秒.毫秒.微秒) 或 "1.23 ms" -> 纳秒
+    match = re.match(r'\s*(?:(\d+):)?(\d+):(\d+)\.(\d+)(?:\.(\d+))?', fmt)
+    if match is not None:
+        hours, minutes, seconds, millis, micros = match.groups()
+        total = (int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)) * 1000 ** 3
+        return total + int(millis) * 1000 ** 2 + int(micros or 0) * 1000
+    match = re.match(r'\s*(-?\d*\.?\d+)\s*([^\d\s]+)', fmt)
+    if match is None or match.group(2) not in TIME_UNITS:
+        return None
+    return int(round(float(match.group(1)) * TIME_UNITS[match.group(2)]))
+
+def decode_int(text, fmt, parse_fmt=parse_number):
+    if text is not None:
+        try:
+            return int(text)
+        except ValueError:
+            try:
+                return int(float(text))
+            except ValueError:
+                pass
+    if fmt is not None:
+        value = parse_fmt(fmt)
+        return None if value is None else int(value)
+    return None
+
+def decode_float(text, fmt, parse_fmt=parse_number):
+    if text is not None:
+        try:
+            return float(text)
+        except ValueError:
+            pass
+    if fmt is not None:
+        return parse_fmt(fmt)
+    return None
+
+def decode_time(text, fmt):
+    return decode_int(text, fmt, parse_time)
+
+def decode_size(text, fmt):
+    return decode_int(text, fmt, parse_size)
+
+def decode_percent(text, fmt):
+    return decode_float(text, fmt, parse_percent)
+
+def decode_thermal_state(text, fmt):
+    for label in (fmt, text):
+        if label is not None and label.strip().lower() in THERMAL_STATES:
+            return THERMAL_STATES[label.strip().lower()]
+    return None
+
+def decode_string(text, fmt):
+    return fmt if fmt is not None else text
+
+def decode_raw(text, fmt):
+    # 未知类型保留原始文本，由 writer 推断类型
+    return text if text is not None else fmt
+
+def column_decoder(column):
+    # 返回 (dtype, decode)，dtype 为 None 表示交给 writer 推断
+    engineering_type = (column.engineering_type or '').lower()
+    mnemonic = (column.mnemonic or '').lower()
+    if 'thermal-state' in engineering_type:
+        return 'int8', decode_thermal_state
+    if engineering_type.endswith('time') or engineering_type.startswith('duration') or mnemonic in ('start', 'duration'):
+        return 'int64', decode_time
+    if 'percent' in engineering_type or 'percent' in mnemonic:
+        return 'float64', decode_percent
+    if 'size' in engineering_type or 'bytes' in engineering_type:
+        return 'int64', decode_size
+    if engineering_type == 'uint64':
+        return 'uint64', decode_int
+    if engineering_type in INT_TYPES:
+        return 'int64', decode_int
+    if engineering_type in FLOAT_TYPES:
+        return 'float64', decode_float
+    if engineering_type in ('string', 'process', 'thread', 'event-concept', 'narrative'):
+        return 'str', decode_string
+    return None, decode_raw
+
+def row_decoder(columns, keep_fmt=False):
+    # 返回把一行 (text, fmt) 单元格解码为数值的函数；keep_fmt 时在末尾追加每列的格式化文本
+    decoders = [column_decoder(column)[1] for column in columns]
+    def decode(cells):
+        data = [decode_cell(text, fmt) for decode_cell, (text, fmt) in zip(decoders, cells)]
+        if keep_fmt:
+            data.extend(fmt for _, fmt in cells)
+        return data
+    return decode
+
+def decode_rows(rows, columns, keep_fmt=False):
+    decode = row_decoder(columns, keep_fmt)
+    for cells in rows:
+        yield decode(cells)
+
+def decoded_columns(columns, keep_fmt=False):
+    # 解码后的列名和 dtype，与 decode_rows 的输出一一对应
+    names = [column.name for column in columns]
+    dtypes = [column_decoder(column)[0] for column in columns]
+    if keep_fmt:
+        names += [f'{column.name} (fmt)' for column in columns]
+        dtypes += ['str'] * len(columns)
+    return names, dtypes
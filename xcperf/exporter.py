@@ -0,0 +1,264 @@
+"""并行导出 trace 的表格
+
+在有上限的工作池中为每个 (trace, schema) 任务运行 `xcrun xctrace export`，失败时按指数退避重试，并在同一个 worker 中转换导出的表格。
+--single 时一个 trace 的所有 schema 由一次 XPath 为表格并集的 xctrace export 导出，再一遍拆分为每个 schema 一个文件，trace 只打开和解码一次。
+--cache 时 trace 没有变化就复用内容寻址缓存（cache.py）中导出和转换的表格。
+设置 XCRUN=/path/to/fake-xcrun（或 --xcrun）可以用替身命令运行。
+
+run: `python3 exporter.py <trace> <schema>... [--jobs N] [--format csv] [--single]`
+eg: `python3 exporter.py makepad_taobao-GamePerformance.trace displayed-surfaces-per-second device-thermal-state-intervals`
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+from cache import MAX_BYTES, TableCache
+from profiler import PROFILER, add_arguments, configure, count, report_timings, span
+from xml2csv import convert_table, split_tables
+from writers import WRITERS, commit, partial_path, remove_path
+
+logger = logging.getLogger(__name__)
+
+# xcrun 可执行文件路径，测试时可以用环境变量 XCRUN 指向一个输出固定 XML 的替身
+XCRUN = os.environ.get('XCRUN', 'xcrun')
+MAX_RETRIES = 3
+BACKOFF = 1.0
+WORKERS = 4
+# 一次导出多个表格时合并结果的文件名后缀
+COMBINED = 'tables.xml'
+
+# schema 为元组时表示一次导出多个表格，output 为合并结果 {prefix}tables.xml
+ExportJob = namedtuple('ExportJob', ['trace', 'schema', 'output', 'run'], defaults=[1])
+# cached: None，或者结果来自缓存时为 'exported'（只复用了导出的 XML）/ 'converted'（连转换结果也复用）
+ExportResult = namedtuple('ExportResult', ['job', 'ok', 'attempts', 'export_time', 'convert_time', 'rows', 'error', 'cached'], defaults=[None])
+
+def table_xpath(schema, run=1):
+    return f'/trace-toc/run[@number="{run}"]/data/table[@schema="{schema}"]'
+
+def tables_xpath(schemas, run=1):
+    # XPath 并集，一次导出中包含所有表格
+    return ' | '.join(table_xpath(schema, run) for schema in schemas)
+
+def table_output(trace, schema):
+    # 与 xcperf-v2 相同的命名：{trace 去掉 .trace}-{schema}.xml
+    return trace.replace('.trace', '') + '-' + schema + '.xml'
+
+def tables_job(trace, schemas, prefix=None, run=1):
+    # 一次导出多个表格的任务，拆分后的文件与逐个导出时同名：{prefix}{schema}{suffix}
+    if prefix is None:
+        prefix = trace.replace('.trace', '') + '-'
+    return ExportJob(trace, tuple(schemas), prefix + COMBINED, run)
+
+def schema_label(schema):
+    return schema if isinstance(schema, str) else ', '.join(schema)
+
+def job_xpath(job):
+    if isinstance(job.schema, str):
+        return table_xpath(job.schema, job.run)
+    return tables_xpath(job.schema, job.run)
+
+def export_command(job, xcrun=None):
+    return [
+        xcrun or XCRUN, 'xctrace', 'export',
+        '--input', job.trace,
+        '--xpath', job_xpath(job),
+        '--output', job.output,
+    ]
+
+def run_export(job, xcrun=None, retries=MAX_RETRIES, backoff=BACKOFF, timeout=None):
+    # 执行导出命令，失败时重试；返回 (尝试次数, error)，成功时 error 为 None
+    # xctrace 先导出到临时文件，成功后再重命名为 job.output，失败或超时不会留下不完整的 XML
+    partial = partial_path(job.output)
+    command = export_command(job._replace(output=partial), xcrun)
+    error = None
+    for attempt in range(1, retries + 1):
+        logger.info(' '.join(command))
+        remove_path(partial)
+        try:
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    universal_newlines=True, timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            error = str(e)
+        else:
+            if result.returncode == 0 and os.path.exists(partial):
+                commit(partial, job.output)
+                return attempt, None
+            error = f'exit {result.returncode}: {result.stderr.strip()}'
+        logger.error("导出 %s 的 %s 失败 (%s/%s): %s", job.trace, schema_label(job.schema), attempt, retries, error)
+        remove_path(partial)
+        if attempt < retries:
+            time.sleep(backoff * 2 ** (attempt - 1))
+    return retries, error
+
+def convert_job(job, format):
+    # 转换导出的 XML，返回 (输出文件列表, 行数, 缺失的 schema)
+    # 转换结果与导出的 XML 放在同一目录
+    if isinstance(job.schema, str):
+        output = os.path.splitext(job.output)[0] + WRITERS[format].suffix
+        converted = convert_table(job.output, output, format=format)
+        if converted is None:
+            return [], 0, [job.schema]
+        return [output], converted[2], []
+    tables = split_tables(job.output, job.output[:-len(COMBINED)], format=format)
+    missing = sorted(set(job.schema) - {schema for schema, _, _ in tables})
+    return [output for _, output, _ in tables], sum(count for _, _, count in tables), missing
+
+def export_job(job, xcrun=None, retries=MAX_RETRIES, backoff=BACKOFF, timeout=None, format='csv', cache=None):
+    # 导出一个表格并按需转换，返回 ExportResult；不抛出异常，失败记录在 error 中
+    # 指定 cache（cache.TableCache）时，trace 内容没变的导出和转换结果直接从缓存取
+    with span('export_job', trace=job.trace, schema=schema_label(job.schema), run=job.run) as args:
+        result = run_job(job, xcrun, retries, backoff, timeout, format, cache)
+        args.update(ok=result.ok, attempts=result.attempts, cached=result.cached, rows=result.rows)
+    if result.attempts > 1:
+        count('retries', result.attempts - 1)
+    if result.cached:
+        count('cache_hits')
+    return result
+
+def export_files(job):
+    # 导出的 XML 在缓存条目中的文件名 -> 本次的输出路径
+    return {'export.xml': job.output}
+
+def converted_files(job, format):
+    # 转换结果在缓存条目中按 schema 命名，取回时按本次的 job.output 得出目标路径（与 convert_job 的命名相同）
+    suffix = WRITERS[format].suffix
+    if isinstance(job.schema, str):
+        return {job.schema + suffix: os.path.splitext(job.output)[0] + suffix}
+    prefix = job.output[:-len(COMBINED)]
+    return {schema + suffix: prefix + schema + suffix for schema in job.schema}
+
+def job_cache(job, cache):
+    # trace 不存在（例如只有导出的 XML）时不使用缓存
+    if cache is not None and not os.path.exists(job.trace):
+        logger.warning("%s 不存在，不使用缓存", job.trace)
+        return None
+    return cache
+
+def cached_job(job, format, cache):
+    # 转换结果命中缓存时返回 ExportResult，否则返回 None
+    # 这里未命中时还会查导出的 XML，一次任务只记一次未命中
+    if cache is None or format is None:
+        return None
+    hit = cache.get(cache.key(job.trace, job_xpath(job), format), converted_files(job, format), count_miss=False)
+    if hit is None:
+        return None
+    return ExportResult(job, True, 0, 0.0, 0.0, hit['rows'], None, 'converted')
+
+def cached_export(job, cache):
+    # 导出的 XML 命中缓存时复制到 job.output 并返回 True
+    return cache is not None and cache.get(cache.key(job.trace, job_xpath(job)), export_files(job)) is not None
+
+def cache_export(job, cache):
+    if cache is not None:
+        cache.put(cache.key(job.trace, job_xpath(job)), export_files(job))
+
+def convert_export(job, attempt, export_time, format, cache, cached=None):
+    # 转换已导出的 XML 并把转换结果写入缓存，返回 ExportResult
+    rows = 0
+    convert_time = 0.0
+    if format is not None:
+        started = time.perf_counter()
+        try:
+            outputs, rows, missing = convert_job(job, format)
+        except Exception as e:
+            # 导出的 XML 无法解析或读写失败时记为失败的结果，不让异常从进程池中抛出
+            return ExportResult(job, False, attempt, export_time, time.perf_counter() - started, 0,
+                                f'转换 {job.output} 失败: {e!r}', cached)
+        convert_time = time.perf_counter() - started
+        if missing:
+            return ExportResult(job, False, attempt, export_time, convert_time, rows,
+                                f'{job.output} 中没有 {", ".join(missing)} 的数据，无法转换', cached)
+        if cache is not None:
+            cache.put(cache.key(job.trace, job_xpath(job), format), converted_files(job, format), {'rows': rows})
+    return ExportResult(job, True, attempt, export_time, convert_time, rows, None, cached)
+
+def run_job(job, xcrun, retries, backoff, timeout, format, cache):
+    cache = job_cache(job, cache)
+    result = cached_job(job, format, cache)
+    if result is not None:
+        return result
+
+    started = time.perf_counter()
+    cached = None
+    if cached_export(job, cache):
+        attempt, error, cached = 0, None, 'exported'
+    else:
+        with span('xctrace_export', trace=job.trace, schema=schema_label(job.schema)):
+            attempt, error = run_export(job, xcrun, retries, backoff, timeout)
+        if error is None:
+            cache_export(job, cache)
+    export_time = time.perf_counter() - started
+    if error is not None:
+        return ExportResult(job, False, attempt, export_time, 0.0, 0, error, cached)
+    return convert_export(job, attempt, export_time, format, cache, cached)
+
+def traced_export_job(job, **options):
+    # 在子进程中执行导出任务，连同子进程记录的 span 和计数器一起返回
+    return export_job(job, **options), PROFILER.drain()
+
+def export_tables(jobs, workers=WORKERS, executor='process', **options):
+    # 在有上限的进程池（或线程池）中并行执行导出任务，按完成顺序返回结果
+    pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+    task = traced_export_job if executor == 'process' else export_job
+    results = []
+    with pool_class(max_workers=workers) as pool:
+        futures = [pool.submit(partial(task, job, **options)) for job in jobs]
+        for future in as_completed(futures):
+            result = future.result()
+            if executor == 'process':
+                result, drained = result
+                PROFILER.merge(drained)
+            log_result(result)
+            results.append(result)
+    return results
+
+def log_result(result):
+    if result.ok and result.cached:
+        logger.info("导出 %s 的 %s 命中缓存 (%s): 导出 %.2fs, 转换 %.2fs, %s 行",
+                    result.job.trace, schema_label(result.job.schema), result.cached,
+                    result.export_time, result.convert_time, result.rows)
+    elif result.ok:
+        logger.info("导出 %s 的 %s 完成: 第 %s 次尝试, 导出 %.2fs, 转换 %.2fs, %s 行",
+                    result.job.trace, schema_label(result.job.schema), result.attempts,
+                    result.export_time, result.convert_time, result.rows)
+    else:
+        logger.error("导出 %s 的 %s 失败: %s", result.job.trace, schema_label(result.job.schema), result.error)
+
+def main():
+    parser = argparse.ArgumentParser(description='并行导出 trace 中的表格并转换')
+    parser.add_argument('trace')
+    parser.add_argument('schemas', nargs='+')
+    parser.add_argument('--jobs', type=int, default=WORKERS, help='并行任务数上限')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES)
+    parser.add_argument('--timeout', type=float, default=None, help='单次导出超时（秒）')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--xcrun', default=None, help='xcrun 可执行文件路径')
+    parser.add_argument('--single', action='store_true', help='一次导出所有表格，再在本地拆分')
+    parser.add_argument('--cache', action='store_true', help='复用 trace 内容没变时的导出和转换结果')
+    parser.add_argument('--cache-dir', default=None, help='缓存目录，默认 ~/.cache/xcperf')
+    parser.add_argument('--cache-size', type=int, default=None, help='缓存大小上限（字节）')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.single:
+        jobs = [tables_job(args.trace, args.schemas)]
+    else:
+        jobs = [ExportJob(args.trace, schema, table_output(args.trace, schema)) for schema in args.schemas]
+    cache = TableCache(args.cache_dir, args.cache_size or MAX_BYTES) if args.cache else None
+    results = export_tables(jobs, workers=args.jobs, xcrun=args.xcrun, retries=args.retries,
+                            timeout=args.timeout, format=args.format, cache=cache)
+    if cache is not None:
+        logger.info("缓存: %s", cache.stats())
+    report_timings(args)
+    if not all(result.ok for result in results):
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import numpy as np
+
+# FPS 表格（displayed-surfaces-per-second / core-animation-fps-estimate）的帧统计：
+# 平均值和最大值看不出卡顿，这里用 NumPy 向量化计算分位数、1% low、低于阈值的卡顿窗口和直方图
+
+PERCENTILES = [1, 5, 50, 95, 99]
+# FPS 低于该值的窗口计为卡顿
+JANK_FPS = 50
+HISTOGRAM_BIN = 5
+NS_PER_SECOND = 1e9
+
+def low_percent(fps, percent=1):
+    # 最低 percent% 样本的均值（至少一个样本）
+    k = max(1, int(np.ceil(fps.size * percent / 100)))
+    return float(np.partition(fps, k - 1)[:k].mean())
+
+def jank_windows(fps, durations, jank_fps=JANK_FPS):
+    # 低于阈值的窗口数、连续卡顿的次数，以及卡顿的总时长（秒）
+    jank = fps < jank_fps
+    starts = jank & ~np.concatenate(([False], jank[:-1]))
+    return int(jank.sum()), int(starts.sum()), float(durations[jank].sum() / NS_PER_SECOND)
+
+def histogram(fps, bin_width=HISTOGRAM_BIN):
+    # FPS 直方图 {"lo-hi": 个数}，从 0 开始等宽分组
+    edges = np.arange(0, fps.max() + bin_width + 1e-9, bin_width)
+    counts, edges = np.histogram(fps, bins=edges)
+    return {f'{lo:g}-{hi:g}': int(count) for lo, hi, count in zip(edges[:-1], edges[1:], counts)}
+
+def frame_pacing(fps, durations=None, jank_fps=JANK_FPS, bin_width=HISTOGRAM_BIN):
+    # 按时间顺序排列的 FPS 样本的帧统计
+    # durations 为每个样本的时长（ns），未知时每个样本按一秒计
+    fps = np.asarray(fps, dtype=np.float64)
+    if durations is None:
+        durations = np.full(fps.shape, NS_PER_SECOND)
+    durations = np.nan_to_num(np.asarray(durations, dtype=np.float64), nan=NS_PER_SECOND)
+    valid = ~np.isnan(fps)
+    fps, durations = fps[valid], durations[valid]
+    if fps.size == 0:
+        return {}
+
+    stats = {f'p{p}': float(value) for p, value in zip(PERCENTILES, np.percentile(fps, PERCENTILES))}
+    stats['low_1pct'] = low_percent(fps, 1)
+    windows, episodes, seconds = jank_windows(fps, durations, jank_fps)
+    stats.update({
+        'jank_fps': jank_fps,
+        'jank_windows': windows,
+        'jank_count': episodes,
+        'jank_seconds': seconds,
+        'jank_ratio': seconds / (durations.sum() / NS_PER_SECOND) if durations.sum() else 0.0,
+        'histogram': histogram(fps, bin_width),
+    })
+    return stats
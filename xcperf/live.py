@@ -0,0 +1,222 @@
+"""实时流式处理导出
+
+运行不带 --output 的 xctrace export，把它的 stdout 管道直接交给 xml2csv.py 的增量解析器，导出还在进行时就处理行，不写中间的 XML 文件。
+对流中表格的每个注册指标（summarize.py）统计全部样本和最近 --window 个样本（与 summarize.py 一样，trim_last 的表格不计最后一行，那是不完整的区间），
+每 --interval 秒输出一次。指定 --output 时同一遍写出表格（CSV 或任一列式格式），与 xml2csv.py 一样原子写入。
+XML 也可以从 stdin（-）读取，例如用其他命令输出的测试数据，在没有 Xcode 的 Linux 上也能运行。
+
+run: `python3 live.py <trace|-> <schema>... --app <process_name> [--run 1] [--metrics cpu,fps] [--window 10] [--interval 1] [--output PREFIX] [--format npy] [--json live.json]`
+eg: `python3 live.py makepad_taobao-ActivityMonitor.trace sysmon-process --app makepad_taobao --output makepad_taobao-ActivityMonitor- --format npy`
+    `cat fixture.xml | python3 live.py - --app SynthApp`
+"""
+
+import argparse
+import json
+import logging
+import math
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+
+from decode import column_decoder, decode_string
+from exporter import XCRUN, tables_xpath
+from profiler import add_arguments, configure, count, report_timings, span
+from summarize import METRICS, parse_metrics, selected_metrics
+from writers import WRITERS, atomic_output
+from xml2csv import cell_to_data, iter_events, node_to_cell, process_column, write_events
+
+logger = logging.getLogger(__name__)
+
+# 滚动窗口的样本数；流式处理的表格每秒一个样本
+WINDOW = 10
+# 两次输出快照间隔的秒数
+INTERVAL = 1.0
+# 发现输出无效后等待导出退出的秒数
+STOP_GRACE = 2
+
+class Rolling:
+    # 全部样本的 count/mean/min/max，以及最近 window 个样本的 mean/min/max
+    def __init__(self, window=WINDOW):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.recent.append(value)
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+            'last': self.recent[-1],
+            'window_mean': sum(self.recent) / len(self.recent),
+            'window_min': min(self.recent),
+            'window_max': max(self.recent),
+        }
+
+def table_schema(metric):
+    # 'ActivityMonitor-sysmon-process' -> 'sysmon-process'
+    return metric.table.split('-', 1)[1]
+
+class LiveStats:
+    # iter_events 事件流中每个表格所选指标的滚动统计
+    def __init__(self, app, metrics=None, window=WINDOW):
+        self.app = app
+        self.metrics = selected_metrics(metrics)
+        self.rolling = {metric.name: Rolling(window) for metric in self.metrics}
+        # trim_last 的指标：最新的值等下一行到达后才计入，所以与 summarize.py 一样不计表格的最后一行（不完整的区间）
+        self.pending = {}
+        self.current = []
+        self.process_index = None
+        self.rows = 0
+
+    def schema(self, name, columns):
+        # 只解码指标列，其他单元格原样传递
+        self.current = []
+        self.pending = {}
+        names = [column.name for column in columns]
+        for metric in self.metrics:
+            if table_schema(metric) == name and metric.column in names:
+                index = names.index(metric.column)
+                self.current.append((metric, index, column_decoder(columns[index])[1]))
+        self.process_index = process_column(columns)
+
+    def row(self, cells):
+        self.rows += 1
+        ours = None
+        for metric, index, decode in self.current:
+            if metric.per_process:
+                if ours is None:
+                    process = decode_string(*cells[self.process_index]) if self.process_index is not None else None
+                    ours = bool(process) and process.startswith(self.app)
+                if not ours:
+                    continue
+            value = decode(*cells[index])
+            if metric.trim_last:
+                value, self.pending[metric.name] = self.pending.get(metric.name), value
+            if value is not None:
+                self.rolling[metric.name].add(value * metric.scale)
+
+    def snapshot(self):
+        return {name: rolling.snapshot() for name, rolling in self.rolling.items() if rolling.count}
+
+    def line(self):
+        parts = [f'rows={self.rows}']
+        for name, stats in self.snapshot().items():
+            parts.append(f'{name}={stats["last"]:.1f} (窗口均值 {stats["window_mean"]:.1f} 最大 {stats["window_max"]:.1f}, '
+                         f'均值 {stats["mean"]:.1f} 最大 {stats["max"]:.1f})')
+        return ' '.join(parts)
+
+def observe(events, stats, raw=True, interval=INTERVAL):
+    # 原样传递事件，同时更新 stats，每 interval 秒输出一次快照
+    next_report = time.perf_counter() + interval
+    for kind, item in events:
+        if kind == 'schema':
+            stats.schema(*item)
+        else:
+            stats.row(item)
+            if not raw:
+                item = [cell_to_data(cell) for cell in item]
+            if interval and time.perf_counter() >= next_report:
+                next_report = time.perf_counter() + interval
+                logger.info('live %s', stats.line())
+        yield kind, item
+
+def stream(source, stats, prefix=None, format='csv', interval=INTERVAL):
+    # 从二进制文件对象（管道）解析导出，行到达时更新 stats
+    # 有 prefix 时同一遍把表格写到 {prefix}{schema}{suffix}，返回 [(schema_name, output, rows)]，否则返回 []
+    with span('live_stream', format=format if prefix else None) as args:
+        raw = WRITERS[format].raw
+        events = observe(iter_events(source, node_to_cell), stats, raw or prefix is None, interval)
+        if prefix is not None:
+            results = write_events(events, prefix, format)
+        else:
+            results = []
+            for _ in events:
+                pass
+        args.update(rows=stats.rows)
+    count('rows', stats.rows)
+    return results
+
+def stream_command(trace, schemas, run=1, xcrun=None):
+    # 不带 --output 时 xctrace 把导出写到 stdout
+    return [xcrun or XCRUN, 'xctrace', 'export', '--input', trace, '--xpath', tables_xpath(schemas, run)]
+
+def stream_export(trace, schemas, stats, run=1, prefix=None, format='csv', interval=INTERVAL, xcrun=None):
+    # 运行从 trace 导出 schemas 的命令并流式处理它的 stdout；导出失败时抛出异常
+    command = stream_command(trace, schemas, run, xcrun)
+    logger.info(' '.join(command))
+    error = None
+    killed = False
+    with subprocess.Popen(command, stdout=subprocess.PIPE) as proc:
+        try:
+            results = stream(proc.stdout, stats, prefix, format, interval)
+        except ET.ParseError as e:
+            # 导出失败通常会让流提前结束，先报告它的退出码；
+            # 之后没人读 stdout，还在写的导出会阻塞在写满的管道上，所以关闭管道，不退出就终止
+            error = e
+            proc.stdout.close()
+            try:
+                proc.wait(timeout=STOP_GRACE)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                killed = True
+        except BaseException:
+            proc.kill()
+            raise
+    if proc.returncode != 0 and not killed:
+        raise RuntimeError(f'{" ".join(command)} 退出码 {proc.returncode}')
+    if error is not None:
+        raise RuntimeError(f'{trace} 的导出无效: {error}')
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='流式处理 trace 的导出，行到达时计算滚动指标')
+    parser.add_argument('trace', help='要导出的 .trace，- 表示从 stdin 读取导出的 XML')
+    parser.add_argument('schemas', nargs='*', help='要导出的表格，默认为所选指标的表格')
+    parser.add_argument('--app', required=True, help='测试应用的进程名')
+    parser.add_argument('--run', type=int, default=1)
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help=f'逗号分隔，默认全部：{", ".join(METRICS)}')
+    parser.add_argument('--window', type=int, default=WINDOW, help='滚动窗口的样本数')
+    parser.add_argument('--interval', type=float, default=INTERVAL, help='输出快照间隔的秒数，0 表示不输出')
+    parser.add_argument('--output', default=None, metavar='PREFIX', help='同时把表格写到 PREFIX<schema><suffix>')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--json', default=None, help='把最终的统计写入该路径')
+    parser.add_argument('--xcrun', default=None, help='xcrun 可执行文件')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    logging.basicConfig(level=logging.INFO)
+    stats = LiveStats(args.app, args.metrics, args.window)
+    if args.trace == '-':
+        results = stream(sys.stdin.buffer, stats, args.output, args.format, args.interval)
+    else:
+        schemas = args.schemas or sorted({table_schema(metric) for metric in stats.metrics})
+        try:
+            results = stream_export(args.trace, schemas, stats, args.run, args.output, args.format, args.interval, args.xcrun)
+        except RuntimeError as e:
+            logger.error('%s', e)
+            sys.exit(1)
+    for schema_name, output, rows in results:
+        logger.info('写入 %s 完成: %s, %s 行', output, schema_name, rows)
+    logger.info('live %s', stats.line())
+    if args.json:
+        with atomic_output(args.json) as partial, open(partial, 'w') as f:
+            json.dump(stats.snapshot(), f, indent=2, ensure_ascii=False)
+    report_timings(args)
+
+if __name__ == '__main__':
+    main()
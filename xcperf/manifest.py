@@ -0,0 +1,107 @@
+"""可续跑的任务清单
+
+在运行目录（plan.py 的输出目录或 batch.py 的根目录）的 manifest.json 中记录每个完成的任务：
+输入的 sha256 摘要、输出和任务参数的键（命令、格式、转换器版本等）。
+条目存在、键相同、输出都还在且输入的摘要没变时任务才算完成，失败后重新运行从第一个未完成的任务继续。
+输出都是原子写入的（writers.atomic_output），存在的输出不会是不完整的。
+
+run: `python3 manifest.py <directory> [--forget PREFIX]`
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from cache import tree_digest, tree_files, tree_signature
+from writers import atomic_output
+
+MANIFEST = 'manifest.json'
+VERSION = 1
+
+class Manifest:
+    # 一个目录中完成的任务，每次改动后保存
+    def __init__(self, directory):
+        self.path = os.path.join(directory, MANIFEST)
+        self.lock = threading.Lock()
+        data = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                data = json.load(f)
+        if data.get('version') != VERSION:
+            data = {}
+        self.jobs = data.get('jobs', {})
+        self.digests = data.get('digests', {})
+
+    def digest(self, path):
+        # 文件或 bundle 目录的 sha256，不存在时为 None
+        # 与 cache.py 相同，记录文件列表、大小和修改时间，没变的文件不重新计算摘要
+        if not os.path.exists(path):
+            return None
+        path = os.path.abspath(path)
+        files = tree_files(path)
+        signature = tree_signature(files)
+        with self.lock:
+            known = self.digests.get(path)
+        if known and known[0] == signature:
+            return known[1]
+        digest = tree_digest(files)
+        with self.lock:
+            self.digests[path] = [signature, digest]
+        return digest
+
+    def done(self, name, inputs=(), key=''):
+        # 任务 name 是否以相同的输入和键完成，且输出都还在
+        with self.lock:
+            entry = self.jobs.get(name)
+        if entry is None or entry['key'] != key or sorted(entry['inputs']) != sorted(inputs):
+            return False
+        if not all(os.path.exists(path) for path in entry['outputs']):
+            return False
+        return all(self.digest(path) == digest for path, digest in entry['inputs'].items())
+
+    def outputs(self, name):
+        with self.lock:
+            entry = self.jobs.get(name)
+        return list(entry['outputs']) if entry else []
+
+    def record(self, name, inputs=(), outputs=(), key=''):
+        # 按输入当前的内容把任务 name 记为完成
+        digests = {path: self.digest(path) for path in inputs}
+        with self.lock:
+            self.jobs[name] = {'key': key, 'inputs': digests, 'outputs': list(outputs), 'completed': time.time()}
+        self.save()
+
+    def forget(self, prefix=''):
+        # 删除名称以 prefix 开头的任务，使其重新运行；返回删除的个数
+        with self.lock:
+            names = [name for name in self.jobs if name.startswith(prefix)]
+            for name in names:
+                del self.jobs[name]
+        self.save()
+        return len(names)
+
+    def save(self):
+        with self.lock:
+            data = {'version': VERSION, 'jobs': self.jobs, 'digests': self.digests}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with atomic_output(self.path) as partial, open(partial, 'w') as f:
+                json.dump(data, f, indent=1, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='查看或重置运行目录中完成的任务')
+    parser.add_argument('directory')
+    parser.add_argument('--forget', default=None, metavar='PREFIX', help='删除名称以 PREFIX 开头的任务')
+    args = parser.parse_args()
+
+    manifest = Manifest(args.directory)
+    if args.forget is not None:
+        print(f'已删除 {manifest.forget(args.forget)} 个任务')
+        return
+    for name, entry in sorted(manifest.jobs.items(), key=lambda item: item[1]['completed']):
+        done = 'done' if manifest.done(name, entry['inputs'], entry['key']) else 'stale'
+        print(f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["completed"]))} {done:<5} {name}')
+
+if __name__ == '__main__':
+    main()
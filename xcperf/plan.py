@@ -0,0 +1,325 @@
+"""声明式的基准测试计划
+
+计划文件（TOML，安装了 PyYAML 时也可以是 YAML）列出应用、设备、模板及其 instrument、时长、要导出的表格、汇总的指标和重复次数。
+对每个设备 / 重复 / 应用，计划编译为一个任务依赖图：record（每个模板）-> export（每个 trace 一个 XPath 并集）-> convert -> summarize，
+无需任何交互，只运行输出目录的清单（manifest.py）中未完成的任务：从未完成、参数变了、输出缺失或输入变了。
+输出先写到临时路径，完成后再改名，中断后重新运行会从未完成的任务继续；清单之前已有的输出不早于输入时视为完成（与 make 相同）。
+同一设备上的录制依次进行，其他 trace 的导出、转换和汇总在有上限的线程池中同时进行；失败的任务跳过依赖它的任务，最后退出码为 1。
+输出在 {output}/{device}/rep{n}/ 下，文件名与平常相同（{app}-{Template}.trace、{app}-{Template}-{schema}.csv、summary-{app}.json），
+可以直接用 batch.py、store.py 和 compare.py 处理。
+
+run: `python3 plan.py <plan.toml|plan.yaml> [--dry-run] [--force] [--jobs N]`
+     `python3 manifest.py <output> [--forget PREFIX]` 列出（或重置）已完成的任务
+eg: `python3 plan.py benchmark.toml --dry-run`
+"""
+
+import argparse
+import logging
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from exporter import COMBINED, XCRUN, export_job, job_xpath, schema_label, tables_job
+from manifest import Manifest
+from profiler import add_arguments, configure, report_timings, span
+from summarize import METRICS, selected_metrics, summarize, write_report
+from writers import WRITERS, commit, partial_path, remove_path, require
+from xml2csv import CONVERTER_VERSION, split_tables
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+WORKERS = 4
+TIME_LIMIT = '10s'
+# 录制超过时长这么多秒仍未结束则停止并重试
+RECORD_GRACE = 120.0
+# 发送 SIGINT 后等待命令退出的秒数，之后强制终止，与 xcperf.py 相同
+STOP_GRACE = 10
+EXPORT_TIMEOUT = 600.0
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+Template = namedtuple('Template', ['name', 'instrument', 'tables', 'time_limit', 'window'])
+Device = namedtuple('Device', ['udid', 'name'])
+Plan = namedtuple('Plan', ['apps', 'devices', 'templates', 'metrics', 'repetitions', 'format', 'output',
+                           'record_grace', 'export_timeout', 'retries'])
+# deps 为必须先成功的任务名；任务运行时独占 resource；key 标识任务的参数，变了就重新运行
+Job = namedtuple('Job', ['name', 'kind', 'inputs', 'outputs', 'deps', 'action', 'resource', 'key'])
+
+def load_plan(path):
+    # 把 .toml / .yaml / .yml 计划文件解析为 Plan
+    with open(path, 'rb') as f:
+        if path.endswith(('.yaml', '.yml')):
+            data = require('yaml').safe_load(f)
+        else:
+            try:
+                import tomllib
+            except ImportError:  # Python 3.11 之前
+                tomllib = require('tomli')
+            data = tomllib.load(f)
+    return parse_plan(data or {}, os.path.dirname(os.path.abspath(path)))
+
+def parse_plan(data, base='.'):
+    # 校验计划字典；相对的输出目录相对于 base
+    def entries(key, field):
+        # "name" 和 {"name": ..., ...} 两种写法都可以
+        values = data.get(key) or []
+        if isinstance(values, (str, dict)):
+            values = [values]
+        return [value if isinstance(value, dict) else {field: value} for value in values]
+
+    apps = [entry['name'] for entry in entries('apps', 'name')]
+    devices = [Device(entry['udid'], entry.get('name') or entry['udid']) for entry in entries('devices', 'udid')]
+    time_limit = str(data.get('time_limit', TIME_LIMIT))
+    templates = []
+    for entry in entries('templates', 'name'):
+        tables = entry.get('tables') or []
+        templates.append(Template(entry['name'], entry.get('instrument'), [tables] if isinstance(tables, str) else tables,
+                                  str(entry.get('time_limit', time_limit)), entry.get('window', True)))
+        parse_duration(templates[-1].time_limit)
+    metrics = data.get('metrics')
+    format = data.get('format', 'csv')
+    repetitions = int(data.get('repetitions', 1))
+
+    for key, values in (('apps', apps), ('devices', devices), ('templates', templates)):
+        if not values:
+            raise ValueError(f'计划中没有 {key}')
+    selected_metrics(metrics)
+    if format not in WRITERS:
+        raise ValueError(f'未知的格式 {format!r}，可选 {", ".join(sorted(WRITERS))}')
+    if repetitions < 1:
+        raise ValueError('repetitions 至少为 1')
+    return Plan(apps, devices, templates, metrics, repetitions, format,
+                os.path.join(base, data.get('output', 'results')),
+                float(data.get('record_grace', RECORD_GRACE)), float(data.get('export_timeout', EXPORT_TIMEOUT)),
+                int(data.get('retries', MAX_RETRIES)))
+
+def parse_duration(text):
+    # xctrace 时长的秒数，如 '10s'、'500ms'、'2m' 或 '1m30s'
+    if re.fullmatch(r'[\d.]+', text):
+        return float(text)
+    if not re.fullmatch(r'(?:[\d.]+(?:ms|s|m|h))+', text):
+        raise ValueError(f'无效的时长 {text!r}')
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in re.findall(r'([\d.]+)(ms|s|m|h)', text))
+
+def safe_name(text):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', text)
+
+def trace_path(directory, app, template):
+    # 与 record1.sh / xcperf-v2.py 的命名相同：{app}-{去掉空格的模板名}.trace
+    return os.path.join(directory, f'{app}-{template.name.replace(" ", "")}.trace')
+
+def record_command(trace, app, device, template, output=None):
+    command = [XCRUN, 'xctrace', 'record', '--output', output or trace, '--template', template.name,
+               '--device', device.udid, '--time-limit', template.time_limit, '--attach', app]
+    if template.instrument:
+        command += ['--instrument', template.instrument]
+    if template.window:
+        command += ['--window', template.time_limit]
+    return command
+
+def stop(proc, grace=STOP_GRACE):
+    # 与 xcperf.stop_process 相同：先发 SIGINT 让 xctrace 写完输出，grace 秒后仍未退出则 SIGKILL
+    if proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGINT)
+    try:
+        proc.wait(grace)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def record(command, trace, timeout, retries=MAX_RETRIES):
+    # 运行 xctrace record 写入临时 trace，直到退出码为 0，再改名为 trace
+    os.makedirs(os.path.dirname(trace) or '.', exist_ok=True)
+    partial_trace = partial_path(trace)
+    command = [partial_trace if arg == trace else arg for arg in command]
+    error = None
+    for attempt in range(1, retries + 1):
+        logger.info(' '.join(command))
+        remove_path(partial_trace)
+        proc = subprocess.Popen(command)
+        try:
+            returncode = proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            # 与 xcperf.py 一样停止并重试
+            stop(proc)
+            error = f'{timeout:.0f}s 后仍未结束'
+        except BaseException:
+            stop(proc)
+            raise
+        else:
+            if returncode == 0 and os.path.exists(partial_trace):
+                commit(partial_trace, trace)
+                return
+            error = f'退出码 {returncode}'
+        logger.error('录制 %s 失败 (%s/%s): %s', trace, attempt, retries, error)
+        remove_path(partial_trace)
+    raise RuntimeError(f'录制 {trace} 失败: {error}')
+
+def export(trace, schemas, retries=MAX_RETRIES, timeout=EXPORT_TIMEOUT):
+    job = tables_job(trace, schemas)
+    result = export_job(job, retries=retries, timeout=timeout, format=None)
+    if not result.ok:
+        raise RuntimeError(f'从 {trace} 导出 {schema_label(job.schema)} 失败: {result.error}')
+
+def convert(combined, schemas, format):
+    tables = split_tables(combined, combined[:-len(COMBINED)], format=format)
+    missing = sorted(set(schemas) - {schema for schema, _, _ in tables})
+    if missing:
+        raise RuntimeError(f'{combined} 中没有 {", ".join(missing)} 的数据')
+    logger.info('转换 %s 完成: %s 行', combined, sum(count for _, _, count in tables))
+
+def summarize_app(app, directory, metrics, json_path, csv_path):
+    write_report(summarize(app, directory, metrics), json_path, csv_path)
+
+def compile_plan(plan):
+    # 计划的任务 {name: Job}，每个任务都在其依赖之后
+    jobs = {}
+
+    def add(name, kind, inputs, outputs, deps, action, resource=None, key=''):
+        jobs[name] = Job(name, kind, inputs, outputs, deps, action, resource, key)
+
+    suffix = WRITERS[plan.format].suffix
+    for device in plan.devices:
+        for repetition in range(1, plan.repetitions + 1):
+            directory = os.path.join(plan.output, safe_name(device.name), f'rep{repetition}')
+            for app in plan.apps:
+                key = f'{safe_name(device.name)}/rep{repetition}/{app}'
+                converted = []
+                for template in plan.templates:
+                    trace = trace_path(directory, app, template)
+                    label = f'{key}/{template.name.replace(" ", "")}'
+                    timeout = parse_duration(template.time_limit) + plan.record_grace
+                    command = record_command(trace, app, device, template)
+                    add(f'record {label}', 'record', [], [trace], [],
+                        partial(record, command, trace, timeout, plan.retries),
+                        resource=device.udid, key=' '.join(command[1:]))
+                    if not template.tables:
+                        continue
+                    combined = trace[:-len('.trace')] + '-' + COMBINED
+                    add(f'export {label}', 'export', [trace], [combined], [f'record {label}'],
+                        partial(export, trace, template.tables, plan.retries, plan.export_timeout),
+                        key=job_xpath(tables_job(trace, template.tables)))
+                    outputs = [trace[:-len('.trace')] + f'-{schema}{suffix}' for schema in template.tables]
+                    add(f'convert {label}', 'convert', [combined], outputs, [f'export {label}'],
+                        partial(convert, combined, template.tables, plan.format),
+                        key=f'{CONVERTER_VERSION} {plan.format}')
+                    converted.append((f'convert {label}', outputs))
+                if converted:
+                    reports = [os.path.join(directory, f'summary-{app}.json'), os.path.join(directory, f'summary-{app}.csv')]
+                    add(f'summarize {key}', 'summarize', [path for _, outputs in converted for path in outputs], reports,
+                        [name for name, _ in converted], partial(summarize_app, app, directory, plan.metrics, *reports),
+                        key=','.join(plan.metrics or METRICS))
+    return jobs
+
+def up_to_date(job):
+    # 所有输出都存在，并且都不早于输入
+    if not all(os.path.exists(path) for path in job.outputs):
+        return False
+    if not job.inputs:
+        return True
+    newest_input = max(os.path.getmtime(path) if os.path.exists(path) else float('inf') for path in job.inputs)
+    return min(os.path.getmtime(path) for path in job.outputs) >= newest_input
+
+def complete(job, manifest, adopt=True):
+    # 任务是否不需要运行：清单中已完成，或清单之前已有的输出是最新的
+    # adopt 时把这样的输出记入清单
+    if manifest.done(job.name, job.inputs, job.key):
+        return True
+    if job.name in manifest.jobs or not up_to_date(job):
+        return False
+    if adopt:
+        manifest.record(job.name, job.inputs, job.outputs, job.key)
+    return True
+
+def stale_jobs(jobs, manifest, force=False):
+    # 将要运行的任务名：未完成的，或在某个要运行的任务下游的
+    stale = set()
+    for job in jobs.values():
+        if force or any(dep in stale for dep in job.deps) or not complete(job, manifest, adopt=False):
+            stale.add(job.name)
+    return stale
+
+def run_jobs(jobs, manifest, workers=WORKERS, force=False, dry_run=False):
+    # 按依赖顺序运行未完成的任务，返回 {name: 'up-to-date'|'ok'|'failed'|'skipped'}
+    # 依赖完成后才检查任务，所以依赖重新运行但输出没变时任务仍会跳过
+    if dry_run:
+        stale = stale_jobs(jobs, manifest, force)
+        for name in jobs:
+            if name in stale:
+                print(name)
+        return {}
+    status = {}
+    pending = list(jobs)
+    running = {}
+    busy = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in list(pending):
+                job = jobs[name]
+                if any(status.get(dep) in ('failed', 'skipped') for dep in job.deps):
+                    logger.warning('跳过 %s: 依赖的任务失败', name)
+                    status[name] = 'skipped'
+                    pending.remove(name)
+                elif all(status.get(dep) in ('ok', 'up-to-date') for dep in job.deps) and job.resource not in busy:
+                    pending.remove(name)
+                    if not force and complete(job, manifest):
+                        status[name] = 'up-to-date'
+                        continue
+                    if job.resource is not None:
+                        busy.add(job.resource)
+                    running[pool.submit(run_job, job)] = job
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                busy.discard(job.resource)
+                status[job.name] = 'ok' if future.result() else 'failed'
+                if status[job.name] == 'ok':
+                    manifest.record(job.name, job.inputs, job.outputs, job.key)
+    return status
+
+def run_job(job):
+    logger.info('开始 %s', job.name)
+    started = time.perf_counter()
+    try:
+        with span(job.kind, job=job.name):
+            job.action()
+    except Exception as e:
+        logger.error('%s 失败: %s', job.name, e)
+        return False
+    logger.info('%s 完成，耗时 %.1fs', job.name, time.perf_counter() - started)
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description='无需交互地运行声明式的基准测试计划')
+    parser.add_argument('plan', help='.toml、.yaml 或 .yml 计划文件')
+    parser.add_argument('--dry-run', action='store_true', help='列出将要运行的任务')
+    parser.add_argument('--force', action='store_true', help='运行所有任务，即使输出是最新的')
+    parser.add_argument('--jobs', type=int, default=WORKERS, help='同时运行的任务数')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        plan = load_plan(args.plan)
+    except (KeyError, ValueError) as e:
+        parser.error(f'无效的计划 {args.plan}: {e}')
+    status = run_jobs(compile_plan(plan), Manifest(plan.output), args.jobs, args.force, args.dry_run)
+    if not args.dry_run:
+        counts = {state: list(status.values()).count(state) for state in ('ok', 'up-to-date', 'failed', 'skipped')}
+        logger.info('任务: %s', ', '.join(f'{count} {state}' for state, count in counts.items()))
+    report_timings(args)
+    if 'failed' in status.values():
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
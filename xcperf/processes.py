@@ -0,0 +1,177 @@
+"""sysmon-process 的分进程 CPU 和内存统计
+
+summarize.py 只统计测试应用；这里把整个 sysmon-process 表格（设备上的所有进程）按进程（名称和 PID）分组，
+统计每个进程的样本数、% CPU 的均值和最大值、CPU 时间及其占设备 CPU 时间的比例、内存的均值和最大值，
+以及内存增长率（内存样本最小二乘直线的斜率，MiB/分钟），内存一直增长的进程标记为可能泄漏。
+分组是对整数编码的一遍 NumPy 计算：进程名只 factorize 一次，求和用 np.bincount，最大值用按编码排序后的 reduceat，
+斜率用每组 x、y、x*x、x*y 的和；只对不同的进程名解析 PID。
+样本的 CPU 时间为 % CPU 乘以 Duration（表格没有该列时为一秒）；与 summarize.py 相同，名称以 process_name 开头的进程都算测试应用，其余算守护进程。
+
+run: `python3 processes.py <process_name> [--dir .] [--top 10] [--leak-mib-per-min 1] [--json processes.json] [--csv processes.csv]`
+eg: `python3 processes.py makepad_taobao --top 20`
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from profiler import add_arguments, configure, report_timings, span
+from summarize import MIB, column_values, find_table
+from writers import atomic_output, read_table, write_frame
+from xml2csv import PROCESS_FMT
+
+TABLE = 'ActivityMonitor-sysmon-process'
+TOP = 10
+# 内存斜率超过该值的进程标记为可能泄漏
+LEAK_MIB_PER_MIN = 1.0
+# 内存样本少于该数时不计算斜率
+MIN_SLOPE_SAMPLES = 10
+NS_PER_SECOND = 1e9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+
+def group_max(codes, values, groups):
+    # 每个编码的 values 最大值，忽略 NaN（没有值或没有行的组为 NaN）
+    result = np.full(groups, np.nan)
+    present = np.bincount(codes, minlength=groups) > 0
+    if present.any():
+        order = np.argsort(codes, kind='stable')
+        starts = np.searchsorted(codes[order], np.arange(groups))
+        result[present] = np.fmax.reduceat(values[order], starts[present])
+    return result
+
+def group_slope(codes, x, y, groups, min_samples=MIN_SLOPE_SAMPLES):
+    # 每个编码的 y 对 x 的最小二乘斜率，有效点少于 min_samples 时为 NaN
+    valid = ~(np.isnan(x) | np.isnan(y))
+    codes, x, y = codes[valid], x[valid], y[valid]
+    # x 减去均值，避免平方和的数值误差
+    x = x - x.mean() if x.size else x
+    n = np.bincount(codes, minlength=groups).astype(np.float64)
+    sx = np.bincount(codes, x, groups)
+    sy = np.bincount(codes, y, groups)
+    sxx = np.bincount(codes, x * x, groups)
+    sxy = np.bincount(codes, x * y, groups)
+    denominator = n * sxx - sx * sx
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = (n * sxy - sx * sy) / denominator
+    return np.where((n >= min_samples) & (denominator > 0), slope, np.nan)
+
+def process_breakdown(df, process_name, leak_mib_per_min=LEAK_MIB_PER_MIN):
+    # sysmon-process 表格中每个进程一行，按 CPU 时间从大到小排列
+    codes, processes = pd.factorize(df['Process Name'])
+    processes = pd.Index(processes).astype(str)
+    known = codes >= 0
+    codes = codes[known]
+    groups = len(processes)
+
+    def column(name, kind, default=np.nan):
+        if name not in df:
+            return np.full(codes.size, default)
+        return column_values(df[name], kind).to_numpy()[known]
+
+    cpu = column('% CPU', 'percent')
+    seconds = np.nan_to_num(column('Duration', 'time') / NS_PER_SECOND, nan=1.0)
+    cpu_seconds = np.nan_to_num(cpu) / 100 * seconds
+    memory = column('Memory', 'size') / MIB
+    minutes = column('Start', 'time') / NS_PER_MINUTE
+
+    samples = np.bincount(codes, minlength=groups)
+    cpu_samples = np.bincount(codes, ~np.isnan(cpu), groups)
+    memory_samples = np.bincount(codes, ~np.isnan(memory), groups)
+    total_cpu_seconds = np.bincount(codes, cpu_seconds, groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cpu_mean = np.bincount(codes, np.nan_to_num(cpu), groups) / cpu_samples
+        memory_mean = np.bincount(codes, np.nan_to_num(memory), groups) / memory_samples
+        cpu_share = total_cpu_seconds / total_cpu_seconds.sum()
+    slope = group_slope(codes, minutes, memory, groups)
+
+    parsed = processes.str.extract(PROCESS_FMT)
+    breakdown = pd.DataFrame({
+        'process': processes,
+        'name': parsed['name'],
+        'pid': pd.to_numeric(parsed['pid']).astype('Int64'),
+        'app': processes.str.startswith(process_name),
+        'samples': samples,
+        'cpu_mean': cpu_mean,
+        'cpu_max': group_max(codes, cpu, groups),
+        'cpu_seconds': total_cpu_seconds,
+        'cpu_share': cpu_share,
+        'memory_mean_mib': memory_mean,
+        'memory_max_mib': group_max(codes, memory, groups),
+        'memory_slope_mib_per_min': slope,
+        'leak': np.nan_to_num(slope) > leak_mib_per_min,
+    })
+    return breakdown.sort_values('cpu_seconds', ascending=False, kind='stable').reset_index(drop=True)
+
+def process_report(breakdown, process_name, top=TOP):
+    # 测试应用与守护进程的 CPU 占比、CPU 占用最多的进程和可能泄漏的进程
+    device = float(breakdown['cpu_seconds'].sum())
+    app = float(breakdown.loc[breakdown['app'], 'cpu_seconds'].sum())
+
+    def records(rows):
+        return json.loads(rows.to_json(orient='records'))
+
+    return {
+        'app': process_name,
+        'processes': len(breakdown),
+        'device_cpu_seconds': device,
+        'app_cpu_seconds': app,
+        'app_cpu_share': app / device if device else 0.0,
+        'daemon_cpu_share': (device - app) / device if device else 0.0,
+        'top': records(breakdown.head(top)),
+        'app_processes': records(breakdown[breakdown['app']]),
+        'leaks': records(breakdown[breakdown['leak']]),
+    }
+
+def load_breakdown(process_name, directory='.', leak_mib_per_min=LEAK_MIB_PER_MIN):
+    # process_name 导出的 sysmon-process 表格的分进程统计，没有表格时为 None
+    path = find_table(directory, process_name, TABLE)
+    if path is None:
+        return None
+    df = read_table(path)
+    with span('process_breakdown', rows=len(df)):
+        return process_breakdown(df, process_name, leak_mib_per_min)
+
+def number(value):
+    # 报告记录中缺失的值为 null
+    return float('nan') if value is None else value
+
+def print_report(report):
+    print(f'App CPU share={report["app_cpu_share"]:.1%} Daemons={report["daemon_cpu_share"]:.1%} '
+          f'({report["processes"]} processes, {report["device_cpu_seconds"]:.1f} CPU seconds)')
+    for rank, row in enumerate(report['top'], 1):
+        print(f'{rank:3d}. {row["process"]:<32} {number(row["cpu_share"]):6.1%} mean {number(row["cpu_mean"]):.1f}% '
+              f'max {number(row["cpu_max"]):.1f}%  memory {number(row["memory_mean_mib"]):.1f} MiB')
+    for row in report['leaks']:
+        print(f'Possible leak: {row["process"]} memory +{row["memory_slope_mib_per_min"]:.2f} MiB/min')
+
+def main():
+    parser = argparse.ArgumentParser(description='统计 sysmon-process 中每个进程的 CPU 和内存')
+    parser.add_argument('process_name')
+    parser.add_argument('--dir', default='.', help='导出表格所在的目录')
+    parser.add_argument('--top', type=int, default=TOP, help='排名的进程数')
+    parser.add_argument('--leak-mib-per-min', type=float, default=LEAK_MIB_PER_MIN,
+                        help='内存增长超过该值的进程标记为可能泄漏')
+    parser.add_argument('--json', default=None, help='报告路径，默认为 processes-<process_name>.json')
+    parser.add_argument('--csv', default=None, help='分进程表格的路径（.csv、.parquet、.arrow 或 .columns），'
+                                                    '默认为 processes-<process_name>.csv')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    breakdown = load_breakdown(args.process_name, args.dir, args.leak_mib_per_min)
+    if breakdown is None:
+        print(f'{args.dir} 中没有找到表格 {args.process_name}-{TABLE}', file=sys.stderr)
+        sys.exit(1)
+    report = process_report(breakdown, args.process_name, args.top)
+    print_report(report)
+    with atomic_output(args.json or f'processes-{args.process_name}.json') as partial, open(partial, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with atomic_output(args.csv or f'processes-{args.process_name}.csv') as partial:
+        write_frame(breakdown, partial)
+    report_timings(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""阶段耗时和计数
+
+record / export / convert / summarize 流程的轻量埋点：span(name) 记录一个阶段的耗时，count(name, n) 累加计数（行数、解析的 ref、读写的字节数、重试次数）。
+收集的 span 写为 Chrome trace-event JSON（在 chrome://tracing 或 Perfetto 中打开），并汇总为文本表格。
+也可以分析每个阶段：cprofile 模式下每个最外层的 span 写出一个 .prof 文件（`python3 -m pstats <file>`），tracemalloc 模式下记录阶段的内存峰值。
+导出池的工作进程把 span 随结果一起返回，显示在各自的轨道上。
+
+run: `python3 <script>.py ... [--trace-events trace.json] [--timings] [--profile cprofile|tracemalloc] [--profile-dir DIR]`
+"""
+
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+# 通过环境变量传给 spawn 启动的子进程
+PROFILE_ENV = 'XCPERF_PROFILE'
+PROFILE_DIR_ENV = 'XCPERF_PROFILE_DIR'
+PROFILE_MODES = ['cprofile', 'tracemalloc']
+
+# start_ns 为 time.time_ns()，不同进程的 span 可以放在同一时间轴上
+Span = namedtuple('Span', ['name', 'start_ns', 'duration_ns', 'pid', 'tid', 'args'])
+
+class Profiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.spans = []
+        self.counters = defaultdict(int)
+        self.profiling = False
+        self.profiles = 0
+
+    @property
+    def mode(self):
+        return os.environ.get(PROFILE_ENV) or None
+
+    def configure(self, mode=None, directory=None):
+        # mode: None / 'cprofile' / 'tracemalloc'
+        for name, value in ((PROFILE_ENV, mode), (PROFILE_DIR_ENV, directory)):
+            if value:
+                os.environ[name] = value
+            else:
+                os.environ.pop(name, None)
+
+    def check_fork(self):
+        # fork 出的子进程继承了父进程已记录的数据，只保留本进程的
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.spans = []
+            self.counters = defaultdict(int)
+            self.profiling = False
+
+    @contextmanager
+    def span(self, name, **args):
+        self.check_fork()
+        profile = self.start_profile()
+        started = time.time_ns()
+        clock = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            duration = time.perf_counter_ns() - clock
+            if profile is not None:
+                self.stop_profile(profile, name, args)
+            with self.lock:
+                self.spans.append(Span(name, started, duration, self.pid, threading.get_ident(), args))
+
+    def start_profile(self):
+        # 只分析最外层的 span，嵌套的 span 包含在其中
+        mode = self.mode
+        with self.lock:
+            if mode is None or self.profiling:
+                return None
+            self.profiling = True
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            return profile
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        return started
+
+    def stop_profile(self, profile, name, args):
+        # 分析结束、结果写完后才允许下一个 span 开始分析，与 start_profile 一样在锁内修改
+        try:
+            if isinstance(profile, cProfile.Profile):
+                profile.disable()
+                directory = os.environ.get(PROFILE_DIR_ENV) or '.'
+                os.makedirs(directory, exist_ok=True)
+                self.profiles += 1
+                path = os.path.join(directory, f'{name}-{self.pid}-{self.profiles}.prof')
+                profile.dump_stats(path)
+                args['profile'] = path
+            else:
+                _, peak = tracemalloc.get_traced_memory()
+                args['peak_traced_bytes'] = peak
+                if profile:
+                    tracemalloc.stop()
+        finally:
+            with self.lock:
+                self.profiling = False
+
+    def count(self, name, value=1):
+        self.check_fork()
+        with self.lock:
+            self.counters[name] += value
+
+    def drain(self):
+        # 取出并清空本进程记录的数据，供进程池中的任务随结果返回
+        self.check_fork()
+        with self.lock:
+            spans, counters = self.spans, dict(self.counters)
+            self.spans = []
+            self.counters = defaultdict(int)
+        return spans, counters
+
+    def merge(self, drained):
+        spans, counters = drained
+        with self.lock:
+            self.spans.extend(Span(*span) for span in spans)
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def chrome_trace(self):
+        # Chrome trace-event 格式：每个 span 是一个完整事件（ph=X），计数器在最后一个时间点给出总数（ph=C）
+        spans = sorted(self.spans, key=lambda span: span.start_ns)
+        origin = spans[0].start_ns if spans else time.time_ns()
+        events = [
+            {
+                'name': span.name,
+                'cat': 'xcperf',
+                'ph': 'X',
+                'ts': (span.start_ns - origin) / 1000,
+                'dur': span.duration_ns / 1000,
+                'pid': span.pid,
+                'tid': span.tid,
+                'args': {key: str(value) if not isinstance(value, (int, float)) else value
+                         for key, value in span.args.items()},
+            }
+            for span in spans
+        ]
+        end = max(((span.start_ns + span.duration_ns - origin) / 1000 for span in spans), default=0)
+        for name, value in sorted(self.counters.items()):
+            events.append({'name': name, 'cat': 'xcperf', 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        # 每个阶段的次数、总耗时、平均和最长耗时，以及所有计数器
+        # tracemalloc 模式下另加一列各阶段的内存峰值
+        stages = defaultdict(list)
+        peaks = {}
+        for span in self.spans:
+            stages[span.name].append(span.duration_ns / 1e9)
+            if 'peak_traced_bytes' in span.args:
+                peaks[span.name] = max(peaks.get(span.name, 0), span.args['peak_traced_bytes'])
+        width = max([len(name) for name in stages] + [len(name) for name in self.counters] + [5])
+        lines = [f'{"stage":<{width}} {"count":>7} {"total s":>10} {"mean s":>10} {"max s":>10}'
+                 + (f' {"peak MiB":>10}' if peaks else '')]
+        for name, durations in sorted(stages.items(), key=lambda item: -sum(item[1])):
+            lines.append(f'{name:<{width}} {len(durations):>7} {sum(durations):>10.3f} '
+                         f'{sum(durations) / len(durations):>10.3f} {max(durations):>10.3f}'
+                         + (f' {peaks[name] / 1024 ** 2:>10.1f}' if name in peaks else ''))
+        if self.counters:
+            lines.append('')
+            lines.append(f'{"counter":<{width}} {"value":>7}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{name:<{width}} {value:>7}')
+        return '\n'.join(lines)
+
+PROFILER = Profiler()
+span = PROFILER.span
+count = PROFILER.count
+
+def add_arguments(parser):
+    parser.add_argument('--trace-events', default=None, help='把阶段耗时以 Chrome trace-event JSON 写入该路径')
+    parser.add_argument('--timings', action='store_true', help='输出阶段耗时和计数的表格')
+    parser.add_argument('--profile', choices=PROFILE_MODES, default=None, help='分析每个阶段')
+    parser.add_argument('--profile-dir', default=None, help='cProfile .prof 文件的目录')
+
+def configure(args):
+    PROFILER.configure(args.profile, args.profile_dir)
+
+def report_timings(args, output=print):
+    # 按命令行参数输出 trace 文件和汇总表
+    if args.trace_events:
+        PROFILER.write_trace(args.trace_events)
+    if args.timings or args.profile:
+        output(PROFILER.summary())
@@ -0,0 +1,144 @@
+"""多次录制的 trace
+
+一个 trace 可以包含多次录制（<run> 元素），这里列出导出的 TOC 中的 run，并把各 run 的统计量汇总为跨 run 的均值、标准差和 95% 置信区间。
+summarize --metric 按 summarize.py 中同名指标解码该列（解码方式、缩放、进程过滤和末尾不完整的行）；
+只给 --column 时取读取该列的注册指标的解码方式，或用 --kind 指定。
+`python3 summarize.py <process_name> --runs 1,2,3` 分别统计每个 run 和跨 run 的所有指标，xcperf.py 导出每个 trace 后也会写出这份报告。
+
+run: `python3 runs.py toc <toc.xml>`
+     `python3 runs.py summarize (--metric cpu | --column "% CPU" [--kind percent]) [--process <name>] <run1.csv> <run2.csv> ...`
+eg: `python3 runs.py summarize --metric fps makepad_taobao-GamePerformance-run1-displayed-surfaces-per-second.csv makepad_taobao-GamePerformance-run2-displayed-surfaces-per-second.csv`
+"""
+
+import argparse
+import math
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from statistics import mean, stdev
+
+Run = namedtuple('Run', ['number', 'start', 'end', 'duration', 'schemas'])
+
+# 按自由度排列的双侧 95% Student t 临界值
+T_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+    10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110,
+    18: 2.101, 19: 2.093, 20: 2.086, 21: 2.080, 22: 2.074, 23: 2.069, 24: 2.064, 25: 2.060,
+    26: 2.056, 27: 2.052, 28: 2.048, 29: 2.045, 30: 2.042,
+}
+
+def parse_toc(toc_file):
+    # 导出的 TOC 中每个 <run> 的 Run，按文档顺序
+    root = ET.parse(toc_file).getroot()
+    runs = []
+    for run in root.iter('run'):
+        summary = run.find('./info/summary')
+        duration = summary.findtext('duration') if summary is not None else None
+        schemas = []
+        for table in run.findall('./data/table'):
+            schema = table.get('schema')
+            if schema and schema not in schemas:
+                schemas.append(schema)
+        runs.append(Run(
+            int(run.get('number', len(runs) + 1)),
+            summary.findtext('start-date') if summary is not None else None,
+            summary.findtext('end-date') if summary is not None else None,
+            float(duration) if duration else None,
+            schemas,
+        ))
+    return runs
+
+def run_prefix(prefix, run, runs):
+    # run 的输出前缀；只有一次录制的 trace 沿用原来的文件名
+    if len(runs) <= 1:
+        return prefix
+    return f"{prefix}run{run.number}-"
+
+def confidence_interval(values):
+    # 均值的 95% 置信区间 (low, high)；少于 2 个值时为 (nan, nan)
+    if len(values) < 2:
+        return math.nan, math.nan
+    m = mean(values)
+    half = T_95.get(len(values) - 1, 1.960) * stdev(values) / math.sqrt(len(values))
+    return m - half, m + half
+
+def aggregate(values):
+    # 一个统计量跨 run 的均值、标准差和 95% 置信区间
+    values = [value for value in values if value is not None and not math.isnan(value)]
+    if not values:
+        return {'runs': 0, 'mean': math.nan, 'stddev': math.nan, 'ci_low': math.nan, 'ci_high': math.nan}
+    low, high = confidence_interval(values)
+    return {
+        'runs': len(values),
+        'mean': mean(values),
+        'stddev': stdev(values) if len(values) > 1 else 0.0,
+        'ci_low': low,
+        'ci_high': high,
+    }
+
+def column_metric(column, kind=None, process_name=None):
+    # 读取 column 的注册指标，没有时按 kind 解码的临时指标
+    from summarize import METRICS, Metric
+
+    for metric in METRICS.values():
+        if metric.column == column and kind in (None, metric.kind):
+            return metric
+    return Metric(column, column, None, column, kind or 'number', process_name is not None, False, 1.0, False, 'lower')
+
+def table_stats(path, metric, process_name=None):
+    # 导出表格中一个指标的均值和最大值，可只统计一个进程
+    from summarize import column_values, metric_rows
+    from writers import read_table
+
+    rows = metric_rows(read_table(path), metric, process_name or '')
+    values = column_values(rows[metric.column], metric.kind) * metric.scale
+    return {'mean': values.mean(skipna=True), 'max': values.max()}
+
+def summarize_runs(paths, metric, process_name=None):
+    # 每个表格文件的 mean/max，以及它们跨 run 的汇总
+    per_run = [table_stats(path, metric, process_name) for path in paths]
+    summary = {
+        name: aggregate([float(stats[name]) for stats in per_run])
+        for name in ('mean', 'max')
+    }
+    return per_run, summary
+
+def main():
+    parser = argparse.ArgumentParser(description='列出 trace 中的 run，或汇总跨 run 的统计量')
+    commands = parser.add_subparsers(dest='command', required=True)
+    toc = commands.add_parser('toc')
+    toc.add_argument('toc_file')
+    summarize = commands.add_parser('summarize')
+    selected = summarize.add_mutually_exclusive_group(required=True)
+    selected.add_argument('--metric', default=None, help='summarize.py 中的指标名')
+    selected.add_argument('--column', default=None)
+    summarize.add_argument('--kind', choices=['number', 'percent', 'size', 'time', 'thermal'], default=None,
+                           help='--column 的解码方式，默认为读取该列的指标的解码方式')
+    summarize.add_argument('--process', default=None)
+    summarize.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'toc':
+        for run in parse_toc(args.toc_file):
+            print(f'run {run.number}: {run.start} - {run.end} ({run.duration}s) {", ".join(run.schemas)}')
+        return
+
+    if args.metric:
+        from summarize import METRICS
+
+        if args.metric not in METRICS:
+            parser.error(f'未知的指标 {args.metric}')
+        metric = METRICS[args.metric]
+    else:
+        metric = column_metric(args.column, args.kind, args.process)
+    if metric.per_process and args.process is None:
+        parser.error(f'{metric.name} 按进程统计，需要 --process')
+    per_run, summary = summarize_runs(args.paths, metric, args.process)
+    for path, stats in zip(args.paths, per_run):
+        print(f'{path}: {metric.label} Average={stats["mean"]:.2f} Maximum={stats["max"]}')
+    for name, stats in summary.items():
+        print(f'{metric.label} {name} across {stats["runs"]} runs: '
+              f'mean={stats["mean"]:.2f} stddev={stats["stddev"]:.2f} '
+              f'95% CI=[{stats["ci_low"]:.2f}, {stats["ci_high"]:.2f}]')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""基准测试结果库
+
+在一个 SQLite 数据库中保存每次运行的历史：summarize.py 的汇总统计量和解码后的逐样本指标值，
+带上应用、设备 UDID、模板、git 版本和时间。这些标签列都有索引，
+"makepad_taobao 在设备 X 上最近 90 次运行的 FPS p95" 这类趋势查询只读取匹配的索引项。
+ingest 批量导入已有的输出：目录下只有 XML 的表格先转换，再把每个应用汇总后存为一次运行。
+
+run: `python3 store.py ingest <directory> [--udid UDID] [--revision REV] [--db results.db]`
+     `python3 store.py trend <app> <metric> [--stat p95] [--udid UDID] [--limit 90]`
+     `python3 store.py runs [<app>]`
+eg: `python3 store.py trend makepad_taobao fps --stat p95 --limit 90`
+"""
+
+import argparse
+import configparser
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from batch import convert, discover, group, up_to_date
+from summarize import TABLE_SUFFIXES, column_values, find_table, metric_rows, parse_metrics, selected_metrics, summarize
+from writers import read_table
+
+DB_PATH = os.environ.get('XCPERF_DB', 'results.db')
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.ini')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    app TEXT NOT NULL,
+    udid TEXT,
+    revision TEXT,
+    timestamp REAL NOT NULL,
+    source TEXT
+);
+CREATE TABLE IF NOT EXISTS run_templates (
+    template TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    PRIMARY KEY (template, run_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS summaries (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    stat TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, metric, stat)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    time_ns INTEGER,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_app ON runs(app, udid, timestamp);
+CREATE INDEX IF NOT EXISTS run_templates_run ON run_templates(run_id);
+CREATE INDEX IF NOT EXISTS runs_revision ON runs(revision);
+CREATE INDEX IF NOT EXISTS summaries_metric ON summaries(metric, stat, run_id);
+CREATE INDEX IF NOT EXISTS samples_run ON samples(run_id, metric, time_ns);
+'''
+
+def connect(path=DB_PATH):
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    db.execute('PRAGMA journal_mode = WAL')
+    db.executescript(SCHEMA)
+    return db
+
+def git_revision(directory='.'):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=directory,
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def saved_udid():
+    # xcperf.py 保存在 config.ini 中的设备 UDID，没有时为 None
+    parser = configparser.ConfigParser()
+    parser.read(CONFIG_PATH)
+    return parser['default'].get('test_device_udid') if 'default' in parser else None
+
+def summary_rows(report):
+    # 每个数值统计量的 (metric, stat, value)；直方图展开为 hist_<bin>
+    for metric, stats in report.items():
+        for stat, value in stats.items():
+            if isinstance(value, dict):
+                for key, count in value.items():
+                    yield metric, f'hist_{key}', float(count)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield metric, stat, float(value)
+
+def sample_rows(process_name, directory='.', metrics=None):
+    # 所选指标的逐样本 (metric, time_ns, value) 数组，去掉 NaN
+    loaded = {}
+    for metric in selected_metrics(metrics):
+        if metric.table not in loaded:
+            path = find_table(directory, process_name, metric.table)
+            loaded[metric.table] = read_table(path) if path else None
+        df = loaded[metric.table]
+        if df is None or metric.column not in df.columns:
+            continue
+        rows = metric_rows(df, metric, process_name)
+        values = (column_values(rows[metric.column], metric.kind) * metric.scale).to_numpy()
+        if 'Start' in rows:
+            times = column_values(rows['Start'], 'time').to_numpy()
+        else:
+            times = np.full(values.shape, np.nan)
+        keep = ~np.isnan(values)
+        yield metric.name, times[keep], values[keep]
+
+def add_run(db, app, report, samples=(), udid=None, templates=(), revision=None, timestamp=None, source=None):
+    # 保存一次运行及其模板、汇总和样本，返回 run id；一次运行可以包含多个模板的 trace，每个模板一行
+    with db:
+        run_id = db.execute(
+            'INSERT INTO runs (app, udid, revision, timestamp, source) VALUES (?, ?, ?, ?, ?)',
+            (app, udid, revision, timestamp if timestamp is not None else time.time(), source),
+        ).lastrowid
+        db.executemany('INSERT OR IGNORE INTO run_templates VALUES (?, ?)',
+                       ((template, run_id) for template in templates))
+        db.executemany('INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)',
+                       ((run_id, metric, stat, value) for metric, stat, value in summary_rows(report)))
+        for metric, times, values in samples:
+            times = [None if np.isnan(t) else int(t) for t in times]
+            db.executemany('INSERT INTO samples VALUES (?, ?, ?, ?)',
+                           zip([run_id] * len(values), [metric] * len(values), times, values.tolist()))
+    return run_id
+
+def ingest_app(db, directory, app, templates=None, udid=None, revision=None, timestamp=None, metrics=None,
+               with_samples=True):
+    report = summarize(app, directory, metrics)
+    if not report:
+        return None
+    samples = sample_rows(app, directory, metrics) if with_samples else ()
+    if timestamp is None:
+        timestamp = max(os.path.getmtime(stats['table']) for stats in report.values())
+    return add_run(db, app, report, samples, udid, sorted(templates or []), revision, timestamp,
+                   os.path.abspath(directory))
+
+def ingest(db, root, udid=None, revision=None, timestamp=None, metrics=None, with_samples=True):
+    # 转换 root 下还没转换的表格，把找到的每个应用存为一次运行
+    tables = discover(root, ('.xml',) + tuple(TABLE_SUFFIXES))
+    converted = {(table.directory, table.app, table.template, table.schema) for table in tables if not table.path.endswith('.xml')}
+    for table in tables:
+        key = (table.directory, table.app, table.template, table.schema)
+        if table.path.endswith('.xml') and key not in converted and not up_to_date(table, 'csv'):
+            convert(table, 'csv')
+    run_ids = []
+    for (directory, app), templates in sorted(group(tables).items()):
+        run_id = ingest_app(db, directory, app, templates, udid, revision, timestamp, metrics, with_samples)
+        if run_id is None:
+            print(f'{os.path.join(directory, app)} 没有找到任何指标，跳过', file=sys.stderr)
+            continue
+        run_ids.append(run_id)
+        print(f'{os.path.join(directory, app)}: run {run_id}', file=sys.stderr)
+    return run_ids
+
+def trend(db, app, metric, stat='mean', udid=None, template=None, limit=90):
+    # 最近 limit 次运行的 [(timestamp, revision, udid, value)]，按时间从早到晚
+    query = '''
+        SELECT runs.timestamp, runs.revision, runs.udid, summaries.value
+        FROM runs JOIN summaries ON summaries.run_id = runs.id
+        WHERE runs.app = ? AND summaries.metric = ? AND summaries.stat = ?
+    '''
+    params = [app, metric, stat]
+    if udid is not None:
+        query += ' AND runs.udid = ?'
+        params.append(udid)
+    if template is not None:
+        query += ' AND runs.id IN (SELECT run_id FROM run_templates WHERE template = ?)'
+        params.append(template)
+    query += ' ORDER BY runs.timestamp DESC LIMIT ?'
+    params.append(limit)
+    return db.execute(query, params).fetchall()[::-1]
+
+def run_samples(db, run_id, metric):
+    # 一次运行中一个指标的 (time_ns, value) 数组
+    rows = db.execute('SELECT time_ns, value FROM samples WHERE run_id = ? AND metric = ? ORDER BY time_ns',
+                      (run_id, metric)).fetchall()
+    times, values = zip(*rows) if rows else ((), ())
+    return np.array(times, dtype=np.float64), np.array(values, dtype=np.float64)
+
+def list_runs(db, app=None):
+    # 每次运行一行，templates 为逗号分隔的模板
+    query = '''
+        SELECT runs.id, runs.app, runs.udid, group_concat(run_templates.template, ','), runs.revision, runs.timestamp,
+               runs.source
+        FROM runs LEFT JOIN run_templates ON run_templates.run_id = runs.id
+    '''
+    params = []
+    if app is not None:
+        query += ' WHERE runs.app = ?'
+        params.append(app)
+    return db.execute(query + ' GROUP BY runs.id ORDER BY runs.timestamp', params).fetchall()
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+def main():
+    parser = argparse.ArgumentParser(description='保存基准测试结果并查询历史')
+    parser.add_argument('--db', default=DB_PATH, help='SQLite 数据库路径（环境变量 XCPERF_DB）')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help='保存目录下导出的表格')
+    ingest_parser.add_argument('directory')
+    ingest_parser.add_argument('--udid', default=None, help='设备 UDID，默认为 config.ini 中保存的')
+    ingest_parser.add_argument('--revision', default=None, help='git 版本，默认为该目录的 HEAD')
+    ingest_parser.add_argument('--timestamp', type=float, default=None, help='运行时间，默认为表格的修改时间')
+    ingest_parser.add_argument('--metrics', type=parse_metrics, default=None, help='逗号分隔的指标名，默认全部')
+    ingest_parser.add_argument('--no-samples', action='store_true', help='只保存汇总')
+    trend_parser = commands.add_parser('trend', help='一个指标某个统计量的历史')
+    trend_parser.add_argument('app')
+    trend_parser.add_argument('metric')
+    trend_parser.add_argument('--stat', default='mean', help='mean, max, p95, low_1pct, ...')
+    trend_parser.add_argument('--udid', default=None)
+    trend_parser.add_argument('--template', default=None, help='只查询包含该模板的运行，例如 GamePerformance')
+    trend_parser.add_argument('--limit', type=int, default=90)
+    trend_parser.add_argument('--json', action='store_true')
+    runs_parser = commands.add_parser('runs', help='列出已保存的运行')
+    runs_parser.add_argument('app', nargs='?')
+    args = parser.parse_args()
+
+    db = connect(args.db)
+    if args.command == 'ingest':
+        run_ids = ingest(db, args.directory, args.udid or saved_udid(), args.revision or git_revision(args.directory),
+                         args.timestamp, args.metrics, not args.no_samples)
+        print(f'已保存 {len(run_ids)} 次运行到 {args.db}')
+    elif args.command == 'trend':
+        rows = trend(db, args.app, args.metric, args.stat, args.udid, args.template, args.limit)
+        if args.json:
+            print(json.dumps([dict(zip(['timestamp', 'revision', 'udid', 'value'], row)) for row in rows], indent=2))
+        for timestamp, revision, udid, value in [] if args.json else rows:
+            print(f'{format_time(timestamp)}  {revision or "-":<10} {udid or "-":<26} {value:.2f}')
+    else:
+        for run_id, app, udid, templates, revision, timestamp, source in list_runs(db, args.app):
+            print(f'{run_id:>5}  {format_time(timestamp)}  {app}  {udid or "-"}  {templates or "-"}  {revision or "-"}  {source}')
+
+if __name__ == '__main__':
+    main()
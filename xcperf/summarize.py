@@ -1,41 +1,340 @@
-import pandas as pd
+"""汇总导出的表格
+
+所有指标共用一个汇总流程：每个指标是注册表中的一项，指明导出的表格、列和解码方式；
+每个表格只读取一次，它的所有指标一起用 pandas 向量化计算，frames 指标另外计算 frames.py 的帧统计。
+表格按 {process_name}-{table} 查找，后缀依次为 .parquet、.arrow、.columns、.csv，取第一个存在的。
+与原来的 summarize1/2/3.py 一样，每个表格输出一行逗号分隔的 mean,max 便于粘贴到 README，
+并把参与统计的行写入 summary-{process_name}-{table}.csv。
+--runs 分别汇总多次录制中每个 run 的表格（{process_name}-{Template}-run{N}-{schema}），再计算各统计量跨 run 的均值和置信区间。
+
+run: `python3 summarize.py <process_name> [--metrics cpu,memory,fps,gpu,thermal] [--metric name=table:column] [--jank-fps 50] [--runs 1,2,3]`
+eg: `python3 summarize.py makepad_taobao`
+"""
+
+import argparse
+import json
+import os
 import sys
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from decode import SIZE_UNITS, THERMAL_STATES, TIME_UNITS
+from frames import JANK_FPS, frame_pacing
+from profiler import add_arguments, configure, report_timings, span
+from runs import aggregate
+from writers import atomic_output, read_table
+
+MIB = 1024 ** 2
+
+TABLE_SUFFIXES = ['.parquet', '.arrow', '.columns', '.csv']
+
+# kind: 列的解码方式，'number'、'percent'、'size'（字节）、'time'（ns）或 'thermal'（状态编码）
+# per_process: 只保留 Process Name 以测试进程名开头的行
+# trim_last: 去掉最后一行（不完整的区间）
+# scale: 解码后的值乘以的系数（例如字节 -> MiB）
+# frames: 值为 FPS 样本，额外计算帧统计
+# better: 'lower' 或 'higher'，哪个方向的变化是改进
+Metric = namedtuple('Metric', ['name', 'label', 'table', 'column', 'kind', 'per_process', 'trim_last', 'scale', 'frames', 'better'])
+
+METRICS = {}
+
+def register(name, label, table, column, kind='number', per_process=False, trim_last=False, scale=1.0, frames=False,
+             better='lower'):
+    # 把指标加入注册表（替换同名指标）并返回
+    METRICS[name] = Metric(name, label, table, column, kind, per_process, trim_last, scale, frames, better)
+    return METRICS[name]
+
+register('cpu', '% CPU', 'ActivityMonitor-sysmon-process', '% CPU', kind='percent', per_process=True)
+register('memory', 'Memory', 'ActivityMonitor-sysmon-process', 'Memory', kind='size', per_process=True, scale=1 / MIB)
+register('fps', 'FPS', 'GamePerformance-displayed-surfaces-per-second', 'Count', trim_last=True, frames=True, better='higher')
+register('ca-fps', 'Core Animation FPS', 'MetalSystemTrace-core-animation-fps-estimate', 'FPS', trim_last=True, frames=True,
+         better='higher')
+register('gpu', '% GPU', 'MetalSystemTrace-core-animation-fps-estimate', 'GPU Hardware Utilization', kind='percent', trim_last=True)
+register('thermal', 'Thermal State', 'GamePerformance-device-thermal-state-intervals', 'Thermal State', kind='thermal')
+
+def selected_metrics(names=None):
+    # names 对应的注册指标，默认全部；有未知的名字时抛出 ValueError，列出可选的指标
+    unknown = [name for name in names or [] if name not in METRICS]
+    if unknown:
+        raise ValueError(f'未知的指标 {", ".join(unknown)}，可选 {", ".join(METRICS)}')
+    return [METRICS[name] for name in (names or METRICS)]
+
+def parse_metrics(value):
+    # --metrics 的 argparse type：逗号分隔的指标名，解析参数时就报告未知的指标
+    names = value.split(',')
+    try:
+        selected_metrics(names)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return names
+
+def column_values(series, kind='number'):
+    # 把一列解码为 float64；格式化的 CSV 文本用向量化的字符串操作解析
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(np.float64)
+    # 格式化的值大量重复（同一次采样的所有进程共用 Start 和 Duration），每个不同的值只解析一次
+    codes, distinct = pd.factorize(series)
+    values = distinct_values(pd.Series(distinct), kind).to_numpy()
+    return pd.Series(np.append(values, np.nan)[codes], index=series.index)
+
+def distinct_values(series, kind):
+    # 对不同的格式化文本逐个计算 column_values
+    text = series.astype(str)
+    if kind == 'thermal':
+        return text.str.strip().str.lower().map(THERMAL_STATES).astype(np.float64)
+    if kind == 'time':
+        return time_values(text)
+    parts = text.str.extract(r'^\s*(-?[\d,]*\.?\d+)\s*([A-Za-z]*)')
+    values = pd.to_numeric(parts[0].str.replace(',', '', regex=False), errors='coerce')
+    if kind == 'size':
+        values = values * parts[1].str.lower().map(SIZE_UNITS).fillna(1)
+    return values.astype(np.float64)
+
+def time_values(text):
+    # 把格式化的时间（"00:01.234.567" 或 "16.67 ms"）解析为 ns
+    clock = text.str.extract(r'^\s*(?:(\d+):)?(\d+):(\d+)\.(\d+)(?:\.(\d+))?').astype(np.float64)
+    clock_ns = ((clock[0].fillna(0) * 3600 + clock[1] * 60 + clock[2]) * 1e9
+                + clock[3] * 1e6 + clock[4].fillna(0) * 1e3)
+    parts = text.str.extract(r'^\s*(-?\d*\.?\d+)\s*([^\d\s]+)')
+    unit_ns = pd.to_numeric(parts[0], errors='coerce') * parts[1].map(TIME_UNITS)
+    return clock_ns.fillna(unit_ns).astype(np.float64)
+
+def table_name(process_name, table, run=None):
+    # 表格的文件名（不含后缀）；多次录制中第 N 个 run 的表格为 {process}-{Template}-run{N}-{schema}
+    if run is None:
+        return f'{process_name}-{table}'
+    template, _, schema = table.partition('-')
+    return f'{process_name}-{template}-run{run}-{schema}'
+
+def find_table(directory, process_name, table, run=None):
+    for suffix in TABLE_SUFFIXES:
+        path = os.path.join(directory, table_name(process_name, table, run) + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+def metric_rows(df, metric, process_name):
+    # 计算指标用到的行
+    rows = df
+    if metric.per_process:
+        rows = rows[rows['Process Name'].astype(str).str.startswith(process_name, na=False)]
+    if metric.trim_last:
+        rows = rows.iloc[:-1]
+    return rows
+
+def metric_frame(df, metrics, process_name):
+    # 一个表格中所有指标解码后的值，每个指标一列
+    columns = {}
+    for metric in metrics:
+        rows = metric_rows(df, metric, process_name)
+        columns[metric.name] = column_values(rows[metric.column], metric.kind) * metric.scale
+    return pd.DataFrame(columns)
+
+def frame_statistics(df, metric, process_name, jank_fps=JANK_FPS):
+    # frames 指标的帧统计，表格有 Duration 列时按其计算
+    rows = metric_rows(df, metric, process_name)
+    durations = column_values(rows['Duration'], 'time').to_numpy() if 'Duration' in rows else None
+    return frame_pacing(column_values(rows[metric.column], metric.kind).to_numpy(), durations, jank_fps)
+
+def table_statistics(values):
+    # 一次算出指标表中每列的 count/mean/std/min/max
+    stats = values.agg(['count', 'mean', 'std', 'min', 'max'])
+    return {name: {stat: float(stats.at[stat, name]) for stat in stats.index} for name in values.columns}
+
+def metric_samples(process_name, directory='.', metrics=None):
+    # 所选指标解码后的逐个样本 {指标: ndarray}，去掉 NaN
+    selected = selected_metrics(metrics)
+    loaded = {}
+    samples = {}
+    for metric in selected:
+        if metric.table not in loaded:
+            path = find_table(directory, process_name, metric.table)
+            loaded[metric.table] = read_table(path) if path else None
+        df = loaded[metric.table]
+        if df is None or metric.column not in df.columns:
+            continue
+        values = metric_frame(df, [metric], process_name)[metric.name].to_numpy()
+        samples[metric.name] = values[~np.isnan(values)]
+    return samples
+
+def summarize(process_name, directory='.', metrics=None, tables=None, jank_fps=JANK_FPS, run=None, rows_dir=None):
+    # 计算所选指标的汇总 {指标: {table, column, 统计量...}}
+    # tables 可以是 {表格名: 已读取的 DataFrame}；run 为多次录制中的第几个 run；
+    # rows_dir 不为 None 时把每个表格参与统计的行写入 rows_dir 下的 summary-{process}-{table}.csv
+    with span('summarize', process=process_name, directory=directory, run=run):
+        return summarize_tables(process_name, directory, metrics, tables, jank_fps, run, rows_dir)
+
+def write_rows(path, values, metrics, processes=None):
+    # 写入一个表格参与统计的行（解码后的值），按进程统计的指标带上进程名
+    rows = values.rename(columns={metric.name: metric.column for metric in metrics})
+    if processes is not None and any(metric.per_process for metric in metrics):
+        rows.insert(0, 'Process Name', processes.reindex(rows.index))
+    with atomic_output(path) as partial:
+        rows.to_csv(partial, index=False)
+
+def summarize_tables(process_name, directory, metrics, tables, jank_fps, run=None, rows_dir=None):
+    selected = selected_metrics(metrics)
+    by_table = {}
+    for metric in selected:
+        by_table.setdefault(metric.table, []).append(metric)
 
-process_name = sys.argv[1]
-column0 = 'Process Name'
-column1 ='% CPU'
-column2 = 'Memory'
+    report = {}
+    for table, table_metrics in by_table.items():
+        if tables is not None and table in tables:
+            df, path = tables[table], table
+        else:
+            path = find_table(directory, process_name, table, run)
+            if path is None:
+                print(f'没有找到表格 {table_name(process_name, table, run)}，跳过 {", ".join(m.name for m in table_metrics)}', file=sys.stderr)
+                continue
+            df = read_table(path)
+        missing = [metric for metric in table_metrics if metric.column not in df.columns]
+        for metric in missing:
+            print(f'{path} 中没有 {metric.column!r} 列，跳过 {metric.name}', file=sys.stderr)
+        table_metrics = [metric for metric in table_metrics if metric not in missing]
+        values = metric_frame(df, table_metrics, process_name)
+        if rows_dir is not None and table_metrics:
+            write_rows(os.path.join(rows_dir, f'summary-{table_name(process_name, table, run)}.csv'), values,
+                       table_metrics, df.get('Process Name'))
+        for metric in table_metrics:
+            report[metric.name] = {'label': metric.label, 'table': path, 'column': metric.column}
+        for name, stats in table_statistics(values).items():
+            report[name].update(stats)
+        for metric in table_metrics:
+            if metric.frames:
+                report[metric.name].update(frame_statistics(df, metric, process_name, jank_fps))
+    return report
 
-# Function to read CSV file, filter rows, and then select columns
-def filter_rows_and_select_columns(process_name, column1, column2):
-    file_path = f"sysmon-process.csv"
-    # file_path = f"{process_name}-sysmon-process.csv"
+def summarize_runs(process_name, runs, directory='.', metrics=None, tables=None, jank_fps=JANK_FPS):
+    # 每个 run 的汇总，以及各统计量跨 run 的聚合
+    # runs 为 run 编号；tables 可以是 {run: summarize 的 tables 参数}
+    # 返回 {'runs': {run: 汇总}, 'aggregate': {指标: {统计量: aggregate()}}}
+    reports = {run: summarize(process_name, directory, metrics, (tables or {}).get(run), jank_fps, run) for run in runs}
+    summary = {}
+    for report in reports.values():
+        for name, stats in report.items():
+            summary.setdefault(name, {'label': stats['label']})
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and stat not in summary[name]:
+                    summary[name][stat] = aggregate([other[name].get(stat) for other in reports.values() if name in other])
+    return {'runs': reports, 'aggregate': summary}
 
-    df = pd.read_csv(file_path, usecols=[column0, column1, column2])
+def write_runs_report(summary, json_path=None, csv_path=None):
+    # 把 summarize_runs 的结果写为 JSON 和/或 CSV，CSV 每行为一个指标的一个统计量
+    if json_path:
+        with atomic_output(json_path) as partial, open(partial, 'w') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False, allow_nan=True)
+    if csv_path:
+        rows = []
+        for name, stats in summary['aggregate'].items():
+            for stat, values in stats.items():
+                if stat == 'label':
+                    continue
+                row = {'metric': name, 'stat': stat, **values}
+                for run, report in summary['runs'].items():
+                    row[f'run{run}'] = report.get(name, {}).get(stat)
+                rows.append(row)
+        with atomic_output(csv_path) as partial:
+            pd.DataFrame(rows).to_csv(partial, index=False)
 
-    result_df = df[df[column0].str.contains(process_name, na=False)]
+def print_runs_report(summary):
+    for stats in summary['aggregate'].values():
+        for stat in ('mean', 'max'):
+            if stat in stats:
+                values = stats[stat]
+                print(f'{stats["label"]} {stat} across {values["runs"]} runs: mean={values["mean"]:.2f} '
+                      f'stddev={values["stddev"]:.2f} 95% CI=[{values["ci_low"]:.2f}, {values["ci_high"]:.2f}]')
 
-    result_df.loc[:, column1] = result_df.loc[:, column1].str.replace('%', '').astype(float)
-    result_df.loc[:, column2] = result_df.loc[:, column2].str.replace('MiB', '').astype(float)
-    # print(result_df)
+def write_report(report, json_path=None, csv_path=None):
+    # 把汇总写为 JSON 和/或 CSV，每个文件原子替换
+    if json_path:
+        with atomic_output(json_path) as partial, open(partial, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False, allow_nan=True)
+    if csv_path:
+        rows = {
+            name: {key: json.dumps(value) if isinstance(value, dict) else value for key, value in stats.items()}
+            for name, stats in report.items()
+        }
+        with atomic_output(csv_path) as partial:
+            pd.DataFrame.from_dict(rows, orient='index').rename_axis('metric').to_csv(partial)
 
-    average1 = result_df[column1].mean(skipna=True)
-    print(f'Average={average1:.2f}')
-    max_value1 = result_df[column1].max()
-    print(f'Maximum={max_value1}')
+def paste_lines(report):
+    # 每个表格一行 mean,max,mean,max...，即粘贴到 README 结果中的格式
+    by_table = {}
+    for stats in report.values():
+        by_table.setdefault(stats['table'], []).append(f'{stats["mean"]:.2f},{stats["max"]}')
+    return [','.join(values) for values in by_table.values()]
 
-    average2 = result_df[column2].mean(skipna=True)
-    print(f'Average={average2:.2f}')
-    max_value2 = result_df[column2].max()
-    print(f'Maximum={max_value2}')
+def print_report(report):
+    for stats in report.values():
+        print(f'{stats["label"]} Average={stats["mean"]:.2f}')
+        print(f'{stats["label"]} Maximum={stats["max"]}')
+        if 'low_1pct' in stats:
+            print(f'{stats["label"]} P1={stats["p1"]:.2f} P5={stats["p5"]:.2f} P50={stats["p50"]:.2f} '
+                  f'P95={stats["p95"]:.2f} P99={stats["p99"]:.2f} 1% Low={stats["low_1pct"]:.2f}')
+            print(f'{stats["label"]} Jank (<{stats["jank_fps"]:g})={stats["jank_count"]} times, '
+                  f'{stats["jank_seconds"]:.2f}s ({stats["jank_ratio"]:.1%})')
+    for line in paste_lines(report):
+        print(line)
 
-    output_file_path = f"{process_name}-sysmon-process.csv"
+def parse_metric(spec):
+    # name=table:column[:kind]
+    name, _, rest = spec.partition('=')
+    table, column, *kind = rest.split(':')
+    return register(name, name, table, column, kind=kind[0] if kind else 'number')
 
-    result_df.to_csv(output_file_path, index=False)
+def main():
+    parser = argparse.ArgumentParser(description='汇总一个进程导出的表格')
+    parser.add_argument('process_name')
+    parser.add_argument('--dir', default='.', help='导出表格所在的目录')
+    parser.add_argument('--metrics', default=None, help='逗号分隔的指标名，默认全部')
+    parser.add_argument('--metric', action='append', default=[], help='额外的指标 name=table:column[:kind]')
+    parser.add_argument('--jank-fps', type=float, default=JANK_FPS, help='FPS 低于该值的窗口计为卡顿')
+    parser.add_argument('--runs', default=None,
+                        help='逗号分隔的 run 编号，分别汇总多次录制的每个 run 并计算跨 run 的聚合')
+    parser.add_argument('--no-rows', action='store_true',
+                        help='不写入每个表格参与统计的行 summary-<process_name>-<table>.csv')
+    parser.add_argument('--json', default=None, help='汇总的路径，默认 summary-<process_name>[-runs].json')
+    parser.add_argument('--csv', default=None, help='汇总的路径，默认 summary-<process_name>[-runs].csv')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
 
-# Example usage
-if len(sys.argv) < 2:
-    print("Usage: python script.py <process_name> ")
-    sys.exit(1)
+    # --metric 定义的指标注册后才能出现在 --metrics 中，所以在这里而不是用 parse_metrics 检查
+    extra = [parse_metric(spec).name for spec in args.metric]
+    metrics = args.metrics.split(',') + extra if args.metrics else None
+    try:
+        selected_metrics(metrics)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.runs:
+        try:
+            runs = [int(run) for run in args.runs.split(',')]
+        except ValueError:
+            parser.error(f'无效的 run 编号 {args.runs!r}')
+        summary = summarize_runs(args.process_name, runs, args.dir, metrics, jank_fps=args.jank_fps)
+        for run, report in summary['runs'].items():
+            print(f'Run {run}')
+            print_report(report)
+        print_runs_report(summary)
+        write_runs_report(
+            summary,
+            args.json or f'summary-{args.process_name}-runs.json',
+            args.csv or f'summary-{args.process_name}-runs.csv',
+        )
+        report_timings(args)
+        return
+    report = summarize(args.process_name, args.dir, metrics, jank_fps=args.jank_fps,
+                       rows_dir=None if args.no_rows else '.')
+    print_report(report)
+    write_report(
+        report,
+        args.json or f'summary-{args.process_name}.json',
+        args.csv or f'summary-{args.process_name}.csv',
+    )
+    report_timings(args)
 
-filter_rows_and_select_columns(process_name, column1, column2)
+if __name__ == '__main__':
+    main()
@@ -1,3 +1 @@
-python3 summarize3.py $1
-python3 summarize2.py $1
-python3 summarize1.py $1
+python3 summarize.py $1
@@ -0,0 +1,214 @@
+"""合成 xctrace 导出
+
+不需要 Xcode，为我们导出的表格（sysmon-process、displayed-surfaces-per-second、core-animation-fps-estimate、
+device-thermal-state-intervals）生成逼真的 trace-query-result XML，用于基准测试和转换流程的测试。
+行数、进程数和 ref 比例可调：与 xctrace export 一样，出现过的值以 ref_density 的概率写为 <tag ref="id"/>，否则写为带新 id 的元素。
+文件名为 {app}-{Template}-{schema}.xml，可直接交给 xml2csv.py、batch.py 或 summarize.py。
+
+run: `python3 synth.py [schema ...] [--rows N] [--processes N] [--ref-density 0.9] [--app SynthApp] [--dir .]`
+eg: `python3 synth.py sysmon-process --rows 1000000 --processes 200`
+"""
+
+import argparse
+import os
+import random
+from xml.sax.saxutils import quoteattr
+
+ROWS = 10000
+PROCESSES = 50
+REF_DENSITY = 0.9
+APP = 'SynthApp'
+NS_PER_S = 1000 ** 3
+# 每个标签最多记住这么多个值，超过后清空，1000 万行时内存也有上限
+MAX_INTERNED = 65536
+
+DAEMONS = ['kernel_task', 'SpringBoard', 'backboardd', 'mediaserverd', 'locationd', 'assetsd', 'mDNSResponder',
+           'wifid', 'runningboardd', 'symptomsd', 'thermalmonitord', 'powerd', 'cloudd', 'nsurlsessiond']
+
+# schema: (模板, [(mnemonic, 列名, engineering-type)])
+SCHEMAS = {
+    'sysmon-process': ('ActivityMonitor', [
+        ('start', 'Start', 'start-time'),
+        ('duration', 'Duration', 'duration'),
+        ('process', 'Process Name', 'process'),
+        ('cpu-percent', '% CPU', 'system-cpu-percent'),
+        ('cpu-total', 'CPU Time', 'duration-on-core'),
+        ('memory-footprint', 'Memory', 'size-in-bytes'),
+    ]),
+    'displayed-surfaces-per-second': ('GamePerformance', [
+        ('start', 'Start', 'start-time'),
+        ('duration', 'Duration', 'duration'),
+        ('count', 'Count', 'count'),
+    ]),
+    'core-animation-fps-estimate': ('MetalSystemTrace', [
+        ('start', 'Start', 'start-time'),
+        ('duration', 'Duration', 'duration'),
+        ('fps', 'FPS', 'fps'),
+        ('gpu-utilization', 'GPU Hardware Utilization', 'percent'),
+    ]),
+    'device-thermal-state-intervals': ('GamePerformance', [
+        ('start', 'Start', 'start-time'),
+        ('duration', 'Duration', 'duration'),
+        ('thermal-state', 'Thermal State', 'thermal-state'),
+    ]),
+}
+
+def format_time(ns):
+    # 与 Instruments 显示开始时间的格式相同："MM:SS.mmm.uuu"，需要时带小时
+    seconds, rest = divmod(int(ns), NS_PER_S)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    clock = f'{minutes:02d}:{seconds:02d}.{rest // 1000 ** 2:03d}.{rest // 1000 % 1000:03d}'
+    return f'{hours:02d}:{clock}' if hours else clock
+
+def format_duration(ns):
+    if ns >= NS_PER_S:
+        return f'{ns / NS_PER_S:.2f} s'
+    if ns >= 1000 ** 2:
+        return f'{ns / 1000 ** 2:.2f} ms'
+    return f'{ns / 1000:.2f} µs'
+
+def format_size(size):
+    return f'{size / 1024 ** 2:.2f} MiB'
+
+class Interner:
+    # 把单元格写为带 id 的新元素，或指向前面相同值元素的 ref
+    def __init__(self, rng, ref_density=REF_DENSITY):
+        self.rng = rng
+        self.ref_density = ref_density
+        self.next_id = 1
+        self.seen = {}
+
+    def cell(self, tag, text, fmt, child=None):
+        # child 为可选的嵌套单元格 (tag, text, fmt)；id 按文档顺序分配
+        seen = self.seen.setdefault(tag, {})
+        key = (text, fmt)
+        if key in seen and self.rng.random() < self.ref_density:
+            return f'<{tag} ref="{seen[key]}"/>'
+        if len(seen) >= MAX_INTERNED:
+            seen.clear()
+        cell_id = self.next_id
+        self.next_id += 1
+        seen[key] = cell_id
+        children = self.cell(*child) if child else ''
+        return f'<{tag} id="{cell_id}" fmt={quoteattr(fmt)}>{text}{children}</{tag}>'
+
+    def process(self, name, pid):
+        return self.cell('process', '', f'{name} ({pid})', ('pid', pid, str(pid)))
+
+def process_names(app, count):
+    # [(name, pid)]，测试应用在前，然后是系统守护进程和编号的辅助进程
+    names = [app] + DAEMONS[:count - 1]
+    names += [f'helper{i}' for i in range(count - len(names))]
+    return [(name, 100 + i * 7) for i, name in enumerate(names)]
+
+def sysmon_rows(rows, interner, rng, app=APP, processes=PROCESSES):
+    # 每秒一次采样，每个进程一行；测试应用的内存缓慢增长
+    procs = process_names(app, processes)
+    memory = {name: rng.randint(20, 300) * 1024 ** 2 for name, _ in procs}
+    for i in range(rows):
+        sample, index = divmod(i, len(procs))
+        name, pid = procs[index]
+        start = sample * NS_PER_S
+        cpu = round(rng.uniform(20, 90) if index == 0 else rng.expovariate(1 / 3) % 100, 1)
+        cpu_time = int(cpu * 10 ** 7)
+        memory[name] += rng.randint(0, 2 * 1024 ** 2) if index == 0 else 0
+        yield ''.join([
+            interner.cell('start-time', start, format_time(start)),
+            interner.cell('duration', NS_PER_S, format_duration(NS_PER_S)),
+            interner.process(name, pid),
+            interner.cell('system-cpu-percent', cpu, f'{cpu}%'),
+            interner.cell('duration-on-core', cpu_time, format_duration(cpu_time)),
+            '<sentinel/>' if rng.random() < 0.02 else interner.cell('size-in-bytes', memory[name], format_size(memory[name])),
+        ])
+
+def fps_value(rng):
+    # 大多接近 60，偶尔有卡顿的一秒
+    if rng.random() < 0.05:
+        return rng.randint(20, 50)
+    return max(0, min(60, int(rng.gauss(58, 2))))
+
+def surfaces_rows(rows, interner, rng, **_):
+    for i in range(rows):
+        start = i * NS_PER_S
+        count = fps_value(rng)
+        yield ''.join([
+            interner.cell('start-time', start, format_time(start)),
+            interner.cell('duration', NS_PER_S, format_duration(NS_PER_S)),
+            interner.cell('count', count, str(count)),
+        ])
+
+def core_animation_rows(rows, interner, rng, **_):
+    for i in range(rows):
+        start = i * NS_PER_S
+        fps = fps_value(rng)
+        gpu = round(rng.uniform(5, 40), 1)
+        yield ''.join([
+            interner.cell('start-time', start, format_time(start)),
+            interner.cell('duration', NS_PER_S, format_duration(NS_PER_S)),
+            interner.cell('fps', fps, str(fps)),
+            interner.cell('percent', gpu, f'{gpu}%'),
+        ])
+
+def thermal_rows(rows, interner, rng, **_):
+    # 连续的区间；状态每次升降一级
+    states = ['Nominal', 'Fair', 'Serious', 'Critical']
+    level, start = 0, 0
+    for _ in range(rows):
+        duration = rng.randint(5, 120) * NS_PER_S
+        yield ''.join([
+            interner.cell('start-time', start, format_time(start)),
+            interner.cell('duration', duration, format_duration(duration)),
+            interner.cell('thermal-state', states[level].lower(), states[level]),
+        ])
+        start += duration
+        level = max(0, min(3, level + rng.choice([-1, 0, 0, 1])))
+
+ROW_GENERATORS = {
+    'sysmon-process': sysmon_rows,
+    'displayed-surfaces-per-second': surfaces_rows,
+    'core-animation-fps-estimate': core_animation_rows,
+    'device-thermal-state-intervals': thermal_rows,
+}
+
+def table_path(directory, app, schema):
+    return os.path.join(directory, f'{app}-{SCHEMAS[schema][0]}-{schema}.xml')
+
+def write_table(path, schema, rows=ROWS, processes=PROCESSES, ref_density=REF_DENSITY, app=APP, seed=0):
+    # 写入一个有 rows 行的 schema 合成导出，返回路径
+    rng = random.Random(seed)
+    interner = Interner(rng, ref_density)
+    columns = ''.join(
+        f'<col><mnemonic>{mnemonic}</mnemonic><name>{name}</name><engineering-type>{engineering_type}</engineering-type></col>'
+        for mnemonic, name, engineering_type in SCHEMAS[schema][1]
+    )
+    with open(path, 'w', buffering=1024 * 1024) as f:
+        f.write('<?xml version="1.0"?>\n<trace-query-result>\n')
+        f.write(f'<node xpath=\'//trace-toc[1]/run[1]/data[1]/table[@schema="{schema}"]\'><schema name="{schema}">{columns}</schema>\n')
+        for row in ROW_GENERATORS[schema](rows, interner, rng, app=app, processes=processes):
+            f.write(f'<row>{row}</row>\n')
+        f.write('</node></trace-query-result>\n')
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成的 xctrace 表格导出')
+    parser.add_argument('schemas', nargs='*', help=f'默认全部：{", ".join(SCHEMAS)}')
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--processes', type=int, default=PROCESSES, help='sysmon-process 每次采样的进程数')
+    parser.add_argument('--ref-density', type=float, default=REF_DENSITY, help='重复的值写为 ref 的概率')
+    parser.add_argument('--app', default=APP, help='测试应用的进程名')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', default='.')
+    args = parser.parse_args()
+    unknown = [schema for schema in args.schemas if schema not in SCHEMAS]
+    if unknown:
+        parser.error(f'未知的 schema {", ".join(unknown)}')
+
+    os.makedirs(args.dir, exist_ok=True)
+    for schema in args.schemas or SCHEMAS:
+        path = write_table(table_path(args.dir, args.app, schema), schema, args.rows, args.processes,
+                           args.ref_density, args.app, args.seed)
+        print(f'{path}: {args.rows} 行，{os.path.getsize(path)} 字节')
+
+if __name__ == '__main__':
+    main()
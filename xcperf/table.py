@@ -0,0 +1,209 @@
+from array import array
+from collections import namedtuple
+
+from writers import require
+
+# 解码后的行按列收集，而不是 Python 对象的列表：
+# 数值列用 array.array 存放（每个值 8 或 1 字节），出现缺失值时才分配掩码；
+# 字符串列字典编码，每行一个 int32 编码，进程名、温度状态这类重复的值只存一份；
+# 类型未知的列先按字符串字典编码收集，读取时只转换不同的值来确定类型（依次尝试 int、float，与 writers 相同）。
+# to_numpy / to_pandas / to_arrow 尽量不复制缓冲区，存在视图时 array 不能再增长，所以要在表格写完后再读取。
+# numpy、pandas 和 pyarrow 只在转换时导入
+
+TYPECODES = {'int64': 'q', 'uint64': 'Q', 'int8': 'b', 'float64': 'd'}
+
+# values 为 dtype 类型的 ndarray；mask 为 bool ndarray（True 表示缺失），没有缺失值时为 None
+Numeric = namedtuple('Numeric', ['dtype', 'values', 'mask'])
+# codes 为 int32 ndarray，-1 表示缺失；dictionary 为按出现顺序排列的不同字符串
+Strings = namedtuple('Strings', ['codes', 'dictionary'])
+# 只有缺失值、没有类型的列
+Nulls = namedtuple('Nulls', ['length'])
+
+class NumericColumn:
+    def __init__(self, dtype):
+        self.dtype = dtype
+        self.values = array(TYPECODES[dtype])
+        self.mask = None
+
+    def append(self, value):
+        if value is None:
+            if self.mask is None:
+                self.mask = bytearray(len(self.values))
+            self.mask.append(1)
+            self.values.append(0)
+            return
+        if self.mask is not None:
+            self.mask.append(0)
+        self.values.append(value)
+
+    def extend(self, other):
+        if other.mask is not None and self.mask is None:
+            self.mask = bytearray(len(self.values))
+        if self.mask is not None:
+            self.mask += other.mask if other.mask is not None else bytearray(len(other.values))
+        self.values.extend(other.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return self.values.itemsize * len(self.values) + (len(self.mask) if self.mask is not None else 0)
+
+    def parts(self):
+        np = require('numpy')
+        values = np.frombuffer(self.values, dtype=self.dtype)
+        mask = np.frombuffer(self.mask, dtype=np.bool_) if self.mask is not None and 1 in self.mask else None
+        return Numeric(self.dtype, values, mask)
+
+class DictColumn:
+    dtype = 'str'
+
+    def __init__(self):
+        self.codes = array('i')
+        self.index = {}
+        self.dictionary = []
+
+    def append(self, value):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.dictionary)
+            self.dictionary.append(value)
+        self.codes.append(code)
+
+    def extend(self, other):
+        # 把 other 的编码映射到本列的字典，本列没有的值按其在 other 中的出现顺序追加
+        np = require('numpy')
+        mapping = []
+        for value in other.dictionary:
+            code = self.index.get(value)
+            if code is None:
+                code = self.index[value] = len(self.dictionary)
+                self.dictionary.append(value)
+            mapping.append(code)
+        # 缺失值的下标 -1 取到末尾追加的 -1
+        codes = np.array(mapping + [-1], dtype=np.int32)[np.frombuffer(other.codes, dtype=np.int32)]
+        self.codes.frombytes(codes.tobytes())
+
+    def __getstate__(self):
+        # index 可由 dictionary 重建，不随 pickle 传给其他进程
+        return self.codes, self.dictionary
+
+    def __setstate__(self, state):
+        self.codes, self.dictionary = state
+        self.index = {value: code for code, value in enumerate(self.dictionary)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        # 编码加上不同字符串本身的大小
+        return self.codes.itemsize * len(self.codes) + sum(len(value) for value in self.dictionary)
+
+    def parts(self):
+        np = require('numpy')
+        return Strings(np.frombuffer(self.codes, dtype=np.int32), self.dictionary)
+
+class InferredColumn(DictColumn):
+    dtype = None
+
+    def parts(self):
+        strings = super().parts()
+        if not self.dictionary:
+            return Nulls(len(self.codes))
+        np = require('numpy')
+        for kind, dtype in ((int, 'int64'), (float, 'float64')):
+            try:
+                typed = [kind(value) for value in self.dictionary]
+                # 缺失行的下标 -1 取到末尾追加的 0；超出 int64 范围的整数列按 float 读取
+                values = np.array(typed + [0], dtype=dtype)[strings.codes]
+            except (ValueError, OverflowError):
+                continue
+            missing = strings.codes < 0
+            return Numeric(dtype, values, missing if missing.any() else None)
+        return strings
+
+def make_column(dtype):
+    if dtype in TYPECODES:
+        return NumericColumn(dtype)
+    if dtype == 'str':
+        return DictColumn()
+    return InferredColumn()
+
+def numpy_array(parts):
+    # 整列转为一个 ndarray：缺失的数值为 NaN（整数列变为 float64），缺失的字符串为 ''
+    np = require('numpy')
+    if isinstance(parts, Nulls):
+        return np.full(parts.length, np.nan)
+    if isinstance(parts, Strings):
+        return np.array(parts.dictionary + [''], dtype=str)[parts.codes]
+    if parts.mask is None:
+        return parts.values
+    return np.where(parts.mask, np.nan, parts.values.astype(np.float64))
+
+def pandas_series(parts, name):
+    # 整列转为 pandas Series：字符串为 categorical，有缺失值的整数列为可空的 Int64
+    np = require('numpy')
+    pd = require('pandas')
+    if isinstance(parts, Nulls):
+        return pd.Series(np.full(parts.length, np.nan), name=name)
+    if isinstance(parts, Strings):
+        return pd.Series(pd.Categorical.from_codes(parts.codes, categories=parts.dictionary), name=name)
+    if parts.mask is None:
+        return pd.Series(parts.values, name=name, copy=False)
+    if parts.dtype == 'float64':
+        return pd.Series(np.where(parts.mask, np.nan, parts.values), name=name)
+    return pd.Series(pd.arrays.IntegerArray(parts.values, parts.mask.copy()), name=name)
+
+def arrow_array(parts, dictionary=True):
+    # 整列转为带 null 的 pyarrow 数组；字符串默认字典编码，dictionary 为 False 时解码
+    pa = require('pyarrow')
+    if isinstance(parts, Nulls):
+        return pa.nulls(parts.length)
+    if isinstance(parts, Strings):
+        strings = pa.DictionaryArray.from_arrays(pa.array(parts.codes, mask=parts.codes < 0),
+                                                 pa.array(parts.dictionary, type=pa.string()))
+        return strings if dictionary else strings.dictionary_decode()
+    return pa.array(parts.values, mask=parts.mask)
+
+class Table:
+    # 解码后的导出行，按列存储
+    def __init__(self, names, dtypes=None):
+        self.names = list(names)
+        self.dtypes = list(dtypes or [None] * len(self.names))
+        self.columns = [make_column(dtype) for dtype in self.dtypes]
+
+    def append(self, row):
+        for column, value in zip(self.columns, row):
+            column.append(value)
+
+    def extend(self, other):
+        # 追加列相同的另一个表格的行，例如从文件下一个范围解码出的行（chunked.py）
+        for column, more in zip(self.columns, other.columns):
+            column.extend(more)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns)
+
+    def parts(self):
+        return [column.parts() for column in self.columns]
+
+    def to_numpy(self):
+        # {列名: ndarray}；没有缺失值的数值列是表格缓冲区的视图
+        return {name: numpy_array(parts) for name, parts in zip(self.names, self.parts())}
+
+    def to_pandas(self):
+        pd = require('pandas')
+        return pd.DataFrame({name: pandas_series(parts, name) for name, parts in zip(self.names, self.parts())}, copy=False)
+
+    def to_arrow(self, dictionary=True):
+        pa = require('pyarrow')
+        return pa.table({name: arrow_array(parts, dictionary) for name, parts in zip(self.names, self.parts())})
@@ -0,0 +1,117 @@
+import os
+import stat
+import sys
+from collections import namedtuple
+
+import pytest
+
+# 脚本都在 xcperf/ 下按模块名互相导入，测试也一样
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synth  # noqa: E402
+
+# 替身 xcrun：export 把 FAKE_XCRUN_FIXTURE 复制到 --output（没有 --output 时写到 stdout），--toc 时复制 FAKE_XCRUN_TOC；
+# record 创建 --output 指定的 trace 目录，前 FAKE_XCRUN_RECORD_HANG 次忽略 SIGINT 一直不退出，
+# 接下来 FAKE_XCRUN_RECORD_FAIL 次退出码为 1，否则录制 FAKE_XCRUN_RECORD_SECONDS 秒后成功；
+# 设置了 FAKE_XCRUN_EXPORT_HANG 时写到 stdout 的导出写完后不退出。
+# 每次调用的开始、结束和收到的 SIGINT 按 "start|end|sigint pid 时间 参数" 追加到 FAKE_XCRUN_LOG
+FAKE_XCRUN = '''#!{python}
+import os, shutil, signal, sys, time
+args = sys.argv[1:]
+def log(event):
+    with open(os.environ['FAKE_XCRUN_LOG'], 'a') as f:
+        f.write(f'{{event}} {{os.getpid()}} {{time.time()}} {{" ".join(args)}}\\n')
+log('start')
+output = args[args.index('--output') + 1] if '--output' in args else None
+if args[1] == 'record':
+    with open(os.environ['FAKE_XCRUN_LOG']) as f:
+        attempt = sum(1 for line in f if line.split()[0] == 'start' and line.split()[4] == 'record')
+    hang = int(os.environ.get('FAKE_XCRUN_RECORD_HANG', 0))
+    if attempt <= hang:
+        signal.signal(signal.SIGINT, lambda *_: log('sigint'))
+        while True:
+            time.sleep(1)
+    if attempt <= hang + int(os.environ.get('FAKE_XCRUN_RECORD_FAIL', 0)):
+        log('end')
+        sys.exit(1)
+    time.sleep(float(os.environ.get('FAKE_XCRUN_RECORD_SECONDS', 0)))
+    os.makedirs(output)
+    with open(os.path.join(output, 'data'), 'w') as f:
+        f.write('recorded')
+elif '--toc' in args:
+    shutil.copy(os.environ['FAKE_XCRUN_TOC'], output)
+elif output:
+    shutil.copy(os.environ['FAKE_XCRUN_FIXTURE'], output)
+else:
+    with open(os.environ['FAKE_XCRUN_FIXTURE'], 'rb') as f:
+        shutil.copyfileobj(f, sys.stdout.buffer)
+    sys.stdout.flush()
+    while os.environ.get('FAKE_XCRUN_EXPORT_HANG'):
+        time.sleep(1)
+log('end')
+'''
+
+# 一次调用：参数、开始和结束时间（被强制结束时为 None）、是否收到过 SIGINT
+Call = namedtuple('Call', ['args', 'start', 'end', 'interrupted'])
+
+class FakeXcrun:
+    def __init__(self, directory, monkeypatch):
+        self.path = str(directory / 'xcrun')
+        self.log = str(directory / 'xcrun.log')
+        with open(self.path, 'w') as f:
+            f.write(FAKE_XCRUN.format(python=sys.executable))
+        os.chmod(self.path, os.stat(self.path).st_mode | stat.S_IEXEC)
+        open(self.log, 'w').close()
+        monkeypatch.setenv('FAKE_XCRUN_LOG', self.log)
+        self.monkeypatch = monkeypatch
+
+    def serve(self, fixture, toc=None, hang=False):
+        # 之后的 export 都返回 fixture，export --toc 返回 toc；hang 时写到 stdout 后不退出
+        self.monkeypatch.setenv('FAKE_XCRUN_FIXTURE', str(fixture))
+        if toc is not None:
+            self.monkeypatch.setenv('FAKE_XCRUN_TOC', str(toc))
+        if hang:
+            self.monkeypatch.setenv('FAKE_XCRUN_EXPORT_HANG', '1')
+
+    def record(self, seconds=0, hang=0, fail=0):
+        self.monkeypatch.setenv('FAKE_XCRUN_RECORD_SECONDS', str(seconds))
+        self.monkeypatch.setenv('FAKE_XCRUN_RECORD_HANG', str(hang))
+        self.monkeypatch.setenv('FAKE_XCRUN_RECORD_FAIL', str(fail))
+
+    def history(self):
+        # 按开始顺序的所有调用
+        calls = {}
+        with open(self.log) as f:
+            for line in f:
+                event, pid, when, *args = line.split()
+                if event == 'start':
+                    calls[pid] = Call(args, float(when), None, False)
+                elif event == 'end':
+                    calls[pid] = calls[pid]._replace(end=float(when))
+                else:
+                    calls[pid] = calls[pid]._replace(interrupted=True)
+        return list(calls.values())
+
+    def calls(self):
+        return [call.args for call in self.history()]
+
+@pytest.fixture
+def fake_xcrun(tmp_path, monkeypatch):
+    directory = tmp_path / 'bin'
+    directory.mkdir()
+    return FakeXcrun(directory, monkeypatch)
+
+@pytest.fixture(scope='session')
+def exports(tmp_path_factory):
+    # 按 (schema, rows) 生成的合成导出，整个测试会话共用，不能修改
+    directory = tmp_path_factory.mktemp('exports')
+    made = {}
+
+    def export(schema='sysmon-process', rows=500):
+        if (schema, rows) not in made:
+            path = directory / f'{rows}' / os.path.basename(synth.table_path('', synth.APP, schema))
+            path.parent.mkdir(exist_ok=True)
+            made[schema, rows] = synth.write_table(str(path), schema, rows=rows, processes=20)
+        return made[schema, rows]
+
+    return export
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import sys
+
+import pandas as pd
+import pytest
+
+import batch
+import synth
+from batch import discover, run_batch, up_to_date
+
+MIB = 1024 ** 2
+S = 1000 ** 3
+
+# (开始秒数, 进程, pid, % CPU, 内存 MiB)
+SYSMON = [
+    (0, 'App', 100, 10.0, 1),
+    (0, 'kernel_task', 0, 90.0, 50),
+    (1, 'App', 100, 30.0, 3),
+    (1, 'kernel_task', 0, 70.0, 50),
+]
+# (开始秒数, 时长秒数, FPS)
+SURFACES = [(0, 1, 60), (1, 1, 50), (2, 0.5, 30)]
+# (开始秒数, 时长秒数, 温度状态)
+THERMAL = [(0, 10, 'Nominal'), (10, 5, 'Fair'), (15, 5, 'Serious')]
+
+def node(schema, rows):
+    # 一个表格的 <node>；与 xctrace 一样重复的值写为 ref
+    interner = synth.Interner(random.Random(0), ref_density=1.0)
+    cells = []
+    for row in rows:
+        if schema == 'sysmon-process':
+            start, name, pid, cpu, memory = row
+            cells.append(''.join([
+                interner.cell('start-time', start * S, synth.format_time(start * S)),
+                interner.cell('duration', S, synth.format_duration(S)),
+                interner.process(name, pid),
+                interner.cell('system-cpu-percent', cpu, f'{cpu}%'),
+                interner.cell('duration-on-core', int(cpu * 10 ** 7), synth.format_duration(int(cpu * 10 ** 7))),
+                interner.cell('size-in-bytes', memory * MIB, synth.format_size(memory * MIB)),
+            ]))
+        else:
+            start, duration, value = row
+            cell = (interner.cell('count', value, str(value)) if schema == 'displayed-surfaces-per-second'
+                    else interner.cell('thermal-state', value.lower(), value))
+            cells.append(''.join([
+                interner.cell('start-time', int(start * S), synth.format_time(start * S)),
+                interner.cell('duration', int(duration * S), synth.format_duration(duration * S)),
+                cell,
+            ]))
+    columns = ''.join(f'<col><mnemonic>{mnemonic}</mnemonic><name>{name}</name><engineering-type>{engineering_type}</engineering-type></col>'
+                      for mnemonic, name, engineering_type in synth.SCHEMAS[schema][1])
+    body = ''.join(f'<row>{row}</row>\n' for row in cells)
+    return f'<node xpath=\'//trace-toc[1]/run[1]/data[1]/table[@schema="{schema}"]\'><schema name="{schema}">{columns}</schema>\n{body}</node>'
+
+def write_export(path, *nodes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('<?xml version="1.0"?>\n<trace-query-result>\n' + ''.join(nodes) + '</trace-query-result>\n')
+
+@pytest.fixture
+def nightly(tmp_path):
+    # App 在 rep1 下只有 sysmon-process；Game 的 CPU 和内存是 App 的两倍，Game Performance 的两个表格在一个合并导出的文件中
+    root = tmp_path / 'nightly'
+    write_export(root / 'rep1' / 'App-ActivityMonitor-sysmon-process.xml', node('sysmon-process', SYSMON))
+    game = [(start, 'Game' if name == 'App' else name, pid, cpu * 2, memory * 2) for start, name, pid, cpu, memory in SYSMON]
+    write_export(root / 'Game-ActivityMonitor-sysmon-process.xml', node('sysmon-process', game))
+    write_export(root / 'Game-GamePerformance-tables.xml',
+                 node('displayed-surfaces-per-second', SURFACES), node('device-thermal-state-intervals', THERMAL))
+    (root / 'notes.xml').write_text('<notes/>')
+    return root
+
+def test_discover(nightly):
+    tables = discover(str(nightly))
+    assert [(table.name, table.app, table.template, table.schema) for table in tables] == [
+        ('Game-ActivityMonitor-sysmon-process.xml', 'Game', 'ActivityMonitor', 'sysmon-process'),
+        ('Game-GamePerformance-tables.xml', 'Game', 'GamePerformance', 'tables'),
+        (os.path.join('rep1', 'App-ActivityMonitor-sysmon-process.xml'), 'App', 'ActivityMonitor', 'sysmon-process'),
+    ]
+
+def test_run_batch_hand_computed(nightly):
+    report = run_batch(str(nightly), workers=1)
+    assert list(report) == [str(nightly / 'Game'), str(nightly / 'rep1' / 'App')]
+    game, app = report.values()
+    # App 的两行：CPU 10、30，内存 1、3 MiB；kernel_task 不计
+    assert (app['cpu']['count'], app['cpu']['mean'], app['cpu']['max']) == (2, pytest.approx(20), pytest.approx(30))
+    assert app['memory']['mean'] == pytest.approx(2)
+    assert list(app) == ['cpu', 'memory']
+    assert game['cpu']['mean'] == pytest.approx(40) and game['memory']['max'] == pytest.approx(6)
+    # 不计最后一个不完整的区间
+    assert (game['fps']['count'], game['fps']['mean']) == (2, pytest.approx(55))
+    assert (game['thermal']['mean'], game['thermal']['max']) == (pytest.approx(1), pytest.approx(2))
+    assert (nightly / 'rep1' / 'App-ActivityMonitor-sysmon-process.csv').exists()
+    assert (nightly / 'Game-GamePerformance-device-thermal-state-intervals.csv').exists()
+
+def test_manifest_skips_converted_tables(nightly, capsys):
+    run_batch(str(nightly), workers=1)
+    with open(nightly / 'manifest.json') as f:
+        jobs = json.load(f)['jobs']
+    app = os.path.join('rep1', 'App-ActivityMonitor-sysmon-process.xml')
+    assert sorted(jobs) == ['Game-ActivityMonitor-sysmon-process.xml', 'Game-GamePerformance-tables.xml', app]
+    assert jobs['Game-GamePerformance-tables.xml']['outputs'] == [
+        str(nightly / f'Game-GamePerformance-{schema}.csv') for schema in ('displayed-surfaces-per-second', 'device-thermal-state-intervals')]
+    assert '转换了 3 个表格，14 行' in capsys.readouterr().err
+
+    # 再次运行不转换；换了格式、XML 内容改变或 --force 时重新转换
+    tables = {table.name: table for table in discover(str(nightly))}
+    manifest = batch.Manifest(str(nightly))
+    assert all(up_to_date(table, 'csv', manifest) for table in tables.values())
+    assert not up_to_date(tables[app], 'parquet', manifest)
+    report = run_batch(str(nightly), workers=1)
+    assert '转换了' not in capsys.readouterr().err
+    assert report[str(nightly / 'rep1' / 'App')]['cpu']['mean'] == pytest.approx(20)
+
+    changed = [(start, name, pid, cpu + 10, memory) for start, name, pid, cpu, memory in SYSMON]
+    write_export(nightly / app, node('sysmon-process', changed))
+    report = run_batch(str(nightly), workers=1)
+    assert '转换了 1 个表格，4 行' in capsys.readouterr().err
+    assert report[str(nightly / 'rep1' / 'App')]['cpu']['mean'] == pytest.approx(30)
+    run_batch(str(nightly), workers=1, force=True)
+    assert '转换了 3 个表格，14 行' in capsys.readouterr().err
+
+def test_failed_summary_is_reported(nightly, tmp_path, monkeypatch, capsys):
+    # 表格损坏时该应用记录错误，其他应用照常汇总，退出码为 1
+    broken = nightly / 'Broken-ActivityMonitor-sysmon-process.xml'
+    broken.write_text('<trace-query-result>')
+    (nightly / 'Broken-ActivityMonitor-sysmon-process.csv').write_text('Start,% CPU\n"\n')
+    os.utime(broken, (0, 0))
+    prefix = str(tmp_path / 'report')
+    monkeypatch.setattr(sys, 'argv', ['batch.py', str(nightly), '--jobs', '1', '--metrics', 'cpu', '--report', prefix])
+    with pytest.raises(SystemExit) as stopped:
+        batch.main()
+    assert stopped.value.code == 1
+    with open(prefix + '.json') as f:
+        report = json.load(f)
+    assert 'error' in report[str(nightly / 'Broken')]
+    assert report[str(nightly / 'Game')]['cpu']['mean'] == pytest.approx(40)
+    rows = pd.read_csv(prefix + '.csv')
+    assert sorted(rows['app'].unique()) == sorted(report)
+    assert rows.loc[rows['app'] == str(nightly / 'rep1' / 'App'), 'mean'].tolist() == pytest.approx([20])
+    assert f'汇总 {nightly / "Broken"} 失败，详见报告' in capsys.readouterr().err
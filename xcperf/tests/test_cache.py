@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from cache import TableCache
+from exporter import ExportJob, export_job, tables_job
+
+SCHEMA = 'sysmon-process'
+
+@pytest.fixture
+def trace(tmp_path):
+    # .trace 是目录，缓存的键取它的内容摘要
+    path = tmp_path / 'App-ActivityMonitor.trace'
+    path.mkdir()
+    (path / 'data').write_text('recording 1')
+    return str(path)
+
+@pytest.fixture
+def cache(tmp_path):
+    return TableCache(str(tmp_path / 'cache'))
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def exports_of(fake_xcrun):
+    return [args for args in fake_xcrun.calls() if args[1] == 'export']
+
+def run(job, fake_xcrun, cache, format='csv'):
+    return export_job(job, xcrun=fake_xcrun.path, retries=1, backoff=0, format=format, cache=cache)
+
+def test_hit_restores_under_new_output_name(exports, fake_xcrun, trace, cache, tmp_path):
+    fake_xcrun.serve(exports(SCHEMA, 300))
+    first = run(ExportJob(trace, SCHEMA, str(tmp_path / 'first-sysmon-process.xml')), fake_xcrun, cache)
+    assert first.ok and first.cached is None and first.rows == 300
+
+    os.mkdir(tmp_path / 'other')
+    job = ExportJob(trace, SCHEMA, str(tmp_path / 'other' / 'second-sysmon-process.xml'))
+    second = run(job, fake_xcrun, cache)
+    assert second.ok and second.cached == 'converted' and second.rows == 300
+    # 取回的文件按本次的输出名命名，内容与第一次转换的相同
+    assert read_bytes(tmp_path / 'other' / 'second-sysmon-process.csv') == read_bytes(tmp_path / 'first-sysmon-process.csv')
+    assert len(exports_of(fake_xcrun)) == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+def test_other_format_reuses_exported_xml(exports, fake_xcrun, trace, cache, tmp_path):
+    fake_xcrun.serve(exports(SCHEMA, 300))
+    run(ExportJob(trace, SCHEMA, str(tmp_path / 'a-sysmon-process.xml')), fake_xcrun, cache)
+    result = run(ExportJob(trace, SCHEMA, str(tmp_path / 'b-sysmon-process.xml')), fake_xcrun, cache, 'npy')
+    assert result.ok and result.cached == 'exported'
+    assert read_bytes(tmp_path / 'b-sysmon-process.xml') == read_bytes(tmp_path / 'a-sysmon-process.xml')
+    assert os.path.isdir(tmp_path / 'b-sysmon-process.columns')
+    assert len(exports_of(fake_xcrun)) == 1
+
+def test_changed_trace_misses(exports, fake_xcrun, trace, cache, tmp_path):
+    fake_xcrun.serve(exports(SCHEMA, 300))
+    job = ExportJob(trace, SCHEMA, str(tmp_path / 'App-sysmon-process.xml'))
+    run(job, fake_xcrun, cache)
+    with open(os.path.join(trace, 'data'), 'w') as f:
+        f.write('recording 2')
+    result = run(job, fake_xcrun, cache)
+    assert result.ok and result.cached is None
+    assert len(exports_of(fake_xcrun)) == 2
+    assert cache.stats()['misses'] == 2
+
+def test_other_run_misses(exports, fake_xcrun, trace, cache, tmp_path):
+    fake_xcrun.serve(exports(SCHEMA, 300))
+    run(ExportJob(trace, SCHEMA, str(tmp_path / 'run1-sysmon-process.xml')), fake_xcrun, cache)
+    result = run(ExportJob(trace, SCHEMA, str(tmp_path / 'run2-sysmon-process.xml'), 2), fake_xcrun, cache)
+    assert result.cached is None
+    assert len(exports_of(fake_xcrun)) == 2
+
+def test_combined_hit_restores_every_table(exports, fake_xcrun, trace, cache, tmp_path):
+    fake_xcrun.serve(exports(SCHEMA, 300))
+    run(tables_job(trace, [SCHEMA], str(tmp_path / 'first-')), fake_xcrun, cache)
+    result = run(tables_job(trace, [SCHEMA], str(tmp_path / 'second-')), fake_xcrun, cache)
+    assert result.cached == 'converted'
+    assert read_bytes(tmp_path / 'second-sysmon-process.csv') == read_bytes(tmp_path / 'first-sysmon-process.csv')
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = TableCache(str(tmp_path / 'cache'))
+    for name in 'abc':
+        path = tmp_path / name
+        path.write_bytes(b'x' * 100)
+        cache.put(name * 64, {'table.csv': str(path)})
+        os.utime(cache.entry(name * 64), (0, {'a': 1, 'b': 2, 'c': 3}[name]))
+    # 超出上限一个字节，只淘汰最久未使用的条目
+    assert cache.evict(sum(size for _, size, _ in cache.entries()) - 1) == 1
+    assert cache.get('a' * 64, {'table.csv': str(tmp_path / 'out.csv')}) is None
+    assert cache.get('c' * 64, {'table.csv': str(tmp_path / 'out.csv')}) is not None
@@ -0,0 +1,80 @@
+import os
+
+import pandas as pd
+import pytest
+
+import chunked
+import synth
+from writers import read_table
+from xml2csv import convert_table, process_filter, split_tables
+
+# 很小的范围，几百行的导出也会切成多段，跨范围的 ref 都要从前面的范围取值
+RANGE_BYTES = 4096
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def test_checkpoints_cover_every_row(exports):
+    xml_file = exports('sysmon-process', 2000)
+    table, = chunked.checkpoints(xml_file, RANGE_BYTES)
+    assert table.name == 'sysmon-process'
+    assert len(table.ranges) > 4
+    # 范围首尾相接，每个范围从 <row> 开始
+    data = read_bytes(xml_file)
+    for (_, end), (start, _) in zip(table.ranges, table.ranges[1:]):
+        assert end == start
+    assert all(data[start:start + 4] == b'<row' for start, _ in table.ranges)
+    assert data[table.ranges[0][0]:table.ranges[-1][1]].count(b'<row>') == 2000
+
+@pytest.mark.parametrize('schema', list(synth.SCHEMAS))
+def test_chunked_csv_matches_sequential(exports, tmp_path, schema):
+    xml_file = exports(schema, 2000)
+    tables = chunked.checkpoints(xml_file, RANGE_BYTES)
+    result = chunked.write_table(xml_file, tables, str(tmp_path / 'chunked.csv'), jobs=2)
+    sequential = convert_table(xml_file, str(tmp_path / 'sequential.csv'))
+    assert result == sequential
+    assert read_bytes(tmp_path / 'chunked.csv') == read_bytes(tmp_path / 'sequential.csv')
+    assert sorted(os.listdir(tmp_path)) == ['chunked.csv', 'sequential.csv']
+
+@pytest.mark.parametrize('format', ['npy', 'arrow'])
+def test_chunked_columnar_matches_sequential(exports, tmp_path, format):
+    xml_file = exports('sysmon-process', 2000)
+    tables = chunked.checkpoints(xml_file, RANGE_BYTES)
+    suffix = '.columns' if format == 'npy' else '.arrow'
+    chunked.write_table(xml_file, tables, str(tmp_path / f'chunked{suffix}'), format, jobs=2)
+    convert_table(xml_file, str(tmp_path / f'sequential{suffix}'), format)
+    pd.testing.assert_frame_equal(read_table(str(tmp_path / f'chunked{suffix}')),
+                                  read_table(str(tmp_path / f'sequential{suffix}')))
+
+def test_chunked_process_filter_matches_sequential(exports, tmp_path):
+    xml_file = exports('sysmon-process', 2000)
+    where = process_filter([synth.APP], ['110'])
+    tables = chunked.checkpoints(xml_file, RANGE_BYTES)
+    chunked.write_table(xml_file, tables, str(tmp_path / 'chunked.csv'), where=where, jobs=2)
+    convert_table(xml_file, str(tmp_path / 'sequential.csv'), where=where)
+    assert read_bytes(tmp_path / 'chunked.csv') == read_bytes(tmp_path / 'sequential.csv')
+
+def test_chunked_tables_match_split_tables(exports, tmp_path):
+    schemas = ['sysmon-process', 'core-animation-fps-estimate']
+    combined = tmp_path / 'combined.xml'
+    with open(combined, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<trace-query-result>\n')
+        for number, schema in enumerate(schemas):
+            text = read_bytes(exports(schema, 1000)).decode()
+            body = text[text.index('<node'):text.rindex('</trace-query-result>')]
+            f.write(body.replace('id="', f'id="{number}-').replace('ref="', f'ref="{number}-'))
+        f.write('</trace-query-result>\n')
+    tables = chunked.checkpoints(str(combined), RANGE_BYTES)
+    os.mkdir(tmp_path / 'chunked')
+    os.mkdir(tmp_path / 'sequential')
+    chunked_results = chunked.write_tables(str(combined), tables, str(tmp_path / 'chunked' / 'App-'), jobs=2)
+    sequential_results = split_tables(str(combined), str(tmp_path / 'sequential' / 'App-'))
+    assert [(schema, rows) for schema, _, rows in chunked_results] == \
+           [(schema, rows) for schema, _, rows in sequential_results]
+    for (_, chunked_output, _), (_, sequential_output, _) in zip(chunked_results, sequential_results):
+        assert read_bytes(chunked_output) == read_bytes(sequential_output)
+
+def test_small_files_are_not_split(exports):
+    assert chunked.split(exports('sysmon-process', 2000), jobs=4) is None
+    assert chunked.split(exports('sysmon-process', 2000), jobs=1) is None
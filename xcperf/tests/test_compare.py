@@ -0,0 +1,100 @@
+import json
+import math
+import sys
+
+import numpy as np
+import pytest
+
+from compare import bootstrap_ci, compare, compare_metric, load_side, main, mann_whitney
+
+def test_mann_whitney_separated_samples():
+    u, p = mann_whitney(np.array([1, 2, 3, 4, 5.]), np.array([6, 7, 8, 9, 10.]))
+    # U = 0，正态近似 z = -12.5 / sqrt(25 * 11 / 12)
+    assert u == 0
+    assert p == pytest.approx(math.erfc(12.5 / math.sqrt(25 * 11 / 12) / math.sqrt(2)))
+
+def test_mann_whitney_is_symmetric_with_ties():
+    x = np.array([1, 1, 2, 3, 3, 3.])
+    y = np.array([2, 3, 4, 4, 5.])
+    u_xy, p_xy = mann_whitney(x, y)
+    u_yx, p_yx = mann_whitney(y, x)
+    assert u_xy + u_yx == len(x) * len(y)
+    assert p_xy == pytest.approx(p_yx)
+    assert 0 < p_xy < 1
+
+def test_mann_whitney_identical_and_empty():
+    assert mann_whitney(np.full(5, 60.), np.full(5, 60.))[1] == 1.0
+    assert all(math.isnan(value) for value in mann_whitney(np.array([]), np.array([1.])))
+
+def test_bootstrap_ci_covers_shift_and_is_seeded():
+    rng = np.random.default_rng(1)
+    x = rng.normal(50, 2, 200)
+    y = x + 5
+    low, high = bootstrap_ci(x, y)
+    assert low < 5 < high
+    assert (low, high) == bootstrap_ci(x, y)
+
+def samples(mean, n=200, seed=0):
+    return np.random.default_rng(seed).normal(mean, 1, n)
+
+def test_fps_drop_is_regression():
+    result = compare_metric('fps', samples(60), samples(54, seed=1), threshold=5)
+    assert result['change_percent'] == pytest.approx(-10, abs=1)
+    assert result['p_value'] < 0.05
+    assert result['ci_high'] < 0
+    assert result['regression']
+
+def test_direction_of_better():
+    # CPU 越低越好，下降不是回归；上升是
+    assert not compare_metric('cpu', samples(60), samples(54, seed=1), threshold=5)['regression']
+    assert compare_metric('cpu', samples(54), samples(60, seed=1), threshold=5)['regression']
+
+def test_small_or_insignificant_change_is_not_regression():
+    # 显著但小于阈值
+    assert not compare_metric('fps', samples(60), samples(58, seed=1), threshold=5)['regression']
+    # 超过阈值但样本太少，不显著
+    result = compare_metric('fps', np.array([60., 40.]), np.array([42., 48.]), threshold=5)
+    assert result['change_percent'] < -5
+    assert result['p_value'] > 0.05
+    assert not result['regression']
+
+def test_summaries_compare_means_only(tmp_path):
+    baseline = {'fps': {'mean': 60.0, 'max': 61}, 'cpu': {'mean': 40.0, 'max': 90}}
+    candidate = {'fps': {'mean': 50.0, 'max': 60}, 'gpu': {'mean': 10.0, 'max': 20}}
+    (tmp_path / 'summary-App.json').write_text(json.dumps(baseline))
+    result = compare(load_side([str(tmp_path / 'summary-App.json')]), candidate, {'fps': 20})
+    # 只比较两边都有的指标；汇总没有样本，没有 p 值
+    assert list(result) == ['fps']
+    assert math.isnan(result['fps']['p_value'])
+    assert not result['fps']['testable'] and not result['fps']['worse']
+    assert not result['fps']['regression']
+
+def test_summaries_are_not_regressions_unless_asked():
+    # 汇总之间的比较无法检验显著性：变差超过阈值只标记为 worse，指定 summary_regressions 时才是回归
+    baseline = {'fps': {'mean': 60.0}, 'cpu': {'mean': 40.0}}
+    candidate = {'fps': {'mean': 50.0}, 'cpu': {'mean': 30.0}}
+    result = compare(baseline, candidate)
+    assert result['fps']['worse'] and not result['fps']['regression']
+    assert not result['cpu']['worse']
+    result = compare(baseline, candidate, summary_regressions=True)
+    assert result['fps']['regression'] and not result['cpu']['regression']
+    # 有样本时 summary_regressions 不起作用
+    assert not compare_metric('fps', np.array([60., 40.]), np.array([42., 48.]), 5, summary_regressions=True)['regression']
+
+def test_main_lists_summary_comparisons_separately(tmp_path, monkeypatch, capsys):
+    baseline, candidate, output = tmp_path / 'baseline.json', tmp_path / 'candidate.json', tmp_path / 'compare.json'
+    baseline.write_text(json.dumps({'fps': {'mean': 60.0}}))
+    candidate.write_text(json.dumps({'fps': {'mean': 50.0}}))
+    argv = ['compare.py', '--baseline', str(baseline), '--candidate', str(candidate), '--json', str(output)]
+    monkeypatch.setattr(sys, 'argv', argv)
+    main()
+    assert capsys.readouterr().out.splitlines() == ['只有汇总，未检验显著性:', '  fps: 60.00 -> 50.00 (-16.7%) worse']
+    assert json.loads(output.read_text())['fps']['worse']
+    monkeypatch.setattr(sys, 'argv', argv + ['--summary-regressions'])
+    with pytest.raises(SystemExit) as stopped:
+        main()
+    assert stopped.value.code == 1
+
+def test_summary_and_samples_do_not_mix():
+    with pytest.raises(ValueError):
+        compare({'fps': {'mean': 60.0}}, {'fps': samples(60)})
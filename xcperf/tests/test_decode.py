@@ -0,0 +1,87 @@
+import pytest
+
+from decode import (column_decoder, decode_int, decode_percent, decode_raw, decode_size, decode_string,
+                    decode_thermal_state, decode_time, parse_size, parse_time)
+from writers import read_table
+from xml2csv import Column, convert_table
+
+UINT64_MAX = 2 ** 64 - 1
+
+COUNTERS = f'''<?xml version="1.0"?>
+<trace-query-result>
+<node xpath='//trace-toc[1]/run[1]/data[1]/table[@schema="counters"]'><schema name="counters">
+<col><mnemonic>start</mnemonic><name>Start</name><engineering-type>start-time</engineering-type></col>
+<col><mnemonic>address</mnemonic><name>Address</name><engineering-type>uint64</engineering-type></col>
+<col><mnemonic>value</mnemonic><name>Value</name><engineering-type>counter</engineering-type></col>
+</schema>
+<row><start-time id="1" fmt="00:00.000.000">0</start-time><uint64 id="2" fmt="{UINT64_MAX}">{UINT64_MAX}</uint64><counter id="3" fmt="1">1</counter></row>
+<row><start-time id="4" fmt="00:01.000.000">1000000000</start-time><uint64 id="5" fmt="9,223,372,036,854,775,808">9223372036854775808</uint64><counter id="6" fmt="{UINT64_MAX}">{UINT64_MAX}</counter></row>
+<row><start-time id="7" fmt="00:02.000.000">2000000000</start-time><uint64 ref="2"/><counter ref="3"/></row>
+</node></trace-query-result>
+'''
+
+@pytest.mark.parametrize('fmt, expected', [
+    ('88.77 MiB', round(88.77 * 1024 ** 2)),
+    ('1.5 KB', 1500),
+    ('2 GiB', 2 * 1024 ** 3),
+    ('12 bytes', 12),
+    ('1,024 B', 1024),
+    ('n/a', None),
+])
+def test_parse_size(fmt, expected):
+    assert parse_size(fmt) == expected
+
+@pytest.mark.parametrize('fmt, expected', [
+    ('00:01.234.567', 1_234_567_000),
+    ('01:02:03.004', (3600 + 2 * 60 + 3) * 1000 ** 3 + 4 * 1000 ** 2),
+    ('1.23 ms', 1_230_000),
+    ('250 µs', 250_000),
+    ('2 min', 120 * 1000 ** 3),
+    ('3 parsecs', None),
+])
+def test_parse_time(fmt, expected):
+    assert parse_time(fmt) == expected
+
+def test_decoders_prefer_the_raw_text():
+    # 有原始值时不解析格式化文本
+    assert decode_time('1000', '00:05.000.000') == 1000
+    assert decode_time(None, '00:05.000.000') == 5 * 1000 ** 3
+    assert decode_size('93081108', '88.77 MiB') == 93081108
+    assert decode_int('12.0', None) == 12
+    assert decode_int(None, '1,234 fps') == 1234
+    assert decode_int(None, None) is None
+    assert decode_percent(None, '28.4%') == pytest.approx(28.4)
+    assert decode_thermal_state('2', 'Serious') == 2
+    assert decode_thermal_state(' Fair ', None) == 1
+    assert decode_thermal_state('unknown', None) is None
+    assert decode_string('x', 'App (100)') == 'App (100)'
+    assert decode_raw(None, '1.5') == '1.5'
+
+@pytest.mark.parametrize('engineering_type, mnemonic, dtype', [
+    ('start-time', 'start', 'int64'),
+    ('duration-on-core', 'cpu-total', 'int64'),
+    ('system-cpu-percent', 'cpu-percent', 'float64'),
+    ('size-in-bytes', 'memory-footprint', 'int64'),
+    ('thermal-state', 'thermal-state', 'int8'),
+    ('count', 'count', 'int64'),
+    ('uint32', 'cpu', 'int64'),
+    ('uint64', 'address', 'uint64'),
+    ('double', 'value', 'float64'),
+    ('process', 'process', 'str'),
+    ('counter', 'value', None),
+])
+def test_column_dtypes(engineering_type, mnemonic, dtype):
+    assert column_decoder(Column('Name', mnemonic, engineering_type))[0] == dtype
+
+@pytest.mark.parametrize('format, suffix', [('parquet', '.parquet'), ('arrow', '.arrow'), ('npy', '.columns')])
+def test_uint64_values_above_int64(tmp_path, format, suffix):
+    # uint64 列存为无符号整数；类型未知的列超出 int64 时按 float 读取
+    xml_file = tmp_path / 'counters.xml'
+    xml_file.write_text(COUNTERS)
+    output = str(tmp_path / f'counters{suffix}')
+    assert convert_table(str(xml_file), output, format)[2] == 3
+    df = read_table(output)
+    assert df['Address'].dtype == 'uint64'
+    assert list(df['Address']) == [UINT64_MAX, 2 ** 63, UINT64_MAX]
+    assert df['Value'].dtype == 'float64'
+    assert list(df['Value']) == [1, float(UINT64_MAX), 1]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from frames import frame_pacing, histogram, jank_windows, low_percent
+
+S = 1e9
+# 按时间顺序的 FPS 样本，第 6 个没有值；时长为秒
+FPS = [60, 48, 45, 60, 59, np.nan, 30, 60, 57, 60]
+SECONDS = [1, 1, 0.5, 1, 1, 1, 2, 1, 1, 1]
+
+def test_frame_pacing_hand_computed():
+    stats = frame_pacing(FPS, [s * S for s in SECONDS])
+    # 有值的 9 个样本排序后为 30 45 48 57 59 60 60 60 60，分位数按线性插值
+    assert stats['p1'] == pytest.approx(30 + 0.08 * 15)
+    assert stats['p5'] == pytest.approx(30 + 0.4 * 15)
+    assert stats['p50'] == 59
+    assert stats['p95'] == stats['p99'] == 60
+    assert stats['low_1pct'] == 30
+    # 48、45 连续低于 50 算一次卡顿，30 是第二次；卡顿时长 1 + 0.5 + 2 秒，总时长 9.5 秒
+    assert (stats['jank_windows'], stats['jank_count']) == (3, 2)
+    assert stats['jank_seconds'] == pytest.approx(3.5)
+    assert stats['jank_ratio'] == pytest.approx(3.5 / 9.5)
+    histogram = stats['histogram']
+    assert list(histogram)[0] == '0-5' and list(histogram)[-1] == '60-65'
+    assert {key: count for key, count in histogram.items() if count} == {'30-35': 1, '45-50': 2, '55-60': 2, '60-65': 4}
+
+def test_missing_durations_count_as_one_second():
+    stats = frame_pacing([40, 60, 30], [np.nan, 2 * S, 0.5 * S])
+    assert stats['jank_seconds'] == pytest.approx(1.5)
+    assert stats['jank_ratio'] == pytest.approx(1.5 / 3.5)
+    assert frame_pacing([40, 60, 30])['jank_seconds'] == 2
+
+def test_no_samples():
+    assert frame_pacing([]) == {}
+    assert frame_pacing([np.nan, np.nan]) == {}
+
+def test_low_percent_takes_at_least_one_sample():
+    fps = np.array([60.0] * 150 + [10, 20])
+    # 152 个样本的 1% 向上取整为 2 个
+    assert low_percent(fps) == 15
+    assert low_percent(fps, 10) == pytest.approx((10 + 20 + 60 * 14) / 16)
+    assert low_percent(np.array([42.0])) == 42
+
+def test_jank_windows_runs():
+    fps = np.array([30, 30, 60, 30, 60, 60, 30])
+    assert jank_windows(fps, np.full(7, S / 2), jank_fps=50) == (4, 3, 2.0)
+
+def test_histogram_bin_width():
+    assert histogram(np.array([0, 9.9, 10, 25]), bin_width=10) == {'0-10': 2, '10-20': 1, '20-30': 1}
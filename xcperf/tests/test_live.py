@@ -0,0 +1,83 @@
+import json
+import sys
+import time
+
+import numpy as np
+import pytest
+
+import live
+import synth
+from summarize import METRICS
+from writers import read_table
+
+SCHEMAS = ['sysmon-process', 'displayed-surfaces-per-second']
+WINDOW = 5
+
+def combine(exports, path):
+    # 一次导出多个表格：每个表格的 id 加上前缀，合并后在文档内仍然唯一
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<trace-query-result>\n')
+        for number, schema in enumerate(SCHEMAS):
+            with open(exports(schema, 300)) as table:
+                text = table.read()
+            body = text[text.index('<node'):text.rindex('</trace-query-result>')]
+            f.write(body.replace('id="', f'id="{number}-').replace('ref="', f'ref="{number}-'))
+        f.write('</trace-query-result>\n')
+    return str(path)
+
+def expected(series):
+    # 没有值的单元格不计入
+    values = list(series.dropna())
+    recent = values[-WINDOW:]
+    return {
+        'count': len(values), 'mean': np.mean(values), 'min': min(values), 'max': max(values), 'last': values[-1],
+        'window_mean': np.mean(recent), 'window_min': min(recent), 'window_max': max(recent),
+    }
+
+def test_stream_export_rolling_metrics_and_tables(exports, fake_xcrun, tmp_path):
+    fake_xcrun.serve(combine(exports, tmp_path / 'combined.xml'))
+    stats = live.LiveStats(synth.APP, ['cpu', 'memory', 'fps'], WINDOW)
+    results = live.stream_export('App.trace', SCHEMAS, stats, prefix=str(tmp_path / 'App-'), format='npy',
+                                 interval=0, xcrun=fake_xcrun.path)
+    assert [(schema, rows) for schema, _, rows in results] == [(schema, 300) for schema in SCHEMAS]
+    # 导出写到 stdout，不经过中间文件
+    call, = fake_xcrun.calls()
+    assert call[1] == 'export' and '--output' not in call and '--xpath' in call
+
+    processes, surfaces = (read_table(output) for _, output, _ in results)
+    ours = processes[processes['Process Name'].str.startswith(synth.APP)]
+    snapshot = stats.snapshot()
+    assert stats.rows == 600
+    assert snapshot['cpu'] == pytest.approx(expected(ours['% CPU']))
+    assert snapshot['memory'] == pytest.approx(expected(ours['Memory'] * METRICS['memory'].scale))
+    # 与 summarize.py 一样不计 FPS 表格的最后一行
+    assert snapshot['fps'] == pytest.approx(expected(surfaces['Count'][:-1]))
+
+def test_main_writes_json_snapshot(exports, fake_xcrun, tmp_path, monkeypatch):
+    fake_xcrun.serve(exports('sysmon-process', 300))
+    output = tmp_path / 'live.json'
+    monkeypatch.setattr(sys, 'argv', ['live.py', 'App.trace', 'sysmon-process', '--app', synth.APP, '--metrics', 'cpu',
+                                      '--interval', '0', '--json', str(output), '--xcrun', fake_xcrun.path])
+    live.main()
+    with open(output) as f:
+        snapshot = json.load(f)
+    assert list(snapshot) == ['cpu'] and snapshot['cpu']['count'] > 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['bin', 'live.json']
+
+def test_invalid_export_is_stopped(exports, fake_xcrun, tmp_path, monkeypatch):
+    # 导出写出无效的 XML 后不退出：关闭管道，等待 STOP_GRACE 后终止
+    # 解析器按块读取，无效的内容后面再补一块，让它不用等导出结束就能读到
+    monkeypatch.setattr(live, 'STOP_GRACE', 0.5)
+    with open(exports('sysmon-process', 300)) as f:
+        text = f.read()
+    invalid = tmp_path / 'invalid.xml'
+    invalid.write_text(text[:len(text) // 2] + '<row><</row>' + ' ' * 32 * 1024)
+    fake_xcrun.serve(invalid, hang=True)
+    stats = live.LiveStats(synth.APP, ['cpu'])
+    started = time.perf_counter()
+    with pytest.raises(RuntimeError, match='导出无效'):
+        live.stream_export('App.trace', ['sysmon-process'], stats, interval=0, xcrun=fake_xcrun.path)
+    assert time.perf_counter() - started < 10
+    call, = fake_xcrun.history()
+    assert call.end is None
+    assert 0 < stats.rows < 300
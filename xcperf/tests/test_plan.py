@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+import exporter
+import plan
+import synth
+from manifest import Manifest
+
+def plan_data(**overrides):
+    data = {
+        'apps': [synth.APP],
+        'devices': [{'udid': 'UDID1', 'name': 'iPhone'}],
+        'templates': [
+            {'name': 'Activity Monitor', 'tables': ['sysmon-process'], 'time_limit': '2s'},
+            {'name': 'Game Performance', 'tables': ['displayed-surfaces-per-second']},
+        ],
+        'metrics': ['cpu', 'memory'],
+    }
+    data.update(overrides)
+    return data
+
+def test_jobs_follow_their_dependencies(tmp_path):
+    jobs = plan.compile_plan(plan.parse_plan(plan_data(repetitions=2), str(tmp_path)))
+    order = list(jobs)
+    for position, job in enumerate(jobs.values()):
+        assert all(order.index(dep) < position for dep in job.deps)
+    assert [name for name in order if name.startswith('summarize')] == \
+           ['summarize iPhone/rep1/SynthApp', 'summarize iPhone/rep2/SynthApp']
+    label = 'iPhone/rep1/SynthApp/ActivityMonitor'
+    assert jobs[f'export {label}'].deps == [f'record {label}']
+    assert jobs[f'convert {label}'].deps == [f'export {label}']
+    assert set(jobs['summarize iPhone/rep1/SynthApp'].deps) == {
+        'convert iPhone/rep1/SynthApp/ActivityMonitor', 'convert iPhone/rep1/SynthApp/GamePerformance'}
+    # 同一设备的录制共用一个资源，依次运行
+    assert {job.resource for job in jobs.values() if job.kind == 'record'} == {'UDID1'}
+    assert jobs[f'convert {label}'].outputs == [
+        os.path.join(str(tmp_path), 'results', 'iPhone', 'rep1', 'SynthApp-ActivityMonitor-sysmon-process.csv')]
+
+def test_invalid_plans(tmp_path):
+    with pytest.raises(ValueError):
+        plan.parse_plan(plan_data(apps=[]))
+    with pytest.raises(ValueError):
+        plan.parse_plan(plan_data(metrics=['nothing']))
+    with pytest.raises(ValueError):
+        plan.parse_plan(plan_data(templates=[{'name': 'Activity Monitor', 'time_limit': '10 seconds'}]))
+
+def test_parse_duration():
+    assert plan.parse_duration('10s') == 10
+    assert plan.parse_duration('500ms') == 0.5
+    assert plan.parse_duration('1m30s') == 90
+    assert plan.parse_duration('5') == 5
+
+def fake_job(directory, name, deps, log, fail=False):
+    # 输出为 directory/name，输入为依赖的输出
+    output = str(directory / name)
+
+    def action():
+        log.append(name)
+        if fail:
+            raise RuntimeError(f'{name} 失败')
+        with open(output, 'w') as f:
+            f.write(name)
+
+    return plan.Job(name, 'test', [str(directory / dep) for dep in deps], [output], deps, action, None, '')
+
+def test_run_jobs_in_order_and_skip_dependents(tmp_path):
+    log = []
+    jobs = {job.name: job for job in [
+        fake_job(tmp_path, 'a', [], log),
+        fake_job(tmp_path, 'b', ['a'], log, fail=True),
+        fake_job(tmp_path, 'c', ['a'], log),
+        fake_job(tmp_path, 'd', ['b', 'c'], log),
+        fake_job(tmp_path, 'e', ['c'], log),
+    ]}
+    status = plan.run_jobs(jobs, Manifest(str(tmp_path)), workers=2)
+    assert status == {'a': 'ok', 'b': 'failed', 'c': 'ok', 'd': 'skipped', 'e': 'ok'}
+    assert log[0] == 'a' and 'd' not in log
+    assert log.index('c') < log.index('e')
+    # 重新运行时只运行失败的任务和依赖它的任务
+    log.clear()
+    status = plan.run_jobs(jobs, Manifest(str(tmp_path)), workers=2)
+    assert sorted(name for name, state in status.items() if state == 'up-to-date') == ['a', 'c', 'e']
+    assert log == ['b']
+
+def test_plan_runs_end_to_end_and_resumes(exports, fake_xcrun, tmp_path, monkeypatch):
+    monkeypatch.setattr(plan, 'XCRUN', fake_xcrun.path)
+    monkeypatch.setattr(exporter, 'XCRUN', fake_xcrun.path)
+    fake_xcrun.serve(exports('sysmon-process', 300))
+    data = plan_data(templates=[{'name': 'Activity Monitor', 'tables': ['sysmon-process'], 'time_limit': '1s'}])
+    parsed = plan.parse_plan(data, str(tmp_path))
+    jobs = plan.compile_plan(parsed)
+
+    status = plan.run_jobs(jobs, Manifest(parsed.output), workers=2)
+    assert set(status.values()) == {'ok'}
+    assert [args[1] for args in fake_xcrun.calls()] == ['record', 'export']
+    directory = os.path.join(parsed.output, 'iPhone', 'rep1')
+    assert os.path.isdir(os.path.join(directory, 'SynthApp-ActivityMonitor.trace'))
+    with open(os.path.join(directory, 'summary-SynthApp.json')) as f:
+        assert set(json.load(f)) == {'cpu', 'memory'}
+    # 临时文件都已改名或删除
+    assert not [name for name in os.listdir(directory) if '.partial-' in name]
+
+    status = plan.run_jobs(jobs, Manifest(parsed.output), workers=2)
+    assert set(status.values()) == {'up-to-date'}
+    assert len(fake_xcrun.calls()) == 2
+
+    # 转换结果被删除时只重新运行转换
+    os.remove(os.path.join(directory, 'SynthApp-ActivityMonitor-sysmon-process.csv'))
+    status = plan.run_jobs(jobs, Manifest(parsed.output), workers=2)
+    assert [name for name, state in status.items() if state == 'ok'] == ['convert iPhone/rep1/SynthApp/ActivityMonitor']
+    # 重新转换的结果与之前相同，汇总不用重新运行
+    assert status['summarize iPhone/rep1/SynthApp'] == 'up-to-date'
+    assert len(fake_xcrun.calls()) == 2
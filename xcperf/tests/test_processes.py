@@ -0,0 +1,88 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import processes
+from processes import group_max, group_slope, process_breakdown, process_report
+
+def sysmon_csv():
+    # App：12 个一秒的样本，% CPU 交替为 10、30，内存每秒增长 0.5 MiB（30 MiB/分钟）
+    # kernel_task：12 个 50% 的样本和一个没有 % CPU 的样本，内存不变
+    # AppHelper：两个 500 ms 的 100% 样本，没有内存
+    lines = ['Start,Duration,Process Name,% CPU,Memory']
+    for second in range(12):
+        start = f'00:{second:02d}.000.000'
+        lines.append(f'{start},1.00 s,App (100),{10 if second % 2 == 0 else 30}.0%,{100 + second / 2:.2f} MiB')
+        lines.append(f'{start},1.00 s,kernel_task (0),50.0%,50.00 MiB')
+    lines.append('00:12.000.000,1.00 s,kernel_task (0),,50.00 MiB')
+    lines.append('00:00.000.000,500.00 ms,AppHelper (101),100.0%,')
+    lines.append('00:00.500.000,500.00 ms,AppHelper (101),100.0%,')
+    return '\n'.join(lines) + '\n'
+
+@pytest.fixture
+def breakdown(tmp_path):
+    path = tmp_path / 'sysmon.csv'
+    path.write_text(sysmon_csv())
+    return process_breakdown(pd.read_csv(path), 'App')
+
+def test_process_breakdown_hand_computed(breakdown):
+    # 按 CPU 时间排列：kernel_task 12 × 0.5 s，App 12 × 0.2 s，AppHelper 2 × 0.5 s
+    assert list(breakdown['process']) == ['kernel_task (0)', 'App (100)', 'AppHelper (101)']
+    assert list(breakdown['name']) == ['kernel_task', 'App', 'AppHelper']
+    assert list(breakdown['pid']) == [0, 100, 101]
+    assert list(breakdown['app']) == [False, True, True]
+    assert list(breakdown['samples']) == [13, 12, 2]
+    np.testing.assert_allclose(breakdown['cpu_mean'], [50, 20, 100])
+    np.testing.assert_allclose(breakdown['cpu_max'], [50, 30, 100])
+    np.testing.assert_allclose(breakdown['cpu_seconds'], [6, 2.4, 1])
+    np.testing.assert_allclose(breakdown['cpu_share'], [6 / 9.4, 2.4 / 9.4, 1 / 9.4])
+    np.testing.assert_allclose(breakdown['memory_mean_mib'], [50, 100 + 5.5 / 2, np.nan])
+    np.testing.assert_allclose(breakdown['memory_max_mib'], [50, 105.5, np.nan])
+    # AppHelper 不足 10 个内存样本，没有斜率
+    np.testing.assert_allclose(breakdown['memory_slope_mib_per_min'], [0, 30, np.nan], atol=1e-9)
+    assert list(breakdown['leak']) == [False, True, False]
+
+def test_process_report(breakdown):
+    report = process_report(breakdown, 'App', top=2)
+    assert report['processes'] == 3
+    assert report['device_cpu_seconds'] == pytest.approx(9.4)
+    assert report['app_cpu_seconds'] == pytest.approx(3.4)
+    assert (report['app_cpu_share'], report['daemon_cpu_share']) == (pytest.approx(3.4 / 9.4), pytest.approx(6 / 9.4))
+    assert [row['process'] for row in report['top']] == ['kernel_task (0)', 'App (100)']
+    assert [row['process'] for row in report['app_processes']] == ['App (100)', 'AppHelper (101)']
+    assert [row['process'] for row in report['leaks']] == ['App (100)']
+    # 缺失的值在 JSON 中为 null
+    assert report['app_processes'][1]['memory_mean_mib'] is None
+
+def test_group_max_and_slope():
+    codes = np.array([2, 0, 2, 0, 2])
+    values = np.array([1, np.nan, 5, 3, np.nan])
+    np.testing.assert_array_equal(group_max(codes, values, 4), [3, np.nan, 5, np.nan])
+    assert group_max(codes[:0], values[:0], 0).size == 0
+    # 组 0：y = 2x + 1；组 1：x 相同，没有斜率；组 2：点数不够
+    codes = np.array([0, 0, 0, 1, 1, 2])
+    x = np.array([0, 1, 2, 5, 5, 0], dtype=np.float64)
+    y = np.array([1, 3, 5, 1, 2, 0], dtype=np.float64)
+    np.testing.assert_allclose(group_slope(codes, x, y, 3, min_samples=2), [2, np.nan, np.nan])
+    np.testing.assert_allclose(group_slope(codes, x, y, 3), [np.nan] * 3)
+
+def test_main_writes_report_and_table(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'App-ActivityMonitor-sysmon-process.csv').write_text(sysmon_csv())
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['processes.py', 'App', '--top', '1', '--csv', 'processes.parquet'])
+    processes.main()
+    out = capsys.readouterr().out
+    assert 'App CPU share=36.2% Daemons=63.8%' in out and 'Possible leak: App (100) memory +30.00 MiB/min' in out
+    with open(tmp_path / 'processes-App.json') as f:
+        assert [row['process'] for row in json.load(f)['top']] == ['kernel_task (0)']
+    assert list(pd.read_parquet(tmp_path / 'processes.parquet')['samples']) == [13, 12, 2]
+
+def test_main_without_table(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['processes.py', 'App'])
+    with pytest.raises(SystemExit) as stopped:
+        processes.main()
+    assert stopped.value.code == 1
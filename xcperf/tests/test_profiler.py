@@ -0,0 +1,53 @@
+import cProfile
+import os
+import threading
+
+import pytest
+
+from profiler import PROFILE_DIR_ENV, PROFILE_ENV, Profiler
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV, 'cprofile')
+    monkeypatch.setenv(PROFILE_DIR_ENV, str(tmp_path))
+    return Profiler()
+
+def test_only_the_outer_span_is_profiled(profiler, tmp_path):
+    with profiler.span('outer') as outer:
+        with profiler.span('inner') as inner:
+            pass
+    assert 'profile' not in inner and os.path.exists(outer['profile'])
+    assert os.listdir(tmp_path) == [os.path.basename(outer['profile'])]
+    assert not profiler.profiling
+
+def test_spans_started_while_the_profile_is_written_are_not_profiled(profiler, monkeypatch):
+    # 另一个线程在 dump_stats 期间开始的 span 不能再启用一个 cProfile
+    during = []
+    dump_stats = cProfile.Profile.dump_stats
+
+    def slow_dump(profile, path):
+        def other():
+            with profiler.span('other') as args:
+                during.append(args)
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+        dump_stats(profile, path)
+
+    monkeypatch.setattr(cProfile.Profile, 'dump_stats', slow_dump)
+    with profiler.span('first'):
+        pass
+    assert during == [{}]
+    with profiler.span('second') as args:
+        pass
+    assert 'profile' in args
+
+def test_failed_dump_still_stops_profiling(profiler, monkeypatch):
+    def failing_dump(profile, path):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(cProfile.Profile, 'dump_stats', failing_dump)
+    with pytest.raises(OSError):
+        with profiler.span('first'):
+            pass
+    assert not profiler.profiling
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+import store
+import synth
+from summarize import summarize
+from xml2csv import convert_table
+
+@pytest.fixture
+def db(tmp_path):
+    return store.connect(str(tmp_path / 'results.db'))
+
+@pytest.fixture
+def nightly(tmp_path):
+    # 两次重复，每次两个模板：Activity Monitor 只有导出的 XML，Game Performance 已经转换为 CSV
+    root = tmp_path / 'nightly'
+    for rep in (1, 2):
+        directory = root / f'rep{rep}'
+        directory.mkdir(parents=True)
+        synth.write_table(synth.table_path(str(directory), synth.APP, 'sysmon-process'), 'sysmon-process',
+                          rows=400, processes=20, seed=rep)
+        xml_file = synth.write_table(synth.table_path(str(tmp_path), synth.APP, 'displayed-surfaces-per-second'),
+                                     'displayed-surfaces-per-second', rows=120, seed=rep)
+        convert_table(xml_file, os.path.join(directory, os.path.basename(xml_file)[:-len('.xml')] + '.csv'))
+    return str(root)
+
+def test_bulk_ingest_and_trend_by_template(db, nightly):
+    run_ids = store.ingest(db, nightly, udid='UDID1', revision='abc123')
+    assert len(run_ids) == 2
+    # 每个运行的每个模板一行
+    assert [templates for _, _, _, templates, *_ in store.list_runs(db)] == ['ActivityMonitor,GamePerformance'] * 2
+    reports = [summarize(synth.APP, os.path.join(nightly, f'rep{rep}')) for rep in (1, 2)]
+    for template, metric in [('GamePerformance', 'fps'), ('ActivityMonitor', 'cpu'), (None, 'memory')]:
+        rows = store.trend(db, synth.APP, metric, 'mean', udid='UDID1', template=template)
+        assert sorted(value for *_, value in rows) == pytest.approx(sorted(report[metric]['mean'] for report in reports))
+        assert {(revision, udid) for _, revision, udid, _ in rows} == {('abc123', 'UDID1')}
+    assert store.trend(db, synth.APP, 'fps', template='MetalSystemTrace') == []
+    assert store.trend(db, synth.APP, 'fps', udid='UDID2') == []
+    # XML 先转换为 CSV；逐样本的值与汇总的样本数相同
+    assert os.path.exists(os.path.join(nightly, 'rep1', f'{synth.APP}-ActivityMonitor-sysmon-process.csv'))
+    times, values = store.run_samples(db, run_ids[0], 'fps')
+    assert len(values) == reports[0]['fps']['count'] and (times[1:] >= times[:-1]).all()
+
+def test_trend_keeps_the_latest_runs_in_time_order(db):
+    for timestamp, value, templates in [(3, 30.0, ['GamePerformance']), (1, 10.0, ['GamePerformance']),
+                                        (2, 20.0, ['ActivityMonitor', 'GamePerformance']), (4, 40.0, ['ActivityMonitor'])]:
+        store.add_run(db, synth.APP, {'fps': {'mean': value}}, templates=templates, timestamp=timestamp)
+    assert [value for *_, value in store.trend(db, synth.APP, 'fps', limit=3)] == [20.0, 30.0, 40.0]
+    assert [value for *_, value in store.trend(db, synth.APP, 'fps', template='GamePerformance', limit=2)] == [20.0, 30.0]
+    assert [value for *_, value in store.trend(db, synth.APP, 'fps', template='ActivityMonitor')] == [20.0, 40.0]
@@ -0,0 +1,101 @@
+import argparse
+import sys
+
+import pytest
+
+import batch
+import compare
+import live
+import store
+import summarize
+import timeline
+
+SYSMON = '''Start,Duration,Process Name,% CPU,CPU Time,Memory
+00:00.000.000,1.00 s,App (100),10.0%,100.00 ms,100.00 MiB
+00:00.000.000,1.00 s,kernel_task (0),50.0%,500.00 ms,1.00 MiB
+00:01.000.000,1.00 s,App (100),20.0%,200.00 ms,110.00 MiB
+00:02.000.000,1.00 s,App (100),30.0%,300.00 ms,120.00 MiB
+'''
+
+SURFACES = '''Start,Duration,Count
+00:00.000.000,1.00 s,60
+00:01.000.000,1.00 s,58
+00:02.000.000,0.50 s,30
+'''
+
+@pytest.fixture
+def tables(tmp_path):
+    (tmp_path / 'App-ActivityMonitor-sysmon-process.csv').write_text(SYSMON)
+    (tmp_path / 'App-GamePerformance-displayed-surfaces-per-second.csv').write_text(SURFACES)
+    return str(tmp_path)
+
+@pytest.fixture
+def registry(monkeypatch):
+    # register 修改全局注册表，测试结束后恢复
+    monkeypatch.setattr(summarize, 'METRICS', dict(summarize.METRICS))
+    return summarize.METRICS
+
+def test_per_metric_outputs(tables):
+    report = summarize.summarize('App', tables, ['cpu', 'memory', 'fps'])
+    # CPU 和内存只统计 App 的行，内存换算为 MiB
+    assert report['cpu']['count'] == 3
+    assert (report['cpu']['mean'], report['cpu']['min'], report['cpu']['max']) == pytest.approx((20, 10, 30))
+    assert (report['memory']['mean'], report['memory']['max']) == pytest.approx((110, 120))
+    # FPS 不计最后一个不完整的区间
+    assert report['fps']['count'] == 2
+    assert (report['fps']['mean'], report['fps']['min'], report['fps']['max']) == pytest.approx((59, 58, 60))
+    assert report['fps']['table'].endswith('App-GamePerformance-displayed-surfaces-per-second.csv')
+
+def test_missing_tables_are_skipped(tables):
+    report = summarize.summarize('App', tables, ['cpu', 'gpu', 'thermal'])
+    assert list(report) == ['cpu']
+
+def test_metric_samples(tables):
+    samples = summarize.metric_samples('App', tables, ['cpu', 'fps'])
+    assert list(samples['cpu']) == pytest.approx([10, 20, 30])
+    assert list(samples['fps']) == pytest.approx([60, 58])
+
+def test_registered_metric(tables, registry):
+    # --metric name=table:column[:kind] 注册的指标与内置的一样汇总
+    metric = summarize.parse_metric('cpu-time=ActivityMonitor-sysmon-process:CPU Time:time')
+    assert registry['cpu-time'] is metric and metric.kind == 'time'
+    report = summarize.summarize('App', tables, ['cpu-time'])
+    assert report['cpu-time']['mean'] == pytest.approx((100 + 500 + 200 + 300) / 4 * 1e6)
+    # 同名的指标替换原来的
+    summarize.register('cpu', '% CPU', 'ActivityMonitor-sysmon-process', '% CPU', kind='percent')
+    assert summarize.summarize('App', tables, ['cpu'])['cpu']['max'] == pytest.approx(50)
+
+def test_unknown_metric_lists_the_known_ones():
+    with pytest.raises(ValueError, match='未知的指标 nope，可选 cpu, memory, fps'):
+        summarize.selected_metrics(['cpu', 'nope'])
+    with pytest.raises(ValueError, match='nope'):
+        summarize.summarize('App', '.', ['nope'])
+    with pytest.raises(argparse.ArgumentTypeError, match='可选'):
+        summarize.parse_metrics('fps,nope')
+    assert summarize.parse_metrics('fps,cpu') == ['fps', 'cpu']
+    assert [metric.name for metric in summarize.selected_metrics()] == list(summarize.METRICS)
+
+@pytest.mark.parametrize('module, argv', [
+    (summarize, ['App']),
+    (batch, ['nightly']),
+    (timeline, ['App']),
+    (compare, ['--baseline', 'a', '--candidate', 'b']),
+    (store, ['ingest', 'nightly']),
+    (live, ['-', '--app', 'App']),
+])
+def test_command_line_rejects_unknown_metrics(module, argv, monkeypatch, capsys, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    if module is store:
+        argv = ['--db', str(tmp_path / 'results.db')] + argv
+    monkeypatch.setattr(sys, 'argv', [f'{module.__name__}.py'] + argv + ['--metrics', 'cpu,nope'])
+    with pytest.raises(SystemExit) as stopped:
+        module.main()
+    assert stopped.value.code == 2
+    assert '未知的指标 nope，可选 cpu' in capsys.readouterr().err
+
+def test_command_line_accepts_metrics_defined_with_metric(tables, registry, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['summarize.py', 'App', '--dir', tables, '--no-rows',
+                                      '--metrics', 'cpu,cpu-time', '--metric', 'cpu-time=ActivityMonitor-sysmon-process:CPU Time:time'])
+    summarize.main()
+    assert (tmp_path / 'summary-App.json').exists()
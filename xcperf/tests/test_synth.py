@@ -0,0 +1,32 @@
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import synth
+
+@pytest.mark.parametrize('schema', list(synth.SCHEMAS))
+def test_table_has_schema_columns_and_rows(exports, schema):
+    root = ET.parse(exports(schema, 300)).getroot()
+    assert root.find('.//schema').get('name') == schema
+    assert [col.find('name').text for col in root.iter('col')] == [name for _, name, _ in synth.SCHEMAS[schema][1]]
+    rows = root.findall('.//row')
+    assert len(rows) == 300
+    assert all(len(row) == len(synth.SCHEMAS[schema][1]) for row in rows)
+
+def test_refs_point_to_earlier_ids(exports):
+    # 与 xctrace export 一样，ref 只引用前面出现过的 id
+    seen = set()
+    refs = 0
+    for element in ET.parse(exports('sysmon-process', 300)).getroot().iter():
+        if 'ref' in element.attrib:
+            assert element.get('ref') in seen
+            refs += 1
+        if 'id' in element.attrib:
+            seen.add(element.get('id'))
+    assert refs > 0
+
+def test_same_seed_same_export(tmp_path):
+    paths = [synth.write_table(str(tmp_path / f'{name}.xml'), 'sysmon-process', rows=100, seed=seed)
+             for name, seed in [('a', 1), ('b', 1), ('c', 2)]]
+    a, b, c = (open(path, 'rb').read() for path in paths)
+    assert a == b != c
@@ -0,0 +1,115 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from table import DictColumn, InferredColumn, Numeric, NumericColumn, Nulls, Strings, Table, make_column
+
+def dict_column(values, column_class=DictColumn):
+    column = column_class()
+    for value in values:
+        column.append(value)
+    return column
+
+def decoded(column):
+    strings = column.parts()
+    return [None if code < 0 else strings.dictionary[code] for code in strings.codes]
+
+def test_dict_column_extend_remaps_disjoint_dictionaries():
+    ours = dict_column(['a', 'b', None, 'a'])
+    theirs = dict_column(['c', None, 'd', 'c', 'b'])
+    ours.extend(theirs)
+    # other 的编码映射到本列：已有的 b 用原来的编码，c、d 按出现顺序追加
+    assert ours.dictionary == ['a', 'b', 'c', 'd']
+    assert list(ours.parts().codes) == [0, 1, -1, 0, 2, -1, 3, 2, 1]
+    assert decoded(ours) == ['a', 'b', None, 'a', 'c', None, 'd', 'c', 'b']
+    # 追加后的值仍然复用同一个编码
+    ours.append('d')
+    assert list(ours.parts().codes)[-1] == 3 and ours.dictionary == ['a', 'b', 'c', 'd']
+    assert theirs.dictionary == ['c', 'd', 'b']
+
+def test_dict_column_extend_into_empty_and_after_pickle():
+    # 子进程解码的列经过 pickle 传回，字典的下标需要重建
+    theirs = pickle.loads(pickle.dumps(dict_column(['x', 'y', 'x'])))
+    assert theirs.index == {'x': 0, 'y': 1}
+    ours = DictColumn()
+    ours.extend(theirs)
+    ours.extend(dict_column(['y', 'z']))
+    assert decoded(ours) == ['x', 'y', 'x', 'y', 'z']
+    assert ours.dictionary == ['x', 'y', 'z']
+
+def test_mask_added_midway_through_extend():
+    ours = NumericColumn('int64')
+    ours.extend(NumericColumn('int64'))
+    for value in (1, 2):
+        ours.append(value)
+    assert ours.mask is None
+    theirs = NumericColumn('int64')
+    for value in (3, None, 5):
+        theirs.append(value)
+    # 本列还没有掩码：先为已有的 2 行补上，再接上 other 的掩码
+    ours.extend(theirs)
+    more = NumericColumn('int64')
+    more.append(6)
+    # other 没有掩码时补 0
+    ours.extend(more)
+    ours.append(None)
+    parts = ours.parts()
+    assert list(parts.values) == [1, 2, 3, 0, 5, 6, 0]
+    assert list(parts.mask) == [False, False, False, True, False, False, True]
+    assert len(ours) == len(ours.mask) == 7
+
+def test_extend_without_missing_values_keeps_no_mask():
+    ours = NumericColumn('float64')
+    ours.append(1.5)
+    theirs = NumericColumn('float64')
+    theirs.append(2.5)
+    ours.extend(theirs)
+    parts = ours.parts()
+    assert ours.mask is None and parts.mask is None
+    assert parts.dtype == 'float64' and list(parts.values) == [1.5, 2.5]
+
+@pytest.mark.parametrize('values, dtype, expected', [
+    (['1', '2', None, '2'], 'int64', [1, 2, 0, 2]),
+    (['1', '2.5', None, '1'], 'float64', [1, 2.5, 0, 1]),
+    (['1', '1e3', '-4'], 'float64', [1, 1000, -4]),
+    ([str(2 ** 63), '1'], 'float64', [2.0 ** 63, 1]),
+])
+def test_inferred_column_numbers(values, dtype, expected):
+    parts = dict_column(values, InferredColumn).parts()
+    assert isinstance(parts, Numeric) and parts.dtype == dtype
+    assert list(parts.values) == pytest.approx(expected)
+    missing = [value is None for value in values]
+    assert (parts.mask is None and not any(missing)) or list(parts.mask) == missing
+
+def test_inferred_column_falls_back_to_strings():
+    parts = dict_column(['1', '2.5', 'N/A', None], InferredColumn).parts()
+    assert isinstance(parts, Strings)
+    assert parts.dictionary == ['1', '2.5', 'N/A'] and list(parts.codes) == [0, 1, 2, -1]
+
+def test_inferred_column_only_missing_values():
+    assert dict_column([None, None], InferredColumn).parts() == Nulls(2)
+
+def test_make_column():
+    assert isinstance(make_column('int8'), NumericColumn)
+    assert isinstance(make_column('uint64'), NumericColumn)
+    assert type(make_column('str')) is DictColumn
+    assert type(make_column(None)) is InferredColumn
+
+def test_table_conversions():
+    table = Table(['pid', 'name', 'cpu', 'extra'], ['int64', 'str', 'float64', None])
+    for row in [(1, 'a', 1.5, None), (None, 'b', None, None), (3, None, 2.5, None)]:
+        table.append(row)
+    assert len(table) == 3
+    arrays = table.to_numpy()
+    assert np.isnan(arrays['pid'][1]) and list(arrays['name']) == ['a', 'b', '']
+    assert np.isnan(arrays['extra']).all()
+    df = table.to_pandas()
+    assert str(df['pid'].dtype) == 'Int64' and df['pid'].isna().tolist() == [False, True, False]
+    assert isinstance(df['name'].dtype, pd.CategoricalDtype) and df['name'].isna().tolist() == [False, False, True]
+    assert df['cpu'].isna().tolist() == [False, True, False]
+    arrow = table.to_arrow(dictionary=False)
+    assert arrow.column('pid').to_pylist() == [1, None, 3]
+    assert arrow.column('name').to_pylist() == ['a', 'b', None]
+    assert arrow.column('extra').null_count == 3
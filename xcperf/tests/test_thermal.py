@@ -0,0 +1,91 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import thermal
+from thermal import state_changes, thermal_report, throttling, time_in_state
+
+# 40 秒：Nominal 0-10、Fair 10-15、Serious 15-25、Fair 25-30、Nominal 30-40；状态未知的区间不计
+THERMAL = '''Start,Duration,Thermal State
+00:10.000.000,5.00 s,Fair
+00:00.000.000,10.00 s,Nominal
+00:15.000.000,10.00 s,Serious
+00:25.000.000,5.00 s,Fair
+00:30.000.000,10.00 s,Nominal
+00:40.000.000,10.00 s,Unknown
+'''
+
+# 5 秒一个样本，中点 2.5 和 7.5 为 Nominal，12.5 为 Fair，17.5 和 22.5 为 Serious，27.5 为 Fair，32.5 和 37.5 为 Nominal；最后一行不计
+SURFACES = 'Start,Duration,Count\n' + ''.join(
+    f'00:{5 * i:02d}.000.000,5.00 s,{fps}\n' for i, fps in enumerate([60, 60, 50, 40, 40, 50, 58, 58, 99]))
+
+# App 的样本中点为 5、15、25、35 秒
+SYSMON = '''Start,Duration,Process Name,% CPU
+00:00.000.000,10.00 s,App (100),10.0%
+00:00.000.000,10.00 s,kernel_task (0),90.0%
+00:10.000.000,10.00 s,App (100),40.0%
+00:20.000.000,10.00 s,App (100),30.0%
+00:30.000.000,10.00 s,App (100),20.0%
+'''
+
+@pytest.fixture
+def tables(tmp_path):
+    (tmp_path / 'App-GamePerformance-device-thermal-state-intervals.csv').write_text(THERMAL)
+    (tmp_path / 'App-GamePerformance-displayed-surfaces-per-second.csv').write_text(SURFACES)
+    (tmp_path / 'App-ActivityMonitor-sysmon-process.csv').write_text(SYSMON)
+    return str(tmp_path)
+
+def test_intervals_hand_computed(tables):
+    report = thermal_report('App', tables)
+    assert report['seconds'] == 40
+    assert report['time_in_state'] == {
+        'nominal': {'seconds': 20, 'share': 0.5},
+        'fair': {'seconds': 10, 'share': 0.25},
+        'serious': {'seconds': 10, 'share': 0.25},
+        'critical': {'seconds': 0, 'share': 0},
+    }
+    assert report['first_elevated_seconds'] == 10 and report['max_state'] == 'serious'
+    # Nominal→Fair→Serious→Fair→Nominal
+    assert (report['transitions'], report['escalations']) == (4, 2)
+    assert thermal_report('App', tables, [], elevated='serious')['first_elevated_seconds'] == 15
+
+def test_throttling_by_state(tables):
+    fps, cpu = (thermal_report('App', tables)['throttling'][name] for name in ('fps', 'cpu'))
+    assert [(fps[state]['samples'], fps[state]['mean']) for state in thermal.STATES] == [
+        (4, 59), (2, 50), (2, 40), (0, None)]
+    assert (fps['nominal_mean'], fps['elevated_mean'], fps['change']) == (59, 45, -14)
+    assert fps['change_percent'] == pytest.approx(-14 / 59 * 100)
+    assert [cpu[state]['mean'] for state in thermal.STATES] == [15, 30, 40, None]
+    assert (cpu['nominal_mean'], cpu['elevated_mean'], cpu['change']) == (15, 35, 20)
+    serious = thermal_report('App', tables, ['cpu'], elevated='serious')['throttling']['cpu']
+    assert (serious['nominal_mean'], serious['elevated_mean']) == (20, 40)
+
+def test_helpers():
+    starts = np.array([0, 10, 20, 30], dtype=np.float64)
+    states = np.array([0, 0, 2, 1])
+    times, before, after = state_changes(starts, states)
+    assert (list(times), list(before), list(after)) == ([20, 30], [0, 2], [2, 1])
+    seconds = time_in_state(starts, starts + 2e9, states)
+    assert {name: stats['seconds'] for name, stats in seconds.items()} == {'nominal': 4, 'fair': 2, 'serious': 2, 'critical': 0}
+    # 没有升温状态的样本时没有变化量
+    stats = throttling(np.array([2, 0, 0, 0]), np.array([10.0, 0, 0, 0]), 1)
+    assert stats['nominal_mean'] == 5 and stats['elevated_mean'] is None and 'change' not in stats
+
+def test_missing_tables(tables, tmp_path, capsys):
+    assert thermal_report('Other', tables) is None
+    (tmp_path / 'App-ActivityMonitor-sysmon-process.csv').unlink()
+    report = thermal_report('App', tables)
+    assert list(report['throttling']) == ['fps']
+    assert '跳过 cpu' in capsys.readouterr().err
+
+def test_main_writes_json(tables, tmp_path, monkeypatch, capsys):
+    output = tmp_path / 'thermal.json'
+    monkeypatch.setattr(sys, 'argv', ['thermal.py', 'App', '--dir', tables, '--metrics', 'fps', '--json', str(output)])
+    thermal.main()
+    out = capsys.readouterr().out
+    assert 'Thermal State Nominal 20s (50.0%), Fair 10s (25.0%), Serious 10s (25.0%), Critical 0s (0.0%)' in out
+    assert 'FPS by thermal state: Nominal=59.00 Fair=50.00 Serious=40.00, elevated vs nominal -14.00 (-23.7%)' in out
+    with open(output) as f:
+        assert json.load(f)['throttling']['fps']['elevated_mean'] == 45
@@ -0,0 +1,81 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import timeline
+from timeline import asof, bucket, build_timeline, intervals
+
+NAN = np.nan
+# App 的行不按时间顺序；2.25 秒的 CPU 没有值
+SYSMON = '''Start,Duration,Process Name,% CPU,Memory
+00:01.000.000,600.00 ms,App (100),40.0%,3.00 MiB
+00:00.000.000,400.00 ms,App (100),10.0%,1.00 MiB
+00:00.000.000,1.00 s,kernel_task (0),90.0%,9.00 MiB
+00:00.250.000,250.00 ms,App (100),20.0%,2.00 MiB
+00:02.000.000,1.00 s,App (100),30.0%,4.00 MiB
+00:02.250.000,250.00 ms,App (100),,4.00 MiB
+'''
+
+SURFACES = '''Start,Duration,Count
+00:00.000.000,1.00 s,60
+00:01.000.000,1.00 s,50
+00:02.000.000,0.50 s,30
+'''
+
+@pytest.fixture
+def tables(tmp_path):
+    (tmp_path / 'App-ActivityMonitor-sysmon-process.csv').write_text(SYSMON)
+    (tmp_path / 'App-GamePerformance-displayed-surfaces-per-second.csv').write_text(SURFACES)
+    return str(tmp_path)
+
+def test_mean_buckets(tables):
+    # 500 ms 的桶：0-0.5 有 10、20 两个样本；没有样本开始的桶取覆盖桶起点的样本：
+    # 1.5 时 1.0 开始的 600 ms 样本还没结束，0.5 和 2.5 时最近的样本已经结束；FPS 不计最后一行
+    df = build_timeline('App', tables, ['cpu', 'fps'], bucket_ms=500)
+    assert list(df['time_ns']) == [i * 500 * 1000 ** 2 for i in range(6)]
+    np.testing.assert_array_equal(df['cpu'], [15, NAN, 40, 40, 30, NAN])
+    np.testing.assert_array_equal(df['fps'], [60, 60, 50, 50, NAN, NAN])
+
+def test_max_buckets(tables):
+    df = build_timeline('App', tables, ['cpu', 'memory'], bucket_ms=500, agg='max')
+    np.testing.assert_array_equal(df['cpu'], [20, NAN, 40, 40, 30, NAN])
+    np.testing.assert_array_equal(df['memory'], [2, NAN, 3, 3, 4, NAN])
+
+def test_coarse_bucket_averages_every_sample(tables):
+    df = build_timeline('App', tables, ['cpu'], bucket_ms=1000)
+    np.testing.assert_array_equal(df['cpu'], [15, 40, 30])
+
+def test_preloaded_tables_and_missing_tables(tables, capsys):
+    sysmon = pd.read_csv(f'{tables}/App-ActivityMonitor-sysmon-process.csv')
+    df = build_timeline('App', '/nonexistent', ['cpu', 'thermal'], bucket_ms=500,
+                        tables={'ActivityMonitor-sysmon-process': sysmon})
+    assert list(df.columns) == ['time_ns', 'cpu']
+    assert '跳过 thermal' in capsys.readouterr().err
+    assert build_timeline('App', '/nonexistent', ['thermal']).empty
+
+def test_intervals_without_duration():
+    # 没有 Duration 列时用到下一个样本的间隔，最后一个样本按间隔的中位数
+    rows = pd.DataFrame({'Start': ['00:00.300.000', '00:00.000.000', '00:00.100.000']})
+    starts, ends, order = intervals(rows)
+    assert list(order) == [1, 2, 0]
+    assert list(starts) == [0, 1e8, 3e8]
+    assert list(ends) == [1e8, 3e8, 4.5e8]
+
+def test_bucket_reduceat():
+    starts = np.array([0, 10, 15, 40], dtype=np.float64)
+    ends = starts + 5
+    values = np.array([1, 2, NAN, 8])
+    times = np.arange(0, 50, 10, dtype=np.float64)
+    np.testing.assert_array_equal(bucket(times, 10, starts, ends, values), [1, 2, NAN, NAN, 8])
+    np.testing.assert_array_equal(bucket(times, 10, starts, ends, values, 'max'), [1, 2, NAN, NAN, 8])
+    np.testing.assert_array_equal(asof(np.array([-1, 3, 5, 42]), starts, ends, values), [NAN, 1, NAN, 8])
+    np.testing.assert_array_equal(asof(times, starts[:0], ends[:0], values[:0]), [NAN] * 5)
+
+def test_main_writes_output(tables, tmp_path, monkeypatch):
+    output = tmp_path / 'timeline.csv'
+    monkeypatch.setattr(sys, 'argv', ['timeline.py', 'App', '--dir', tables, '--metrics', 'cpu',
+                                      '--bucket-ms', '500', '--output', str(output)])
+    timeline.main()
+    assert list(pd.read_csv(output)['cpu'].fillna(-1)) == [15, -1, 40, 40, 30, -1]
@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+from writers import ColumnWriter, atomic_output, read_table, write_frame
+from xml2csv import convert_table
+
+def test_atomic_output_replaces_when_done(tmp_path):
+    path = tmp_path / 'report.json'
+    path.write_text('old')
+    with atomic_output(str(path)) as partial:
+        with open(partial, 'w') as f:
+            f.write('new')
+        # 写完之前目标还是旧的内容
+        assert path.read_text() == 'old'
+    assert path.read_text() == 'new'
+    assert os.listdir(tmp_path) == ['report.json']
+
+def test_atomic_output_keeps_old_on_error(tmp_path):
+    path = tmp_path / 'report.json'
+    path.write_text('old')
+    with pytest.raises(KeyboardInterrupt):
+        with atomic_output(str(path)) as partial:
+            with open(partial, 'w') as f:
+                f.write('half')
+            raise KeyboardInterrupt
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['report.json']
+
+def test_atomic_output_without_partial_leaves_path(tmp_path):
+    with atomic_output(str(tmp_path / 'empty.csv')):
+        pass
+    assert os.listdir(tmp_path) == []
+
+def test_directory_outputs_are_replaced(exports, tmp_path):
+    # .columns 是目录，已有的目录整体替换
+    xml_file = exports('sysmon-process', 100)
+    output = str(tmp_path / 'table.columns')
+    os.mkdir(output)
+    (tmp_path / 'table.columns' / 'stale.npy').write_text('')
+    convert_table(xml_file, output, 'npy')
+    assert 'stale.npy' not in os.listdir(output)
+    assert len(read_table(output)) == 100
+    assert os.listdir(tmp_path) == ['table.columns']
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet', '.arrow', '.columns'])
+def test_write_frame_round_trip(tmp_path, suffix):
+    df = pd.DataFrame({'process': ['SynthApp (100)', 'kernel_task (0)'], 'cpu': [12.5, 3.0], 'samples': [10, 20]})
+    path = str(tmp_path / f'frame{suffix}')
+    write_frame(df, path)
+    pd.testing.assert_frame_equal(read_table(path), df)
+
+def test_write_frame_columns_missing_values(tmp_path):
+    # 与 NpyWriter 相同：缺失的字符串为 ''，可空整数的缺失值为 NaN
+    df = pd.DataFrame({'name': ['SynthApp', None], 'pid': pd.array([100, None], dtype='Int64')})
+    path = str(tmp_path / 'frame.columns')
+    write_frame(df, path)
+    result = read_table(path)
+    assert list(result['name']) == ['SynthApp', '']
+    assert result['pid'].iloc[0] == 100 and pd.isna(result['pid'].iloc[1])
+
+def test_column_writer_needs_dump():
+    # 没有实现 dump 的列式格式在创建时就报错，而不是写完所有行后才失败
+    class IncompleteWriter(ColumnWriter):
+        suffix = '.incomplete'
+
+    with pytest.raises(TypeError):
+        IncompleteWriter('table.incomplete', ['Start'])
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import exporter
+import synth
+import xcperf
+
+ACTIVITY = ('Activity Monitor', 'Activity Monitor')
+GAME = ('Game Performance', 'Activity Monitor')
+
+TOC = '''<?xml version="1.0"?>
+<trace-toc><run number="1"><info><summary><start-date>2026-01-01T00:00:00.000+08:00</start-date>
+<end-date>2026-01-01T00:00:10.000+08:00</end-date><duration>10.0</duration></summary></info>
+<data><table schema="sysmon-process"/></data></run></trace-toc>
+'''
+
+@pytest.fixture
+def pipeline(exports, fake_xcrun, tmp_path, monkeypatch):
+    # xcperf.py 按相对路径读写，在临时目录中运行；录制 1s，超时后再等 0.5s，SIGINT 后等 0.5s
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(xcperf, 'XCRUN', fake_xcrun.path)
+    monkeypatch.setattr(exporter, 'XCRUN', fake_xcrun.path)
+    monkeypatch.setattr(xcperf, 'test_process_name', synth.APP)
+    monkeypatch.setattr(xcperf, 'test_device_udid', 'UDID1')
+    monkeypatch.setattr(xcperf, 'EXPORT_CACHE', False)
+    monkeypatch.setattr(xcperf, 'RECORD_TIME_LIMIT', '1s')
+    monkeypatch.setattr(xcperf, 'RECORD_TIMEOUT_GRACE', 0.5)
+    monkeypatch.setattr(xcperf, 'STOP_GRACE', 0.5)
+    toc = tmp_path / 'toc-fixture.xml'
+    toc.write_text(TOC)
+    fake_xcrun.serve(exports('sysmon-process', 300), toc)
+    return fake_xcrun
+
+def calls_of(fake_xcrun, command, trace=None):
+    return [call for call in fake_xcrun.history()
+            if call.args[1] == command and (trace is None or any(trace in arg for arg in call.args))]
+
+def test_exports_overlap_the_next_recording(pipeline, monkeypatch):
+    # 录制比时长更久但在宽限时间内
+    monkeypatch.setattr(xcperf, 'RECORD_TIMEOUT_GRACE', 10)
+    pipeline.record(seconds=1.5)
+    outcome = asyncio.run(xcperf.run_pipeline([ACTIVITY, GAME]))
+    assert list(outcome) == [ACTIVITY, GAME]
+    assert all(result.ok for results in outcome.values() for result in results)
+    first, second = calls_of(pipeline, 'record')
+    exports = calls_of(pipeline, 'export', 'Activity-Monitor_Activity-Monitor.trace')
+    # toc 和表格的导出都在下一个模板录制期间完成
+    assert len(exports) == 2
+    assert all(first.end <= call.start and call.end <= second.end for call in exports)
+    prefix = f'{synth.APP}_Activity-Monitor_Activity-Monitor'
+    assert os.path.exists(f'{prefix}_sysmon-process.csv')
+    with open(f'summary-{prefix}-runs.json') as f:
+        assert 'cpu' in json.load(f)['aggregate']
+    assert not [name for name in os.listdir() if '.partial-' in name]
+
+def test_stuck_record_is_interrupted_killed_and_retried(pipeline):
+    pipeline.record(hang=1)
+    outcome = asyncio.run(xcperf.run_pipeline([ACTIVITY]))
+    assert outcome[ACTIVITY] and outcome[ACTIVITY][0].ok
+    stuck, retried = calls_of(pipeline, 'record')
+    # 超过时长加宽限时间后发 SIGINT，仍不退出就在 STOP_GRACE 后强制结束，然后重试
+    assert stuck.interrupted and stuck.end is None
+    assert retried.start - stuck.start >= 1 + 0.5 + 0.5
+    assert retried.end is not None and not retried.interrupted
+
+def test_failed_records_are_retried(pipeline):
+    pipeline.record(fail=xcperf.MAX_RETRIES - 1)
+    outcome = asyncio.run(xcperf.run_pipeline([ACTIVITY]))
+    assert outcome[ACTIVITY][0].ok
+    assert len(calls_of(pipeline, 'record')) == xcperf.MAX_RETRIES
+
+def test_record_failing_every_retry_skips_the_export(pipeline):
+    pipeline.record(fail=xcperf.MAX_RETRIES)
+    outcome = asyncio.run(xcperf.run_pipeline([ACTIVITY]))
+    assert outcome == {ACTIVITY: None}
+    assert len(calls_of(pipeline, 'record')) == xcperf.MAX_RETRIES
+    assert not calls_of(pipeline, 'export')
+    assert not [name for name in os.listdir() if name.endswith('.trace') or '.partial-' in name]
+
+def test_run_shell_command_times_out_and_stops_the_process(pipeline):
+    pipeline.record(hang=1)
+    command = [pipeline.path, 'xctrace', 'record', '--output', 'stuck.trace']
+    assert asyncio.run(xcperf.run_shell_command(command, timeout=0.5)) is None
+    call, = pipeline.history()
+    assert call.interrupted and call.end is None
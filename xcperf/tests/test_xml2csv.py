@@ -0,0 +1,133 @@
+import csv
+import logging
+import os
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+import pytest
+
+import synth
+import xml2csv
+from writers import read_table
+from xml2csv import PROCESS_FMT, convert_table, process_filter, split_tables
+
+def reference_csv(xml_file, csv_file):
+    # 原来的 xml2csv.xml_to_csv（整棵树解析，每个 ref 用 XPath 查找），去掉调试输出
+    root = ET.parse(xml_file).getroot()
+
+    def node_to_data(node):
+        if 'fmt' in node.attrib:
+            return node.attrib['fmt']
+        elif node.text is not None:
+            return node.text
+        else:
+            return 'N/A'
+
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([col.find('name').text for col in root.findall('.//col')])
+        for row in root.findall('.//row'):
+            data = []
+            for child in row:
+                if 'ref' in child.attrib:
+                    child = root.find(f".//{child.tag}[@id='{child.attrib['ref']}']")
+                data.append(node_to_data(child))
+            writer.writerow(data)
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+@pytest.mark.parametrize('schema', list(synth.SCHEMAS))
+def test_csv_matches_original_converter(exports, tmp_path, schema):
+    xml_file = exports(schema, 300)
+    reference_csv(xml_file, tmp_path / 'reference.csv')
+    schema_name, _, rows = convert_table(xml_file, str(tmp_path / 'streamed.csv'))
+    assert schema_name == schema
+    assert rows == 300
+    assert read_bytes(tmp_path / 'streamed.csv') == read_bytes(tmp_path / 'reference.csv')
+
+def test_split_tables_matches_single_tables(exports, tmp_path):
+    # XPath 并集导出的多个表格拆分后与逐个转换的结果相同
+    schemas = ['sysmon-process', 'device-thermal-state-intervals']
+    combined = tmp_path / 'combined.xml'
+    with open(combined, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<trace-query-result>\n')
+        for number, schema in enumerate(schemas):
+            # 每个表格的 id 加上前缀，合并后在文档内仍然唯一
+            text = read_bytes(exports(schema, 200)).decode()
+            body = text[text.index('<node'):text.rindex('</trace-query-result>')]
+            f.write(body.replace('id="', f'id="{number}-').replace('ref="', f'ref="{number}-'))
+        f.write('</trace-query-result>\n')
+    results = split_tables(str(combined), str(tmp_path / 'App-'))
+    assert [(schema, rows) for schema, _, rows in results] == [(schema, 200) for schema in schemas]
+    for schema, output, _ in results:
+        convert_table(exports(schema, 200), str(tmp_path / f'{schema}.csv'))
+        assert read_bytes(output) == read_bytes(tmp_path / f'{schema}.csv')
+
+def processes(path):
+    return read_table(path)['Process Name']
+
+def test_process_filter_by_name(exports, tmp_path):
+    xml_file = exports('sysmon-process', 500)
+    convert_table(xml_file, str(tmp_path / 'all.csv'))
+    _, _, rows = convert_table(xml_file, str(tmp_path / 'app.csv'), where=process_filter([synth.APP]))
+    everything = pd.read_csv(tmp_path / 'all.csv')
+    expected = everything[everything['Process Name'].str.startswith(synth.APP)].reset_index(drop=True)
+    assert rows == len(expected) > 0
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / 'app.csv'), expected)
+
+def test_process_filter_by_pid(exports, tmp_path):
+    xml_file = exports('sysmon-process', 500)
+    convert_table(xml_file, str(tmp_path / 'all.csv'))
+    names = processes(str(tmp_path / 'all.csv'))
+    pid = PROCESS_FMT.match(names.iloc[-1])['pid']
+    convert_table(xml_file, str(tmp_path / 'pid.csv'), where=process_filter(pids=[pid]))
+    filtered = processes(str(tmp_path / 'pid.csv'))
+    assert len(filtered) == (names == names.iloc[-1]).sum()
+    assert set(filtered) == {names.iloc[-1]}
+
+def test_process_filter_columnar(exports, tmp_path):
+    # 列式格式走 node_to_cell 的路径，过滤的结果与 CSV 相同
+    xml_file = exports('sysmon-process', 500)
+    where = process_filter([synth.APP, 'kernel_task'])
+    convert_table(xml_file, str(tmp_path / 'app.csv'), where=where)
+    convert_table(xml_file, str(tmp_path / 'app.columns'), format='npy', where=where)
+    assert list(processes(str(tmp_path / 'app.columns'))) == list(processes(str(tmp_path / 'app.csv')))
+
+def test_process_filter_keeps_tables_without_process(exports, tmp_path):
+    xml_file = exports('device-thermal-state-intervals', 100)
+    _, _, rows = convert_table(xml_file, str(tmp_path / 'thermal.csv'), where=process_filter(['nothing']))
+    assert rows == 100
+
+def test_truncated_export_leaves_no_output(exports, tmp_path):
+    # 解析失败时不留下不完整的输出，已有的输出也不被替换
+    text = read_bytes(exports('sysmon-process', 300))
+    truncated = tmp_path / 'truncated.xml'
+    truncated.write_bytes(text[:len(text) // 2])
+    output = tmp_path / 'table.csv'
+    output.write_text('previous\n')
+    with pytest.raises(ET.ParseError):
+        convert_table(str(truncated), str(output))
+    assert output.read_text() == 'previous\n'
+    assert sorted(os.listdir(tmp_path)) == ['table.csv', 'truncated.xml']
+
+def test_truncated_split_keeps_finished_tables(exports, tmp_path):
+    text = read_bytes(exports('sysmon-process', 300)).decode()
+    combined = tmp_path / 'combined.xml'
+    complete = text[text.index('<node'):text.rindex('</trace-query-result>')]
+    cut = complete.replace('id="', 'id="x').replace('ref="', 'ref="x').replace('sysmon-process', 'other-table')
+    combined.write_text('<trace-query-result>\n' + complete + cut[:len(cut) // 2])
+    with pytest.raises(ET.ParseError):
+        split_tables(str(combined), str(tmp_path / 'App-'))
+    assert sorted(os.listdir(tmp_path)) == ['App-sysmon-process.csv', 'combined.xml']
+
+@pytest.mark.parametrize('sample, logged_rows', [(1, 300), (100, 3), (1000, 1)])
+def test_debug_sample_logs_every_nth_row(exports, tmp_path, caplog, monkeypatch, sample, logged_rows):
+    # 抽样到的行（第 1、sample+1、... 行）每个单元格一行诊断信息
+    monkeypatch.setattr(xml2csv, 'DEBUG_SAMPLE', sample)
+    caplog.set_level(logging.DEBUG, logger='xml2csv')
+    convert_table(exports('sysmon-process', 300), str(tmp_path / 'table.csv'))
+    lines = [record for record in caplog.records if record.levelno == logging.DEBUG]
+    assert len(lines) == logged_rows * len(synth.SCHEMAS['sysmon-process'][1])
+    assert lines[0].getMessage().startswith('第 1 行 ')
@@ -0,0 +1,157 @@
+"""温度状态区间分析
+
+温度状态是分类值，summarize.py 给出的均值和最大值意义不大。device-thermal-state-intervals 是一串 [start, start + duration) 区间，每个区间一个状态，据此计算：
+各状态（Nominal、Fair、Serious、Critical）的时长和占比，用按时长加权的 np.bincount 一次算出；
+从录制开始到第一次进入升温状态（默认 Fair 及以上）的时间、达到的最高状态、状态变化和升级的次数；
+降频影响：每个 FPS 和 CPU 样本取其中点所在区间的状态（timeline.py 的 as-of 连接，对区间开始时间一次 np.searchsorted），
+按状态比较各指标的均值，以及正常和升温状态之间的差异。全部是数组上的区间运算，不逐行循环。
+
+run: `python3 thermal.py <process_name> [--dir .] [--metrics fps,cpu] [--elevated fair] [--json thermal.json]`
+eg: `python3 thermal.py makepad_taobao --metrics fps,ca-fps,cpu,gpu`
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from decode import THERMAL_STATES
+from profiler import add_arguments, configure, report_timings, span
+from summarize import METRICS, column_values, find_table, metric_rows
+from timeline import asof, intervals
+from writers import atomic_output, read_table
+
+TABLE = METRICS['thermal'].table
+COLUMN = METRICS['thermal'].column
+# 按编码排列的状态名：nominal、fair、serious、critical
+STATES = sorted(THERMAL_STATES, key=THERMAL_STATES.get)
+ELEVATED = 'fair'
+OVERLAY_METRICS = ['fps', 'cpu']
+NS_PER_SECOND = 1e9
+
+def state_intervals(df):
+    # 状态已知的区间排序后的开始、结束时间（ns）和整数状态编码
+    starts, ends, order = intervals(df)
+    states = column_values(df[COLUMN], 'thermal').to_numpy()[order]
+    known = ~np.isnan(states)
+    return starts[known], ends[known], states[known].astype(np.int64)
+
+def time_in_state(starts, ends, states):
+    # 每个温度状态的 {state: {seconds, share}}，包括从未达到的状态
+    seconds = np.bincount(states, (ends - starts) / NS_PER_SECOND, len(STATES))
+    total = seconds.sum()
+    return {name: {'seconds': float(seconds[code]), 'share': float(seconds[code] / total) if total else 0.0}
+            for code, name in enumerate(STATES)}
+
+def state_changes(starts, states):
+    # 每次状态变化的时间（ns）、之前和之后的状态
+    changed = np.flatnonzero(np.diff(states)) + 1
+    return starts[changed], states[changed - 1], states[changed]
+
+def overlay(rows, metric, starts, ends, states):
+    # 指标在每个状态下的样本数和总和，每个样本取其中点所在的状态
+    sample_starts, sample_ends, order = intervals(rows)
+    values = (column_values(rows[metric.column], metric.kind) * metric.scale).to_numpy()[order]
+    state = asof((sample_starts + sample_ends) / 2, starts, ends, states.astype(np.float64))
+    valid = ~(np.isnan(state) | np.isnan(values))
+    codes, values = state[valid].astype(np.int64), values[valid]
+    samples = np.bincount(codes, minlength=len(STATES))
+    totals = np.bincount(codes, values, len(STATES))
+    return samples, totals
+
+def throttling(samples, totals, elevated):
+    # 每个状态的均值，以及从正常到升温状态均值的变化
+    stats = {name: {'samples': int(samples[code]), 'mean': float(totals[code] / samples[code]) if samples[code] else None}
+             for code, name in enumerate(STATES)}
+    nominal = totals[:elevated].sum() / samples[:elevated].sum() if samples[:elevated].sum() else None
+    hot = totals[elevated:].sum() / samples[elevated:].sum() if samples[elevated:].sum() else None
+    stats['nominal_mean'] = None if nominal is None else float(nominal)
+    stats['elevated_mean'] = None if hot is None else float(hot)
+    if nominal is not None and hot is not None:
+        stats['change'] = float(hot - nominal)
+        stats['change_percent'] = float((hot - nominal) / nominal * 100) if nominal else None
+    return stats
+
+def thermal_report(process_name, directory='.', metrics=None, elevated=ELEVATED, tables=None):
+    # 一个进程的表格的温度分析，没有温度表格时为 None
+    # tables 可以把表格名映射到已读取的 DataFrame
+    loaded = dict(tables or {})
+
+    def table(name):
+        if name not in loaded:
+            path = find_table(directory, process_name, name)
+            loaded[name] = read_table(path) if path else None
+        return loaded[name]
+
+    df = table(TABLE)
+    if df is None or COLUMN not in df.columns or 'Start' not in df.columns:
+        return None
+    with span('thermal', process=process_name, directory=directory):
+        starts, ends, states = state_intervals(df)
+        level = THERMAL_STATES[elevated]
+        hot = np.flatnonzero(states >= level)
+        change_times, before, after = state_changes(starts, states)
+        report = {
+            'seconds': float((ends - starts).sum() / NS_PER_SECOND),
+            'time_in_state': time_in_state(starts, ends, states),
+            'elevated': elevated,
+            'first_elevated_seconds': float((starts[hot[0]] - starts[0]) / NS_PER_SECOND) if hot.size else None,
+            'max_state': STATES[states.max()] if states.size else None,
+            'transitions': int(change_times.size),
+            'escalations': int((after > before).sum()),
+            'throttling': {},
+        }
+        for name in metrics or OVERLAY_METRICS:
+            metric = METRICS[name]
+            rows = table(metric.table)
+            if rows is None or metric.column not in rows.columns or 'Start' not in rows.columns:
+                print(f'表格 {process_name}-{metric.table} 没有 Start/{metric.column} 列，跳过 {name}', file=sys.stderr)
+                continue
+            samples, totals = overlay(metric_rows(rows, metric, process_name), metric, starts, ends, states)
+            report['throttling'][name] = {'label': metric.label, **throttling(samples, totals, level)}
+    return report
+
+def print_report(report):
+    in_state = ', '.join(f'{name.title()} {stats["seconds"]:.0f}s ({stats["share"]:.1%})'
+                         for name, stats in report['time_in_state'].items())
+    print(f'Thermal State {in_state}')
+    first = report['first_elevated_seconds']
+    print(f'Thermal State max={(report["max_state"] or "-").title()} '
+          f'first {report["elevated"].title()} or above={"never" if first is None else f"{first:.1f}s"} '
+          f'transitions={report["transitions"]} escalations={report["escalations"]}')
+    for stats in report['throttling'].values():
+        means = ' '.join(f'{name.title()}={stats[name]["mean"]:.2f}' for name in STATES if stats[name]['mean'] is not None)
+        line = f'{stats["label"]} by thermal state: {means}'
+        if 'change' in stats:
+            line += f', elevated vs nominal {stats["change"]:+.2f}'
+            if stats['change_percent'] is not None:
+                line += f' ({stats["change_percent"]:+.1f}%)'
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='各温度状态的时长及其对 FPS 和 CPU 的影响')
+    parser.add_argument('process_name')
+    parser.add_argument('--dir', default='.', help='导出表格所在的目录')
+    parser.add_argument('--metrics', default=','.join(OVERLAY_METRICS), help='逗号分隔，按温度状态比较的指标')
+    parser.add_argument('--elevated', choices=STATES[1:], default=ELEVATED, help='算作升温的最低状态')
+    parser.add_argument('--json', default=None, help='报告路径，默认为 thermal-<process_name>.json')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+
+    metrics = [name for name in args.metrics.split(',') if name]
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown:
+        parser.error(f'未知的指标 {", ".join(unknown)}')
+    report = thermal_report(args.process_name, args.dir, metrics, args.elevated)
+    if report is None:
+        print(f'{args.dir} 中没有找到表格 {args.process_name}-{TABLE}', file=sys.stderr)
+        sys.exit(1)
+    print_report(report)
+    with atomic_output(args.json or f'thermal-{args.process_name}.json') as partial, open(partial, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    report_timings(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""所有指标的统一时间轴
+
+按 Start/Duration 列对齐 sysmon-process、displayed-surfaces-per-second、core-animation-fps-estimate
+和 device-thermal-state-intervals，重采样到同一时间轴上，便于查看 FPS 下降时 CPU、内存、GPU 和温度状态。
+每个时间桶取桶内开始的样本的均值或最大值；没有样本开始的桶取覆盖桶起点的样本的值。
+
+run: `python3 timeline.py <process_name> [--bucket-ms 100] [--agg mean|max] [--metrics cpu,fps] [--output timeline.parquet]`
+eg: `python3 timeline.py makepad_taobao --bucket-ms 250`
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from summarize import column_values, find_table, metric_rows, parse_metrics, selected_metrics
+from writers import read_table, write_frame
+
+BUCKET_MS = 100
+AGGREGATES = ['mean', 'max']
+NS_PER_MS = 1000 ** 2
+
+def intervals(rows):
+    # 表格各行排序后的开始、结束时间（ns）和排序的下标
+    starts = column_values(rows['Start'], 'time').to_numpy()
+    if 'Duration' in rows:
+        durations = column_values(rows['Duration'], 'time').to_numpy()
+    else:
+        durations = np.full(starts.shape, np.nan)
+    order = np.argsort(starts, kind='stable')
+    starts, durations = starts[order], durations[order]
+    gaps = np.diff(starts, append=np.nan)
+    # 没有 Duration 列时用到下一个样本的间隔作为时长；最后一个样本没有下一个，按采样间隔的中位数计
+    # （只有一个样本时为 0），有 Duration 的行保留自己的时长
+    gaps[-1:] = np.nanmedian(gaps) if starts.size > 1 else 0
+    durations = np.where(np.isnan(durations), gaps, durations)
+    return starts, starts + durations, order
+
+def asof(times, starts, ends, values):
+    # 每个时间点所在区间的值，没有区间覆盖时为 NaN
+    if starts.size == 0:
+        return np.full(times.shape, np.nan)
+    index = np.searchsorted(starts, times, side='right') - 1
+    clipped = np.clip(index, 0, starts.size - 1)
+    hit = (index >= 0) & (times < ends[clipped])
+    return np.where(hit, values[clipped], np.nan)
+
+def bucket(times, bucket_ns, starts, ends, values, agg='mean'):
+    # 每个桶内开始的样本的均值或最大值（np.add/np.fmax.reduceat，边界由 np.searchsorted 得到），没有样本时取 asof 的值
+    low = np.searchsorted(starts, times, side='left')
+    high = np.searchsorted(starts, times + bucket_ns, side='left')
+    result = asof(times, starts, ends, values)
+    filled = high > low
+    if filled.any():
+        # 桶是连续的，下一个有样本的桶的起点就是这个桶的终点
+        bounds = low[filled]
+        values = values[:high[filled][-1]]
+        if agg == 'max':
+            aggregated = np.fmax.reduceat(values, bounds)
+        else:
+            valid = ~np.isnan(values)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                aggregated = np.add.reduceat(np.where(valid, values, 0), bounds) / np.add.reduceat(valid, bounds)
+        result[filled] = aggregated
+    return result
+
+def build_timeline(process_name, directory='.', metrics=None, bucket_ms=BUCKET_MS, tables=None, agg='mean'):
+    # 宽表：time_ns 列加每个指标一列，按 bucket_ms 重采样
+    selected = selected_metrics(metrics)
+    loaded = dict(tables or {})
+    series = {}
+    for metric in selected:
+        if metric.table not in loaded:
+            path = find_table(directory, process_name, metric.table)
+            if path is None:
+                print(f'没有找到表格 {process_name}-{metric.table}，跳过 {metric.name}', file=sys.stderr)
+                continue
+            loaded[metric.table] = read_table(path)
+        df = loaded[metric.table]
+        if metric.column not in df.columns or 'Start' not in df.columns:
+            print(f'表格 {metric.table} 没有 Start/{metric.column} 列，跳过 {metric.name}', file=sys.stderr)
+            continue
+        rows = metric_rows(df, metric, process_name)
+        starts, ends, order = intervals(rows)
+        values = (column_values(rows[metric.column], metric.kind) * metric.scale).to_numpy()[order]
+        series[metric.name] = (starts, ends, values)
+
+    if not series:
+        return pd.DataFrame({'time_ns': np.array([], dtype=np.int64)})
+    bucket_ns = int(bucket_ms * NS_PER_MS)
+    first = min(np.nanmin(starts) for starts, _, _ in series.values() if starts.size)
+    last = max(np.nanmax(ends) for _, ends, _ in series.values() if ends.size)
+    times = np.arange(first // bucket_ns * bucket_ns, last, bucket_ns, dtype=np.float64)
+    timeline = {'time_ns': times.astype(np.int64)}
+    for name, (starts, ends, values) in series.items():
+        timeline[name] = bucket(times, bucket_ns, starts, ends, values, agg)
+    return pd.DataFrame(timeline)
+
+def main():
+    parser = argparse.ArgumentParser(description='把一个进程的所有指标重采样到统一的时间轴上')
+    parser.add_argument('process_name')
+    parser.add_argument('--dir', default='.', help='导出表格所在的目录')
+    parser.add_argument('--metrics', type=parse_metrics, default=None, help='逗号分隔的指标名，默认全部')
+    parser.add_argument('--bucket-ms', type=float, default=BUCKET_MS)
+    parser.add_argument('--agg', choices=AGGREGATES, default='mean', help='一个桶内多个样本的合并方式')
+    parser.add_argument('--output', default=None, help='.parquet、.arrow、.columns 或 .csv，默认 timeline-<process_name>.csv')
+    args = parser.parse_args()
+
+    timeline = build_timeline(args.process_name, args.dir, args.metrics, args.bucket_ms,
+                              agg=args.agg)
+    output = args.output or f'timeline-{args.process_name}.csv'
+    write_frame(timeline, output)
+    print(f'已写入 {output}: {len(timeline)} 个 {args.bucket_ms:g} ms 的桶')
+
+if __name__ == '__main__':
+    main()
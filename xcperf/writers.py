@@ -0,0 +1,189 @@
+import csv
+import importlib
+import json
+import os
+import re
+import shutil
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+def require(module):
+    # 列式格式依赖的第三方库按需导入，只用 CSV 时不需要安装
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        package = module.split('.')[0]
+        raise ImportError(f'输出该格式需要安装 {package}: pip install {package}')
+
+def partial_path(path):
+    # 写入过程中使用的临时路径：与目标在同一目录（rename 才是原子的），保留后缀
+    directory, name = os.path.split(path)
+    stem, suffix = os.path.splitext(name)
+    return os.path.join(directory, f'{stem}.partial-{os.getpid()}{suffix}')
+
+def remove_path(path):
+    # .trace 和 .columns 是目录，其他输出是文件
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+def commit(partial, path):
+    # 用写完的临时文件替换目标；目录不能用 os.replace 覆盖非空目录，先把旧的移开再删除
+    if os.path.isdir(partial) and os.path.isdir(path):
+        old = partial + '.old'
+        os.replace(path, old)
+        os.replace(partial, path)
+        remove_path(old)
+    else:
+        os.replace(partial, path)
+
+@contextmanager
+def atomic_output(path):
+    # 先写到 partial_path，正常结束后再替换 path，中途失败或被中断时删除临时文件，不留下不完整的输出
+    # 没有生成临时文件（例如表格为空）时不改动 path
+    partial = partial_path(path)
+    remove_path(partial)
+    try:
+        yield partial
+    except BaseException:
+        remove_path(partial)
+        raise
+    if os.path.lexists(partial):
+        commit(partial, path)
+
+class CsvWriter:
+    # 写入格式化后的文本（fmt），与原来的 CSV 输出保持一致
+    suffix = '.csv'
+    raw = False
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        # 写入表头
+        self.writer.writerow(columns)
+
+    def write(self, data):
+        self.writer.writerow(data)
+
+    def close(self):
+        self.file.close()
+
+class ColumnWriter(ABC):
+    # 按列缓存解码后的值（table.Table：数值列用 array，字符串列字典编码），关闭时按 dtype 一次性写出
+    # dtype 为 None 的列在写出时推断类型
+    suffix = ''
+    raw = True
+
+    def __init__(self, path, columns, dtypes=None):
+        # table.py 用到本模块的 require，在这里导入以避免循环导入
+        from table import Table
+
+        self.path = path
+        self.columns = columns
+        self.dtypes = dtypes or [None] * len(columns)
+        self.table = Table(columns, self.dtypes)
+
+    def write(self, data):
+        self.table.append(data)
+
+    def close(self):
+        self.dump(self.table)
+
+    @abstractmethod
+    def dump(self, table):
+        # 把 table 写到 self.path，由各格式实现
+        pass
+
+class ParquetWriter(ColumnWriter):
+    suffix = '.parquet'
+
+    def dump(self, table):
+        pq = require('pyarrow.parquet')
+        pq.write_table(table.to_arrow(dictionary=False), self.path)
+
+class ArrowWriter(ColumnWriter):
+    # Arrow IPC 文件格式，不压缩，读取时可以直接内存映射
+    suffix = '.arrow'
+
+    def dump(self, table):
+        pa = require('pyarrow')
+        table = table.to_arrow(dictionary=False)
+        with pa.OSFile(self.path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+class NpyWriter(ColumnWriter):
+    # 不依赖 pyarrow 的后备格式：目录下每列一个 .npy 文件，columns.json 记录列名
+    suffix = '.columns'
+
+    def dump(self, table):
+        from table import numpy_array
+
+        np = require('numpy')
+        os.makedirs(self.path, exist_ok=True)
+        index = []
+        for i, (name, parts) in enumerate(zip(table.names, table.parts())):
+            file_name = f"{i}-{re.sub(r'[^0-9A-Za-z_-]+', '-', name)}.npy"
+            np.save(os.path.join(self.path, file_name), numpy_array(parts))
+            index.append([name, file_name])
+        with open(os.path.join(self.path, 'columns.json'), 'w') as f:
+            json.dump(index, f, ensure_ascii=False)
+
+WRITERS = {
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+    'arrow': ArrowWriter,
+    'npy': NpyWriter,
+}
+
+def read_table(path):
+    # 按后缀读取任意一种输出格式，返回 pandas DataFrame
+    pd = require('pandas')
+    if path.endswith(CsvWriter.suffix):
+        return pd.read_csv(path)
+    if path.endswith(ParquetWriter.suffix):
+        return pd.read_parquet(path)
+    if path.endswith(ArrowWriter.suffix):
+        pa = require('pyarrow')
+        with pa.memory_map(path) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    if path.endswith(NpyWriter.suffix):
+        np = require('numpy')
+        with open(os.path.join(path, 'columns.json')) as f:
+            index = json.load(f)
+        return pd.DataFrame({name: np.load(os.path.join(path, file_name)) for name, file_name in index})
+    raise ValueError(f'不支持的文件格式: {path}')
+
+def write_frame(df, path):
+    # 把 pandas DataFrame 按后缀写成任意一种输出格式，与 read_table 对应
+    if path.endswith(CsvWriter.suffix):
+        df.to_csv(path, index=False)
+    elif path.endswith(ParquetWriter.suffix):
+        df.to_parquet(path, index=False)
+    elif path.endswith(ArrowWriter.suffix):
+        pa = require('pyarrow')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    elif path.endswith(NpyWriter.suffix):
+        np = require('numpy')
+        os.makedirs(path, exist_ok=True)
+        index = []
+        for i, name in enumerate(df.columns):
+            file_name = f"{i}-{re.sub(r'[^0-9A-Za-z_-]+', '-', str(name))}.npy"
+            values = df[name].to_numpy()
+            if values.dtype == object:
+                # 与 NpyWriter 相同，字符串存为 str 数组（缺失为 ''），可空整数存为 float64（缺失为 NaN），读取时不需要 pickle
+                column = df[name]
+                if require('pandas').api.types.is_numeric_dtype(column):
+                    values = column.to_numpy('float64', na_value=np.nan)
+                else:
+                    values = column.astype(object).where(column.notna(), '').to_numpy(str)
+            np.save(os.path.join(path, file_name), values)
+            index.append([name, file_name])
+        with open(os.path.join(path, 'columns.json'), 'w') as f:
+            json.dump(index, f, ensure_ascii=False)
+    else:
+        raise ValueError(f'不支持的文件格式: {path}')
@@ -17,7 +17,8 @@ eg: `python3 xcperf-v2.py 00008101-001575C92E90801E makepad_comp_demo`
 
 import subprocess
 import sys
-from xml2csv import xml_to_csv
+from exporter import XCRUN, ExportJob, export_command, export_job, export_tables, schema_label, table_output, tables_job
+from writers import atomic_output
 
 
 def main():
@@ -49,23 +50,18 @@ def main():
         windowed=False,
     )
 
-    for table in activity_monitor_tables:
-        exported_table_file = xcrun_export_trace_file_table(
-            activity_monitor_trace_file, table
-        )
-        xml_to_csv(exported_table_file)
-
-    for table in game_performance_tables:
-        exported_table_file = xcrun_export_trace_file_table(
-            game_performance_trace_file, table
-        )
-        xml_to_csv(exported_table_file)
-
-    for table in metal_system_tables:
-        exported_table_file = xcrun_export_trace_file_table(
-            metal_system_trace_file, table
-        )
-        xml_to_csv(exported_table_file)
+    # one export per trace, the tables are split locally; the traces are exported in parallel
+    jobs = [
+        tables_job(activity_monitor_trace_file, activity_monitor_tables),
+        tables_job(game_performance_trace_file, game_performance_tables),
+        tables_job(metal_system_trace_file, metal_system_tables),
+    ]
+    results = export_tables(jobs)
+    for result in results:
+        if not result.ok:
+            raise Exception(
+                f'Could not export tables "{schema_label(result.job.schema)}" from trace file {result.job.trace}/nError: {result.error}'
+            )
 
 
 def xcrun_record_template(
@@ -99,50 +95,32 @@ def xcrun_record_template(
 
 
 def xcrun_export_trace_file(input_trace_file_name):
-    # TODO: stop using the > and shell=True, save the output of the command run with subprocess.run()
-    # and store it in a file
-
     output_file_name = input_trace_file_name.replace(".trace", "") + ".xml"
 
-    command = ["xcrun", "xctrace", "export"]
-    options = ["--input", input_trace_file_name, "--toc", ">", output_file_name]
+    # xctrace writes the export to stdout without --output; stream it into the file
+    final_command = [XCRUN, "xctrace", "export", "--input", input_trace_file_name, "--toc"]
 
-    final_command = command + options
-
-    process = subprocess.Popen(final_command, shell=True)
-    process.communicate()
-
-    if process.returncode == 0:
-        return output_file_name
-    else:
-        raise Exception(
-            f'Could not export trace file {input_trace_file_name}/nFailed Command: "{" ".join(final_command)}"'
-        )
+    with atomic_output(output_file_name) as partial, open(partial, "wb") as output:
+        result = subprocess.run(final_command, stdout=output)
+        if result.returncode != 0:
+            raise Exception(
+                f'Could not export trace file {input_trace_file_name}/nFailed Command: "{" ".join(final_command)}"'
+            )
+    return output_file_name
 
 
 def xcrun_export_trace_file_table(input_trace_file_name, table_name):
-    output_file_name = (
-        input_trace_file_name.replace(".trace", "") + "-" + table_name + ".xml"
-    )
-
-    command = ["xcrun", "xctrace", "export"]
-    options = [
-        "--input",
+    job = ExportJob(
         input_trace_file_name,
-        "--xpath",
-        f'/trace-toc/run[@number="1"]/data/table[@schema="{table_name}"]',
-        "--output",
-        output_file_name,
-    ]
-
-    final_command = command + options
-
-    result = subprocess.run(final_command)
-    if result.returncode == 0:
-        return output_file_name
+        table_name,
+        table_output(input_trace_file_name, table_name),
+    )
+    result = export_job(job, format=None)
+    if result.ok:
+        return job.output
     else:
         raise Exception(
-            f'Could not export table "{table_name}" from trace file {input_trace_file_name}/nFailed Command: "{" ".join(final_command)}"'
+            f'Could not export table "{table_name}" from trace file {input_trace_file_name}/nFailed Command: "{" ".join(export_command(job))}"'
         )
 
 if __name__ == "__main__":
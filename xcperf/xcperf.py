@@ -1,26 +1,54 @@
+import argparse
 import subprocess
 import logging
 import os
 import re
 import csv
+import signal
 import asyncio
+import time
 import xml.etree.ElementTree as ET
 import configparser
-import shutil
 from collections import defaultdict
+from functools import partial
 from statistics import mean 
+from xml2csv import convert_table
+from cache import TableCache
+from exporter import (XCRUN, ExportJob, ExportResult, cache_export, cached_export, cached_job, convert_export, export_command,
+                      export_job, export_tables, job_cache, log_result, schema_label, tables_job)
+from plan import parse_duration
+from runs import Run, parse_toc, run_prefix
+from profiler import add_arguments, configure, count, report_timings, span
+from summarize import METRICS, print_runs_report, summarize_runs, write_runs_report
+from writers import commit, partial_path, read_table, remove_path
 
 # 配置日志记录器
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 MAX_RETRIES = 3
+# 并行导出 table schema 的任务数上限
+EXPORT_WORKERS = 4
+# 每个 trace 只调用一次 xctrace export，导出所有 table schema 后在本地拆分
+SINGLE_EXPORT = True
+# 复用 trace 内容没变时的导出和转换结果（见 cache.py）
+EXPORT_CACHE = True
+# 每次录制的时长
+RECORD_TIME_LIMIT = '10s'
+# 录制超过时长后仍未退出（例如卡在 "Stopping recording"）的宽限时间（秒），超时后终止并重试
+RECORD_TIMEOUT_GRACE = 120
+# 单次 xctrace export 的超时（秒）
+EXPORT_TIMEOUT = 600
+# 终止命令时先发 SIGINT 让 xctrace 自行收尾，超过该时间（秒）再强制结束
+STOP_GRACE = 10
 
 # 全局变量保存用户输入的测试设备 UDID 和测试程序进程名称
 test_device_udid = None
 test_process_name = None
 # 全局变量保存所有 table schema
 table_schemas = set()
+# 全局变量保存 trace 中的所有 run
+trace_runs = []
 
 # 获取当前目录下的配置文件路径
 config_file_path = os.path.join(os.path.dirname(__file__), 'config.ini')
@@ -52,22 +80,50 @@ def save_config(title="default"):
     with open(config_file_path, 'w') as configfile:
         parser.write(configfile)
 
-async def run_shell_command(cmd):
-    proc = await asyncio.create_subprocess_shell(
-        cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
+async def run_shell_command(command, timeout=None, label=None):
+    # 异步执行命令，stdout/stderr 逐行输出到日志而不是等命令结束后一次性读取
+    # 超时返回 None 并终止进程；所在任务被取消时同样终止进程，再继续传播取消
+    label = label or ' '.join(command[:3])
+    proc = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    readers = asyncio.gather(
+        log_stream(proc.stdout, label, logging.INFO),
+        log_stream(proc.stderr, label, logging.WARNING),
     )
-    stdout, stderr = await proc.communicate()
-    print(f'[{cmd!r} exited with {proc.returncode}]')
-    if stdout:
-        print(f'[stdout]\n{stdout.decode()}')
-    if stderr:
-        print(f'[stderr]\n{stderr.decode()}')
+    try:
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        logger.error("%s 超过 %ss 没有结束，终止", label, timeout)
+        await stop_process(proc)
+        return None
+    except asyncio.CancelledError:
+        logger.warning("%s 被取消，终止", label)
+        await stop_process(proc)
+        raise
+    finally:
+        try:
+            await asyncio.wait_for(readers, STOP_GRACE)
+        except asyncio.TimeoutError:
+            pass
+    return proc.returncode
+
+async def log_stream(stream, label, level):
+    async for line in stream:
+        logger.log(level, "[%s] %s", label, line.decode(errors='replace').rstrip())
+
+async def stop_process(proc):
+    # 先发 SIGINT，xctrace 收到后会结束录制并保存；宽限时间内没有退出再强制结束
+    if proc.returncode is not None:
+        return
+    proc.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(proc.wait(), STOP_GRACE)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
 
 def get_supported_instruments():
     try:
-        output = subprocess.check_output(['xcrun', 'xctrace', 'list', 'instruments'], stderr=subprocess.PIPE, universal_newlines=True)
+        output = subprocess.check_output([XCRUN, 'xctrace', 'list', 'instruments'], stderr=subprocess.PIPE, universal_newlines=True)
         instruments = set(output.strip().split('\n')[1:])
         return instruments
     except subprocess.CalledProcessError as e:
@@ -80,7 +136,7 @@ def get_preferred_instruments():
 
 def get_supported_templates():
     try:
-        output = subprocess.check_output(['xcrun', 'xctrace', 'list', 'templates'], stderr=subprocess.PIPE, universal_newlines=True)
+        output = subprocess.check_output([XCRUN, 'xctrace', 'list', 'templates'], stderr=subprocess.PIPE, universal_newlines=True)
         templates = set(output.strip().split('\n')[1:])
         return templates
     except subprocess.CalledProcessError as e:
@@ -93,7 +149,7 @@ def get_preferred_templates():
 
 def get_paired_devices():
     try:
-        output = subprocess.check_output(['xcrun', 'xctrace', 'list', 'devices'], stderr=subprocess.PIPE, universal_newlines=True)
+        output = subprocess.check_output([XCRUN, 'xctrace', 'list', 'devices'], stderr=subprocess.PIPE, universal_newlines=True)
         devices = set(output.strip().split('\n')[1:])
         return devices
     except subprocess.CalledProcessError as e:
@@ -103,7 +159,7 @@ def get_paired_devices():
 
 def check_xctrace_version():
     try:
-        output = subprocess.check_output(['xcrun', 'xctrace', 'version'], stderr=subprocess.PIPE, universal_newlines=True)
+        output = subprocess.check_output([XCRUN, 'xctrace', 'version'], stderr=subprocess.PIPE, universal_newlines=True)
         version = output.strip()
         logger.info("已安装 xctrace 版本号: %s", version)
         return True
@@ -123,77 +179,92 @@ def get_test_process_name():
 def prompt_user_to_check_foreground_process():
     logger.warn("请确保测试进程在前台，并且清除其他多任务后按回车键继续...")
 
-def record_performance_data(template, instrument):
-    # 生成输出文件名
-    output_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}.trace"
-    # 替换命令中的参数值
-    record_command = [
-        'xcrun', 'xctrace', 'record',
-        '--output', output_file,
+def file_prefix(template, instrument):
+    return f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}"
+
+def get_record_command(template, instrument, output=None):
+    # 替换命令中的参数值；output 默认为 {file_prefix}.trace
+    return [
+        XCRUN, 'xctrace', 'record',
+        '--output', output or f"{file_prefix(template, instrument)}.trace",
         '--template', template,
         '--instrument', instrument,
         '--device', test_device_udid,
-        '--time-limit', '10s',
-        '--window', '10s',
+        '--time-limit', RECORD_TIME_LIMIT,
+        '--window', RECORD_TIME_LIMIT,
         '--attach', test_process_name
     ]
+
+def get_toc_command(template, instrument, output=None):
+    prefix = file_prefix(template, instrument)
+    return [
+        XCRUN, 'xctrace', 'export',
+        '--input', f"{prefix}.trace",
+        '--output', output or f"{prefix}_toc.xml",
+        '--toc'
+    ]
+
+def record_performance_data(template, instrument):
+    # 生成输出文件名，先录制到临时路径，成功后再重命名
+    output_file = f"{file_prefix(template, instrument)}.trace"
+    partial_file = partial_path(output_file)
+    record_command = get_record_command(template, instrument, partial_file)
     # 执行录制命令
-    for retry in range(MAX_RETRIES):
-        logger.info(' '.join(record_command))
-        proc = subprocess.Popen(record_command)
-        try:
+    with span('record_performance_data', template=template, instrument=instrument):
+        for retry in range(MAX_RETRIES):
+            logger.info(' '.join(record_command))
+            remove_path(partial_file)
+            proc = subprocess.Popen(record_command)
             logger.info("开始录制 %s %s 的性能测试数据... (%s/%s)", template, instrument, retry, MAX_RETRIES)
-            proc.wait()
-            logger.info("录制 %s %s 的性能测试数据完成", template, instrument)
-            return
-        except subprocess.CalledProcessError as e:
-            logger.error("录制 %s %s 的性能测试数据失败 (%s/%s)", template, instrument, retry, MAX_RETRIES)
+            returncode = proc.wait()
+            if returncode == 0 and os.path.exists(partial_file):
+                commit(partial_file, output_file)
+                logger.info("录制 %s %s 的性能测试数据完成", template, instrument)
+                return
+            logger.error("录制 %s %s 的性能测试数据失败，退出码 %s (%s/%s)", template, instrument, returncode, retry, MAX_RETRIES)
+            count('retries')
             # 删除失败任务生成的文件
-            if os.path.exists(output_file):
-                shutil.rmtree(output_file)
+            remove_path(partial_file)
 
 def export_test_results(template, instrument):
-    # 生成输入和输出文件名
-    input_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}.trace"
-    output_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_toc.xml"
-    # 替换命令中的参数值
-    export_command = [
-        'xcrun', 'xctrace', 'export',
-        '--input', input_file,
-        '--output', output_file,
-        '--toc'
-    ]
+    # 生成输出文件名，先导出到临时文件，成功后再重命名
+    output_file = f"{file_prefix(template, instrument)}_toc.xml"
+    partial_file = partial_path(output_file)
+    export_command = get_toc_command(template, instrument, partial_file)
     # 执行输出命令
-    for retry in range(MAX_RETRIES):
-        logger.info(' '.join(export_command))
-        proc = subprocess.Popen(export_command)
-        try:
+    with span('export_test_results', template=template, instrument=instrument):
+        for retry in range(MAX_RETRIES):
+            logger.info(' '.join(export_command))
+            remove_path(partial_file)
+            proc = subprocess.Popen(export_command)
             logger.info("开始导出 %s %s 的性能测试结果... (%s/%s)", template, instrument, retry, MAX_RETRIES)
-            proc.wait()
-            logger.info("导出 %s %s 的性能测试结果完成", template, instrument)
-            return
-        except subprocess.CalledProcessError as e:
-            logger.error("导出 %s %s 的性能测试结果失败 (%s/%s)", template, instrument, retry, MAX_RETRIES)
-            # 删除失败任务生成的文件
-            if os.path.exists(output_file):
-                shutil.rmtree(output_file)
+            returncode = proc.wait()
+            if returncode == 0 and os.path.exists(partial_file):
+                commit(partial_file, output_file)
+                logger.info("导出 %s %s 的性能测试结果完成", template, instrument)
+                return
+            logger.error("导出 %s %s 的性能测试结果失败，退出码 %s (%s/%s)", template, instrument, returncode, retry, MAX_RETRIES)
+            count('retries')
+            # 删除失败任务生成的文件（toc 是 XML 文件，不是目录）
+            remove_path(partial_file)
 
 def export_schmeas_toc(template, instrument):
     # 生成 toc 文件名
     toc_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_toc.xml"
     for retry in range(MAX_RETRIES):
         try:
-            # 解析 toc 文件
-            tree = ET.parse(toc_file)
-            root = tree.getroot()
+            # 解析 toc 文件，一个 trace 中可能有多次录制（run）
+            runs = parse_toc(toc_file)
             table_schemas.clear()
+            trace_runs.clear()
+            trace_runs.extend(runs)
             # 遍历节点，提取 table schema
-            for table in root.findall('.//table'):
-                schema = table.get('schema')
-                if schema:
-                    table_schemas.add(schema)
-                else:
-                    logger.info("没有找到 %s %s 的 %s 信息", template, instrument, schema)
+            for run in runs:
+                logger.info("%s %s run %s: %s - %s", template, instrument, run.number, run.start, run.end)
+                table_schemas.update(run.schemas)
+            if len(table_schemas) == 0:
+                logger.info("没有找到 %s %s 的 table schema 信息", template, instrument)
+            return
         except ET.ParseError as e:
             logger.error("解析 %s %s 的 toc 文件失败 (%s/%s)", template, instrument, retry, MAX_RETRIES)
 
@@ -201,27 +272,65 @@ def export_table_schema(template, instrument, schema):
     # 生成输入和输出文件名
     input_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}.trace"
     output_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_{schema}.xml"
-    # 替换命令中的参数值
-    parse_command = [
-        'xcrun', 'xctrace', 'export',
-        '--input', input_file,
-        '--output', output_file,
-        '--xpath', f'\'/trace-toc/run[@number="1"]/data/table[@schema="{schema}"]\''
-    ]
-    # 执行解析命令
-    for retry in range(MAX_RETRIES):
-        logger.info(' '.join(parse_command))
-        proc = subprocess.Popen(parse_command)
-        try:
-            logger.info("开始解析 %s %s 的 %s 数据... (%s/%s)", template, instrument, schema, retry, MAX_RETRIES)
-            proc.wait()
-            logger.info("解析 %s %s 的 %s 数据完成", template, instrument, schema)
-            return
-        except subprocess.CalledProcessError as e:
-            logger.error("解析 %s %s 的 %s 数据失败 (%s/%s)", template, instrument, schema, retry, MAX_RETRIES)
-            # 删除失败任务生成的文件
-            if os.path.exists(output_file):
-                shutil.rmtree(output_file)
+    logger.info("开始解析 %s %s 的 %s 数据...", template, instrument, schema)
+    with span('export_table_schema', template=template, instrument=instrument, schema=schema):
+        result = export_job(ExportJob(input_file, schema, output_file), retries=MAX_RETRIES, format=None)
+    if result.ok:
+        logger.info("解析 %s %s 的 %s 数据完成", template, instrument, schema)
+    else:
+        logger.error("解析 %s %s 的 %s 数据失败: %s", template, instrument, schema, result.error)
+
+def table_schema_jobs(template, instrument, schemas, runs=None):
+    # 每个 run 的所有 table schema 的导出任务：SINGLE_EXPORT 时每个 run 一次导出全部表格再拆分，否则逐个导出
+    # 多个 run 时输出文件名带上 run{n}- 前缀；runs 默认为 export_schmeas_toc 解析出的 trace_runs
+    input_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}.trace"
+    prefix = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_"
+    runs = runs or trace_runs or [Run(1, None, None, None, sorted(schemas))]
+    jobs = []
+    for run in runs:
+        run_schemas = sorted(set(run.schemas) & set(schemas))
+        if not run_schemas:
+            continue
+        output_prefix = run_prefix(prefix, run, runs)
+        if SINGLE_EXPORT:
+            jobs.append(tables_job(input_file, run_schemas, output_prefix, run.number))
+        else:
+            jobs.extend(ExportJob(input_file, schema, f"{output_prefix}{schema}.xml", run.number) for schema in run_schemas)
+    return jobs
+
+def export_table_schemas(template, instrument, schemas, runs=None):
+    # 在进程池中并行导出并转换每个 run 的所有 table schema
+    jobs = table_schema_jobs(template, instrument, schemas, runs)
+    cache = TableCache() if EXPORT_CACHE else None
+    with span('export_table_schemas', template=template, instrument=instrument, jobs=len(jobs)):
+        return export_tables(jobs, workers=EXPORT_WORKERS, retries=MAX_RETRIES, timeout=EXPORT_TIMEOUT, cache=cache)
+
+def summarize_trace(template, instrument, runs=None):
+    # 按 summarize.py 的指标汇总每个 run 导出的表格，并计算各统计量跨 run 的均值、标准差和 95% 置信区间
+    # 每个指标按自己的 kind 解码；写入 summary-{file_prefix}-runs.json/.csv，没有可汇总的表格时返回 None
+    prefix = f"{file_prefix(template, instrument)}_"
+    runs = runs or trace_runs
+    tables = {}
+    for run in runs:
+        for metric in METRICS.values():
+            table_template, _, schema = metric.table.partition('-')
+            path = f"{run_prefix(prefix, run, runs)}{schema}.csv"
+            if table_template == replace_special_chars(template).replace('-', '') and os.path.exists(path):
+                run_tables = tables.setdefault(run.number, {})
+                if metric.table not in run_tables:
+                    run_tables[metric.table] = read_table(path)
+    if not tables:
+        logger.info("%s %s 没有可汇总的表格", template, instrument)
+        return None
+    with span('summarize_trace', template=template, instrument=instrument, runs=len(tables)):
+        summary = summarize_runs(test_process_name, sorted(tables), tables=tables,
+                                 metrics=[name for name, metric in METRICS.items()
+                                          if any(metric.table in run_tables for run_tables in tables.values())])
+    print_runs_report(summary)
+    report = f"summary-{file_prefix(template, instrument)}-runs"
+    write_runs_report(summary, f"{report}.json", f"{report}.csv")
+    logger.info("汇总 %s %s 的 %s 个 run 完成: %s.json", template, instrument, len(tables), report)
+    return summary
 
 def replace_special_chars(string):
     # 替换特殊字符为连字符
@@ -233,59 +342,16 @@ def convert_csv(template, instrument, schema):
     input_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_{schema}.xml"
     output_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_{schema}.csv"
     try:
-        tree = ET.parse(input_file)
-        root = tree.getroot()
-        schema_node = root.find('.//schema')
-        if schema_node is None:
+        with span('convert_csv', template=template, instrument=instrument, schema=schema):
+            result = convert_table(input_file, output_file)
+        if result is None:
             logger.error("%s 数据为空，无法转换。", input_file)
             return
-        schema_name = schema_node.attrib['name']
-        print('schema_name', schema_name)
+        schema_name, columns, count = result
+        logger.info("转换 %s 完成: %s, %s 行", input_file, schema_name, count)
     except ET.ParseError as e:
         logger.error("无法解析 %s 的内容", input_file)
 
-
-    # 打开CSV文件进行写入
-    with open(output_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        print(root.find('.//col'))
-        # 获取表格模式（schema）的列名
-        columns = [col.find('name').text for col in root.findall('.//col')]
-        print('columns', columns)
-        # 写入表头
-        writer.writerow(columns)
-        # 遍历XML中的每个节点
-
-        rows = root.findall('.//row')
-        print('len(rows)', len(rows))
-        for row in rows:
-            # 提取每行数据
-            print('node.tag', row.tag, 'node.text', row.text)
-            data = []
-            for child in row:
-                print('child.tag', child.tag, 'child.text', child.text)
-                # 替换ref值为对应id的实际值
-                if 'ref' in child.attrib:
-                    ref_id = child.attrib['ref']
-                    ref_xpath = f".//{child.tag}[@id='{ref_id}']"
-                    ref_node = root.find(ref_xpath)
-                    ref_data = node_to_data(ref_node)
-                    print('ref_id', ref_id, 'ref_xpath', ref_xpath, 'ref_node', ref_node)
-                    data.append(ref_data)
-                else:
-                    txt = node_to_data(child)
-                    data.append(txt)
-            # 将数据写入CSV文件
-            writer.writerow(data)
-
-def node_to_data(node):
-    if 'fmt' in node.attrib:
-        return node.attrib['fmt']
-    elif node.text is not None:
-        return node.text
-    else:
-        return 'N/A'
-
 def analytic_csv(template, instrument, schema, field):
     input_file = f"{test_process_name}_{replace_special_chars(template)}_{replace_special_chars(instrument)}_{schema}.csv"
     columns = defaultdict(list)
@@ -297,8 +363,144 @@ def analytic_csv(template, instrument, schema, field):
     values = [int(val) for val in columns[field]]
     logger.info("Analytic %s: %s Max, %s Avg", field, max(values), mean(values))
 
+def record_timeout():
+    # 录制时长加上宽限时间；时长的格式与 plan.py 相同，例如 10s、500ms、1m30s
+    return parse_duration(RECORD_TIME_LIMIT) + RECORD_TIMEOUT_GRACE
+
+async def run_with_retries(command, output_file, label, timeout):
+    # command(output) 返回输出到 output 的命令；先输出到临时路径，
+    # 命令退出码为 0 且生成了输出文件才重命名为 output_file 并返回成功的尝试次数，否则删除不完整的输出后重试，都失败时返回 0
+    partial_file = partial_path(output_file)
+    try:
+        for attempt in range(1, MAX_RETRIES + 1):
+            remove_path(partial_file)
+            logger.info(' '.join(command(partial_file)))
+            logger.info("开始%s... (%s/%s)", label, attempt, MAX_RETRIES)
+            returncode = await run_shell_command(command(partial_file), timeout, label)
+            if returncode == 0 and os.path.exists(partial_file):
+                commit(partial_file, output_file)
+                logger.info("%s完成", label)
+                return attempt
+            logger.error("%s失败，退出码 %s (%s/%s)", label, returncode, attempt, MAX_RETRIES)
+            count('retries')
+        return 0
+    finally:
+        remove_path(partial_file)
+
+async def record_performance_data_async(template, instrument):
+    with span('record_performance_data', template=template, instrument=instrument):
+        return await run_with_retries(partial(get_record_command, template, instrument),
+                                      f"{file_prefix(template, instrument)}.trace",
+                                      f"录制 {template} {instrument} 的性能测试数据", record_timeout())
+
+async def process_trace(template, instrument):
+    # 录制完成后的全部步骤：导出 toc、解析 run 和 table schema、导出并转换所有表格
+    # 与下一个模板的录制同时进行，所以不使用全局的 table_schemas / trace_runs
+    prefix = file_prefix(template, instrument)
+    with span('export_test_results', template=template, instrument=instrument):
+        ok = await run_with_retries(partial(get_toc_command, template, instrument), f"{prefix}_toc.xml",
+                                    f"导出 {template} {instrument} 的性能测试结果", EXPORT_TIMEOUT)
+    if not ok:
+        return None
+    try:
+        runs = await asyncio.to_thread(parse_toc, f"{prefix}_toc.xml")
+    except ET.ParseError:
+        logger.error("解析 %s %s 的 toc 文件失败", template, instrument)
+        return None
+    schemas = set()
+    for run in runs:
+        logger.info("%s %s run %s: %s - %s", template, instrument, run.number, run.start, run.end)
+        schemas.update(run.schemas)
+    if not schemas:
+        logger.info("没有找到 %s %s 的 table schema 信息", template, instrument)
+        return []
+    results = await export_table_schemas_async(template, instrument, schemas, runs)
+    await asyncio.to_thread(summarize_trace, template, instrument, runs)
+    return results
+
+async def export_job_async(job, cache=None, format='csv'):
+    # 与 exporter.export_job 相同，但 xctrace export 作为事件循环的子进程运行：
+    # 任务被取消（例如 Ctrl-C）时导出进程随之终止，不会在后台的线程或进程池中继续运行
+    # 查缓存和转换在线程中执行
+    cache = job_cache(job, cache)
+    result = await asyncio.to_thread(cached_job, job, format, cache)
+    if result is not None:
+        return result
+    started = time.perf_counter()
+    cached = None
+    if await asyncio.to_thread(cached_export, job, cache):
+        attempt, cached = 0, 'exported'
+    else:
+        with span('xctrace_export', trace=job.trace, schema=schema_label(job.schema)):
+            attempt = await run_with_retries(lambda output: export_command(job._replace(output=output)), job.output,
+                                             f"导出 {job.trace} 的 {schema_label(job.schema)}", EXPORT_TIMEOUT)
+        if not attempt:
+            return ExportResult(job, False, MAX_RETRIES, time.perf_counter() - started, 0.0, 0,
+                                f'{MAX_RETRIES} 次导出都失败', cached)
+        await asyncio.to_thread(cache_export, job, cache)
+    return await asyncio.to_thread(convert_export, job, attempt, time.perf_counter() - started, format, cache, cached)
+
+async def export_table_schemas_async(template, instrument, schemas, runs=None):
+    # export_table_schemas 的异步版本，最多同时运行 EXPORT_WORKERS 个导出
+    jobs = table_schema_jobs(template, instrument, schemas, runs)
+    cache = TableCache() if EXPORT_CACHE else None
+    slots = asyncio.Semaphore(EXPORT_WORKERS)
+
+    async def run(job):
+        async with slots:
+            result = await export_job_async(job, cache)
+        log_result(result)
+        return result
+
+    with span('export_table_schemas', template=template, instrument=instrument, jobs=len(jobs)):
+        return await asyncio.gather(*(run(job) for job in jobs))
+
+async def run_pipeline(pairs):
+    # 设备同一时间只能录制一个 trace，录制按顺序进行；
+    # 每个 trace 录制完成后，导出和转换在后台进行，与下一个模板的录制重叠
+    # 返回 {(template, instrument): 导出结果列表，失败为 None}
+    tasks = {}
+    try:
+        for template, instrument in pairs:
+            logger.info("========== %s, %s ==========", template, instrument)
+            if await record_performance_data_async(template, instrument):
+                tasks[(template, instrument)] = asyncio.create_task(process_trace(template, instrument))
+            else:
+                logger.error("录制 %s %s 的性能测试数据失败，跳过导出", template, instrument)
+        results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    except asyncio.CancelledError:
+        for task in tasks.values():
+            task.cancel()
+        raise
+    outcome = {}
+    for key, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logger.error("处理 %s %s 的 trace 失败: %r", key[0], key[1], result)
+            result = None
+        outcome[key] = result
+    for template, instrument in pairs:
+        outcome.setdefault((template, instrument), None)
+    return outcome
+
 def main():
-    global table_schemas, test_device_udid, test_process_name
+    global table_schemas, test_device_udid, test_process_name, RECORD_TIME_LIMIT, RECORD_TIMEOUT_GRACE, EXPORT_TIMEOUT
+    parser = argparse.ArgumentParser(description='录制、导出并转换 Instruments 性能测试数据')
+    parser.add_argument('--time-limit', default=RECORD_TIME_LIMIT, help='每次录制的时长，例如 10s')
+    parser.add_argument('--record-grace', type=float, default=RECORD_TIMEOUT_GRACE,
+                        help='录制超过时长后等待多少秒仍未结束就终止并重试')
+    parser.add_argument('--export-timeout', type=float, default=EXPORT_TIMEOUT, help='单次导出的超时（秒）')
+    parser.add_argument('--sequential', action='store_true', help='按顺序执行录制、导出和转换，不重叠')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    RECORD_TIME_LIMIT = args.time_limit
+    RECORD_TIMEOUT_GRACE = args.record_grace
+    EXPORT_TIMEOUT = args.export_timeout
+    try:
+        record_timeout()
+    except ValueError as e:
+        parser.error(str(e))
+
     if check_xctrace_version() is False:
         logger.error("请安装 xctrace 工具链，运行以下命令: xcode-select --install")
         return
@@ -333,16 +535,24 @@ def main():
         logger.error("无法获取支持的 Templates 列表，请检查命令是否正确。")
         return
 
-    for template in supported_templates & preferred_templates:
-        for instrument in supported_instruments & preferred_instruments:
+    pairs = [(template, instrument)
+             for template in sorted(supported_templates & preferred_templates)
+             for instrument in sorted(supported_instruments & preferred_instruments)]
+    if args.sequential:
+        for template, instrument in pairs:
             logger.info("========== %s, %s ==========", template, instrument)
             record_performance_data(template, instrument)
             export_test_results(template, instrument)
             export_schmeas_toc(template, instrument)
-            for schema in table_schemas:
-                export_table_schema(template, instrument, schema)
-                convert_csv(template, instrument, schema)
-                # TODO: analytic_csv
-        
+            export_table_schemas(template, instrument, table_schemas)
+            summarize_trace(template, instrument)
+    else:
+        try:
+            asyncio.run(run_pipeline(pairs))
+        except KeyboardInterrupt:
+            logger.warning("已中断，正在运行的命令已终止")
+    # TODO: analytic_csv
+    report_timings(args, logger.info)
+
 if __name__ == "__main__":
     main()
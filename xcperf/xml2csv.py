@@ -1,52 +1,348 @@
-import csv
+import argparse
+import logging
 import os
-import sys
+import re
+import time
 import xml.etree.ElementTree as ET
+from collections import namedtuple
+from functools import partial
+from decode import decoded_columns, row_decoder
+from profiler import add_arguments, configure, count, report_timings, span
+from table import Table
+from writers import WRITERS, atomic_output, commit, partial_path, remove_path
 
-def xml_to_csv(xml_file):
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    schema_name = root.find('.//schema').attrib['name']
-    print('schema_name', schema_name)
+logger = logging.getLogger(__name__)
+
+# 转换结果的格式或取值方式变化时递增，缓存的转换结果随之失效
+CONVERTER_VERSION = '1'
+# 每隔多少秒输出一次进度（INFO），0 表示不输出
+PROGRESS_INTERVAL = 5.0
+# 每解析多少行检查一次是否该输出进度，避免每行都读时钟
+PROGRESS_CHECK_ROWS = 4096
+# 开启 DEBUG 日志时每隔多少行输出一行的逐单元格诊断信息
+DEBUG_SAMPLE = 1000
+
+# 表格模式（schema）中的一列
+Column = namedtuple('Column', ['name', 'mnemonic', 'engineering_type'])
+
+# process 节点的格式化文本，例如 "makepad_taobao (501)"
+PROCESS_FMT = re.compile(r'^(?P<name>.*?)(?: \((?P<pid>\d+)\))?$')
+
+def process_filter(names=(), pids=()):
+    # 返回按进程过滤行的谓词：进程名以 names 中任一项开头（与 summarize.py 一致），或 PID 在 pids 中
+    # 两者都为空时返回 None，表示不过滤；谓词可以 pickle，能传给 chunked.py 的子进程
+    names = tuple(names)
+    pids = frozenset(str(pid) for pid in pids)
+    if not names and not pids:
+        return None
+    return partial(process_matches, names, pids)
+
+def process_matches(names, pids, process):
+    match = PROCESS_FMT.match(process or '')
+    return (bool(names) and match['name'].startswith(names)) or match['pid'] in pids
+
+def process_column(columns):
+    # process 列的下标，没有则为 None
+    for index, column in enumerate(columns):
+        if column.engineering_type == 'process':
+            return index
+    return None
+
+class Progress:
+    # 转换进度：行数、每秒行数，以及按已读取的字节数估算的完成比例和剩余时间
+    def __init__(self, name, source, interval=PROGRESS_INTERVAL):
+        self.name = name
+        self.source = source
+        try:
+            self.total = os.fstat(source.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            self.total = None
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.next = self.started + interval
 
-    path, _ = os.path.splitext(xml_file)
-    csv_file = path.split("/")[-1] + ".csv"
-
-    # 打开CSV文件进行写入
-    with open(csv_file, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        print(root.find('.//col'))
-        # 获取表格模式（schema）的列名
-        columns = [col.find('name').text for col in root.findall('.//col')]
-        print('columns', columns)
-        # 写入表头
-        writer.writerow(columns)
-        
-        # 遍历XML中的每个节点
-        rows = root.findall('.//row')
-        if len(rows) == 0:
-            print('没有对应的数据，导出失败')
+    def update(self, rows):
+        now = time.perf_counter()
+        if now < self.next:
             return
-        print('len(rows)', len(rows))
-        for row in rows:
-            # 提取每行数据
-            print('node.tag', row.tag, 'node.text', row.text)
-            data = []
-            for child in row:
-                print('child.tag', child.tag, 'child.text', child.text)
-                # 替换ref值为对应id的实际值
-                if 'ref' in child.attrib:
-                    ref_id = child.attrib['ref']
-                    ref_xpath = f".//{child.tag}[@id='{ref_id}']"
-                    ref_node = root.find(ref_xpath)
-                    ref_data = node_to_data(ref_node)
-                    print('ref_id', ref_id, 'ref_xpath', ref_xpath, 'ref_node', ref_node)
-                    data.append(ref_data)
-                else:
-                    txt = node_to_data(child)
-                    data.append(txt)
-            # 将数据写入CSV文件
-            writer.writerow(data)
+        self.next = now + self.interval
+        elapsed = now - self.started
+        rate = rows / elapsed if elapsed else 0.0
+        try:
+            consumed = self.source.tell()
+        except (AttributeError, OSError, ValueError):
+            consumed = None
+        if self.total and consumed:
+            done = consumed / self.total
+            logger.info('转换 %s: %d 行，%.0f 行/秒，已完成 %.1f%%，预计还需 %.0f 秒',
+                        self.name, rows, rate, done * 100, elapsed * (1 - done) / done)
+        else:
+            logger.info('转换 %s: %d 行，%.0f 行/秒', self.name, rows, rate)
+
+def log_row(index, row, data):
+    # 逐单元格输出一行的诊断信息：标签、id/ref 和取到的值
+    for child, cell in zip(row, data):
+        reference = child.attrib.get('ref') or child.attrib.get('id')
+        logger.debug('第 %d 行 %s %s=%s 值=%r', index, child.tag,
+                     'ref' if 'ref' in child.attrib else 'id', reference, cell)
+
+def iter_events(xml_file, value=None, where=None, refs=None, processes=None, columns=None):
+    # 流式解析导出结果，依次产出 ('schema', (schema_name, columns)) 和 ('row', data)，columns 为 Column 列表
+    # 一次导出多个表格时每个 <node> 各有一个 schema，后面跟着它的行。
+    # value 决定单元格取值方式，默认取格式化文本（fmt）
+    # 带 id 的节点第一次出现时记录其值，之后的 ref 直接查表，不再扫描整棵树。
+    # xctrace 导出的 ref 总是指向前面已经出现过的 id，id 在整个文档内唯一。
+    # where 为 process_filter() 返回的谓词时，带 process 列的表格只产出匹配的行：
+    # 不匹配的行在解析 ref 和取值之前就被丢弃，但其中带 id 的节点仍会记录，后面匹配的行可能引用它们。
+    # 解析从某一行开始的片段时（chunked.py），片段中没有 schema，columns 为片段所属表格的列，
+    # refs（按 value 取值）和 processes（process 节点的格式化文本）为片段之前定义、片段中引用到的 id
+    if value is None:
+        value = node_to_data
+    refs = dict(refs or {})
+    processes = dict(processes or {})
+    filter_index = process_column(columns) if where is not None and columns else None
+    columns = []
+    parents = []
+    # 解析过的 ref 数，结束（或提前停止）时计入 profiler 的 refs 计数器
+    resolved = 0
+    parsed = 0
+    # xml_file 可以是路径或已打开的二进制文件对象
+    source = open(xml_file, 'rb') if isinstance(xml_file, (str, bytes, os.PathLike)) else xml_file
+    # 逐单元格诊断和进度输出只在对应日志级别开启时才有开销
+    debug = logger.isEnabledFor(logging.DEBUG)
+    progress = None
+    if PROGRESS_INTERVAL and logger.isEnabledFor(logging.INFO):
+        progress = Progress(getattr(source, 'name', xml_file), source)
+    try:
+        for event, elem in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if 'id' in elem.attrib:
+                refs.setdefault((elem.tag, elem.attrib['id']), value(elem))
+                if elem.tag == 'process':
+                    processes.setdefault(elem.attrib['id'], node_to_data(elem))
+            if elem.tag == 'col':
+                columns.append(Column(elem.findtext('name'), elem.findtext('mnemonic'), elem.findtext('engineering-type')))
+            elif elem.tag == 'schema':
+                filter_index = process_column(columns) if where is not None else None
+                yield 'schema', (elem.attrib['name'], columns)
+                columns = []
+            elif elem.tag == 'row':
+                parsed += 1
+                if progress is not None and parsed % PROGRESS_CHECK_ROWS == 0:
+                    progress.update(parsed)
+                if filter_index is not None and not where(row_process(elem, filter_index, processes)):
+                    elem.clear()
+                    if parents:
+                        parents[-1].remove(elem)
+                    continue
+                data = []
+                for child in elem:
+                    # 替换ref值为对应id的实际值
+                    if 'ref' in child.attrib:
+                        data.append(refs[(child.tag, child.attrib['ref'])])
+                        resolved += 1
+                    else:
+                        data.append(value(child))
+                if debug and (parsed - 1) % DEBUG_SAMPLE == 0:
+                    log_row(parsed, elem, data)
+                yield 'row', data
+                # 释放已处理的行，保持内存占用有界
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+            elif elem.tag == 'node':
+                elem.clear()
+                if parents:
+                    parents[-1].remove(elem)
+    finally:
+        count('refs', resolved)
+        if source is not xml_file:
+            source.close()
+
+def row_process(row, index, processes):
+    # 行中 process 单元格的格式化文本
+    if index >= len(row):
+        return None
+    cell = row[index]
+    if 'ref' in cell.attrib:
+        return processes.get(cell.attrib['ref'])
+    return node_to_data(cell)
+
+def iter_table(xml_file, value=None, where=None):
+    # 流式解析导出的表格：第一个产出 (schema_name, columns)，之后每次产出一行数据
+    # 只读取第一个表格
+    schemas = 0
+    for kind, item in iter_events(xml_file, value, where):
+        if kind == 'schema':
+            schemas += 1
+            if schemas > 1:
+                return
+        yield item
+
+def open_writer(writer_class, output, columns, keep_fmt=False):
+    # 返回 (writer, 列名, decode)；CSV 写入格式化文本，decode 为 None
+    # 列式格式按 schema 解码为数值，keep_fmt 时额外保留格式化文本列
+    if writer_class.raw:
+        names, dtypes = decoded_columns(columns, keep_fmt)
+        return writer_class(output, names, dtypes), names, row_decoder(columns, keep_fmt)
+    names = [column.name for column in columns]
+    return writer_class(output, names), names, None
+
+def convert_table(xml_file, output=None, format='csv', keep_fmt=False, where=None, jobs=1):
+    # 用指定格式的 writer 转换一个导出的表格，返回 (schema_name, 列名, 行数)
+    # where 见 iter_events，用于只保留指定进程的行
+    # jobs 不为 1 时大文件按行边界切分，用 jobs 个进程并行转换（None 为 CPU 数），见 chunked.py
+    with span('convert_table', input=xml_file, format=format) as args:
+        result = write_table(xml_file, output, format, keep_fmt, where, jobs)
+        if result is not None:
+            args.update(rows=result[2])
+        return result
+
+def write_table(xml_file, output, format, keep_fmt, where, jobs=1):
+    writer_class = WRITERS[format]
+    if output is None:
+        path, _ = os.path.splitext(xml_file)
+        output = path.split("/")[-1] + writer_class.suffix
+
+    tables = parallel_tables(xml_file, jobs)
+    if tables is not None:
+        import chunked
+
+        try:
+            result = chunked.write_table(xml_file, tables, output, format, keep_fmt, where, jobs)
+        except chunked.SplitError as e:
+            logger.warning('%s，改为按顺序转换', e)
+            tables = None
+    if tables is not None:
+        if result is None:
+            return None
+        schema_name, names, rows_written = result
+    else:
+        rows = iter_table(xml_file, node_to_cell if writer_class.raw else node_to_data, where)
+        schema = next(rows, None)
+        if schema is None:
+            return None
+        schema_name, columns = schema
+
+        rows_written = 0
+        with atomic_output(output) as partial:
+            writer, names, decode = open_writer(writer_class, partial, columns, keep_fmt)
+            try:
+                for data in rows:
+                    writer.write(data if decode is None else decode(data))
+                    rows_written += 1
+            finally:
+                writer.close()
+    count('rows', rows_written)
+    count('bytes_read', os.path.getsize(xml_file))
+    count('bytes_written', path_size(output))
+    return schema_name, names, rows_written
+
+def parallel_tables(xml_file, jobs):
+    # 值得并行转换时返回 chunked.split 切分出的表格和行范围，否则为 None（按顺序解析）
+    # chunked.py 用到本模块的函数，在这里导入以避免循环导入
+    if jobs == 1:
+        return None
+    import chunked
+
+    return chunked.split(xml_file, jobs)
+
+def load_table(xml_file, keep_fmt=False, where=None):
+    # 把导出的第一个表格解码到内存中的 table.Table（数值列用 array，字符串列字典编码），返回 (schema_name, table)
+    # 用 table.to_numpy() / to_pandas() 交给分析代码；没有表格时返回 None
+    rows = iter_table(xml_file, node_to_cell, where)
+    schema = next(rows, None)
+    if schema is None:
+        return None
+    schema_name, columns = schema
+    table = Table(*decoded_columns(columns, keep_fmt))
+    decode = row_decoder(columns, keep_fmt)
+    for data in rows:
+        table.append(decode(data))
+    count('rows', len(table))
+    return schema_name, table
+
+def split_tables(xml_file, prefix, format='csv', keep_fmt=False, where=None, jobs=1):
+    # 一次解析包含多个表格的导出结果（XPath 并集），每个 schema 写入各自的 {prefix}{schema}{suffix}
+    # prefix 可以带目录，通常与合并结果放在同一目录
+    # 返回 [(schema_name, output, 行数)]；jobs 见 convert_table
+    with span('split_tables', input=xml_file, format=format):
+        tables = parallel_tables(xml_file, jobs)
+        if tables is not None:
+            import chunked
+
+            try:
+                results = chunked.write_tables(xml_file, tables, prefix, format, keep_fmt, where, jobs)
+            except chunked.SplitError as e:
+                logger.warning('%s，改为按顺序转换', e)
+                tables = None
+        if tables is None:
+            results = write_tables(xml_file, prefix, format, keep_fmt, where)
+    count('rows', sum(rows for _, _, rows in results))
+    count('bytes_read', os.path.getsize(xml_file))
+    count('bytes_written', sum(path_size(output) for _, output, _ in results))
+    return results
+
+def write_tables(xml_file, prefix, format, keep_fmt, where):
+    writer_class = WRITERS[format]
+    events = iter_events(xml_file, node_to_cell if writer_class.raw else node_to_data, where)
+    return write_events(events, prefix, format, keep_fmt)
+
+def write_events(events, prefix, format='csv', keep_fmt=False):
+    # 把 iter_events 产出的事件写入 {prefix}{schema}{suffix}，返回 [(schema_name, output, 行数)]
+    # 单元格的取值方式需与格式对应：列式格式为 node_to_cell，CSV 为 node_to_data
+    # 每个表格先写到临时路径，写完一个替换一个；中途失败时已完成的表格保留，正在写的删除
+    writer_class = WRITERS[format]
+    results = []
+    writer = partial = None
+    try:
+        for kind, item in events:
+            if kind == 'schema':
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                    commit(partial, results[-1][1])
+                schema_name, columns = item
+                output = prefix + schema_name + writer_class.suffix
+                partial = partial_path(output)
+                remove_path(partial)
+                writer, _, decode = open_writer(writer_class, partial, columns, keep_fmt)
+                results.append([schema_name, output, 0])
+            else:
+                writer.write(item if decode is None else decode(item))
+                results[-1][2] += 1
+        if writer is not None:
+            writer.close()
+            writer = None
+            commit(partial, results[-1][1])
+    finally:
+        if writer is not None:
+            writer.close()
+        if partial is not None:
+            remove_path(partial)
+    return [tuple(result) for result in results]
+
+def xml_to_csv(xml_file, csv_file=None, format='csv', keep_fmt=False, where=None, jobs=1):
+    result = convert_table(xml_file, csv_file, format, keep_fmt, where, jobs)
+    if result is None:
+        print('没有找到表格模式（schema），导出失败')
+        return
+    schema_name, columns, count = result
+    print('schema_name', schema_name)
+    print('columns', columns)
+    if count == 0:
+        print('没有对应的数据，导出失败')
+        return
+    print('len(rows)', count)
+
+def path_size(path):
+    # 输出文件的大小；npy 格式的输出是目录
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
 
 def node_to_data(node):
     if 'fmt' in node.attrib:
@@ -55,12 +351,42 @@ def node_to_data(node):
         return node.text
     else:
         return 'N/A'
-    
+
+def node_to_cell(node):
+    # (原始值, 格式化文本)，供 decode 按列解码；sentinel 两者都为 None
+    return node.text, node.attrib.get('fmt')
+
+def cell_to_data(cell):
+    # node_to_cell 的结果对应的 node_to_data 文本
+    text, fmt = cell
+    if fmt is not None:
+        return fmt
+    return text if text is not None else 'N/A'
+
 def main():
-    argv = sys.argv
-    if len(argv) > 1:
-        for xml in argv[1:]:
-            xml_to_csv(xml)
+    global DEBUG_SAMPLE, PROGRESS_INTERVAL
+    parser = argparse.ArgumentParser(description='将 xctrace 导出的表格 XML 转换为 CSV 或列式格式')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv', help='输出格式，默认 csv')
+    parser.add_argument('--keep-fmt', action='store_true', help='列式格式额外保留每列的格式化文本')
+    parser.add_argument('--process', action='append', default=[], help='只保留进程名以此开头的行，可重复')
+    parser.add_argument('--pid', action='append', default=[], help='只保留该 PID 的行，可重复')
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        help='DEBUG 时按 --debug-sample 抽样输出逐单元格的诊断信息')
+    parser.add_argument('--debug-sample', type=int, default=DEBUG_SAMPLE, help='每隔多少行输出一行诊断信息')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='大文件（32 MiB 以上）按行边界切分后并行转换的进程数，默认 1 即按顺序转换，0 为 CPU 数')
+    parser.add_argument('--progress', type=float, default=PROGRESS_INTERVAL, help='进度输出间隔（秒），0 不输出')
+    parser.add_argument('xml', nargs='*')
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure(args)
+    logging.basicConfig(level=args.log_level)
+    DEBUG_SAMPLE = max(1, args.debug_sample)
+    PROGRESS_INTERVAL = args.progress
+    where = process_filter(args.process, args.pid)
+    for xml in args.xml:
+        xml_to_csv(xml, format=args.format, keep_fmt=args.keep_fmt, where=where, jobs=args.jobs or None)
+    report_timings(args)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()